@@ -0,0 +1,63 @@
+from mrya_natives import natives
+
+class StringBuilder:
+    """
+    Text assembled piece by piece, e.g. an HTML page or CSV file built in a loop. `text = text + piece`
+    copies everything built so far on each step, which is quadratic in the length of the result; a
+    builder keeps the pieces in a list and joins them once, when the text is needed.
+
+    Anything that turns a value into text (output, `+` with a string, h-strings, store, append_to)
+    sees the built text, and length() is its length.
+    """
+    __slots__ = ("parts", "size")
+
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+
+    def add(self, values):
+        parts = self.parts
+        for value in values:
+            text = value if type(value) is str else str(value)
+            parts.append(text)
+            self.size += len(text)
+
+    def build(self):
+        parts = self.parts
+        if len(parts) > 1:
+            # Keep the result as the only piece, so building again only joins what was added since.
+            parts[:] = ["".join(parts)]
+        return parts[0] if parts else ""
+
+    def __len__(self):
+        return self.size
+
+    def __str__(self):
+        return self.build()
+
+def builder(*values):
+    """builder(...values): a new builder, starting with the given values."""
+    new_builder = StringBuilder()
+    new_builder.add(values)
+    return new_builder
+
+def add(builder, *values):
+    """builder.add(...values): adds each value's text to the end."""
+    builder.add(values)
+    return None
+
+def add_line(builder, *values):
+    """builder.add_line(...values): adds the values, then a newline."""
+    builder.add(values + ("\n",))
+    return None
+
+def build(builder):
+    """builder.build(): the text built so far."""
+    return builder.build()
+
+# What `some_builder.name` can look up, called with the builder as their first argument.
+StringBuilder.native_methods = natives({
+    "add": add,
+    "add_line": add_line,
+    "build": build,
+})
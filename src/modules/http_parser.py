@@ -0,0 +1,259 @@
+import os
+import shutil
+import tempfile
+
+from mrya_natives import natives
+
+# Limits on what a client may send (config keys of the same names). A request over them is answered
+# with an error status and its connection closed, before the rest of it is read.
+MAX_HEADER_SIZE = 65536 # Bytes of request line and headers (431 Request Header Fields Too Large)
+MAX_BODY_SIZE = 64 * 1024 * 1024 # Bytes of body (413 Content Too Large)
+MAX_BODY_IN_MEMORY = 1024 * 1024 # Bodies bigger than this, and multipart uploads, are kept in a temporary file
+MAX_CHUNK_LINE = 1024 # Bytes of a chunk's size line (chunked transfer-encoding)
+
+class RequestError(Exception):
+    """A request the server won't handle, answered with `status` and the connection closed."""
+    def __init__(self, status, reason):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+
+class RequestBody:
+    """
+    The body of a request, handed to the Mrya handler as request.body. Nothing is decoded until it's
+    used: body.text() (or anything that turns it into text, like `+` with a string) decodes it,
+    body.raw() gives its bytes and body.save(path) copies it to a file. A big body (or a multipart
+    upload) is read into a temporary file as it arrives rather than held in memory.
+    """
+    __slots__ = ("data", "file", "size", "text_cache")
+
+    def __init__(self, file=None):
+        self.data = bytearray() if file is None else None
+        self.file = file
+        self.size = 0
+        self.text_cache = None
+
+    def write(self, data):
+        if self.file is None:
+            self.data += data
+        else:
+            self.file.write(data)
+        self.size += len(data)
+
+    def raw(self):
+        if self.file is None:
+            return bytes(self.data)
+        self.file.seek(0)
+        return self.file.read()
+
+    def text(self):
+        if self.text_cache is None:
+            self.text_cache = self.raw().decode('utf-8', errors='replace')
+        return self.text_cache
+
+    def close(self):
+        """Deletes the temporary file, if there is one, once the request has been answered."""
+        if self.file is not None:
+            self.file.close()
+
+    def __len__(self):
+        """length(body): its size in bytes, like body.size(), so measuring it doesn't read it."""
+        return self.size
+
+    def __eq__(self, other):
+        if isinstance(other, RequestBody):
+            return self.raw() == other.raw()
+        return self.text() == other
+
+    def __hash__(self):
+        # The text __eq__ compares, so a body and an equal string are the same map key.
+        return hash(self.text())
+
+    def __str__(self):
+        return self.text()
+
+def text(body):
+    """body.text(): the body decoded as UTF-8 text."""
+    return body.text()
+
+def raw(body):
+    """body.raw(): the body's bytes, e.g. for an uploaded image."""
+    return body.raw()
+
+def size(body):
+    """body.size(): the body's size in bytes, without reading it."""
+    return body.size
+
+def save(interpreter, body, path):
+    """body.save(path): writes the body to a file, straight from its temporary file if it has one."""
+    full_path = os.path.join(interpreter.current_directory, path)
+    try:
+        with open(full_path, 'wb') as f:
+            if body.file is None:
+                f.write(body.data)
+            else:
+                body.file.seek(0)
+                shutil.copyfileobj(body.file, f)
+    except OSError as e:
+        raise RuntimeError(f"Failed to save the request body to '{path}': {e}")
+    return None
+
+RequestBody.native_methods = natives({
+    "text": text,
+    "raw": raw,
+    "size": size,
+    "save": save,
+})
+
+class RequestParser:
+    """
+    Reads the requests of one connection out of the bytes it receives, however they're split up. The
+    received bytes go into one buffer that's reused for the connection's lifetime, and each request is
+    cut from its front as soon as it's complete; body bytes move straight on to the request's
+    RequestBody, so the buffer only ever holds a request's headers and what's arrived since.
+    """
+    __slots__ = ("buffer", "chunk", "max_header_size", "max_body_size", "max_body_in_memory",
+                 "scanned", "head", "body", "remaining", "chunk_state", "send_continue")
+
+    def __init__(self, max_header_size=MAX_HEADER_SIZE, max_body_size=MAX_BODY_SIZE, max_body_in_memory=MAX_BODY_IN_MEMORY):
+        self.buffer = bytearray()
+        self.chunk = bytearray(65536) # What recv_into fills, also reused
+        self.max_header_size = max_header_size
+        self.max_body_size = max_body_size
+        self.max_body_in_memory = max_body_in_memory
+        self.scanned = 0 # How much of the buffer is known not to hold the end of the headers
+        self.head = None # The request line and headers of the request whose body is being read
+        self.body = None
+        self.remaining = 0 # Body bytes still to come, of the whole body or of the current chunk
+        self.chunk_state = None # For a chunked body: "size", "data", "data end" or "trailer"
+        self.send_continue = False # The client is waiting for "100 Continue" before it sends the body
+
+    def receive(self, client_socket):
+        """Reads what's arrived on the socket into the buffer. Returns the number of bytes, 0 once the client is done."""
+        count = client_socket.recv_into(self.chunk)
+        if count:
+            with memoryview(self.chunk) as view:
+                self.buffer += view[:count]
+        return count
+
+    def next_request(self):
+        """
+        The next complete request, as (method, target, version, headers, body), or None until more of
+        it arrives. Raises RequestError for a malformed request or one over the limits.
+        """
+        if self.head is None:
+            if not self._read_head():
+                return None
+        if not self._read_body():
+            return None
+        method, target, version, headers = self.head
+        body = self.body
+        self.head = None
+        self.body = None
+        return method, target, version, headers, body
+
+    def _read_head(self):
+        buffer = self.buffer
+        # Search only what's new, backing up in case the blank line straddles two reads.
+        head_end = buffer.find(b"\r\n\r\n", max(0, self.scanned - 3))
+        if head_end == -1:
+            self.scanned = len(buffer)
+            if self.scanned > self.max_header_size:
+                raise RequestError(431, "Request Header Fields Too Large")
+            return False
+        if head_end > self.max_header_size:
+            raise RequestError(431, "Request Header Fields Too Large")
+        lines = buffer[:head_end].decode('utf-8', errors='replace').split('\r\n')
+        del buffer[:head_end + 4]
+        self.scanned = 0
+
+        try:
+            method, target, version = lines[0].split()
+        except ValueError:
+            raise RequestError(400, "Bad Request") # Malformed request line
+        headers = {}
+        for line in lines[1:]:
+            key, colon, value = line.partition(":")
+            if colon:
+                headers[key.strip().lower()] = value.strip()
+        self.head = (method, target, version, headers)
+
+        content_type = headers.get("content-type", "").lower()
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            self.chunk_state = "size"
+            # The size isn't known up front, so it moves to a file if it outgrows memory.
+            on_disk = content_type.startswith("multipart/")
+            self.body = RequestBody(tempfile.TemporaryFile() if on_disk else
+                                    tempfile.SpooledTemporaryFile(max_size=self.max_body_in_memory))
+        else:
+            self.chunk_state = None
+            try:
+                self.remaining = int(headers.get("content-length", "0"))
+            except ValueError:
+                raise RequestError(400, "Bad Request")
+            if self.remaining < 0:
+                raise RequestError(400, "Bad Request")
+            if self.remaining > self.max_body_size:
+                raise RequestError(413, "Content Too Large")
+            on_disk = self.remaining > self.max_body_in_memory or content_type.startswith("multipart/")
+            self.body = RequestBody(tempfile.TemporaryFile() if on_disk else None)
+        self.send_continue = headers.get("expect", "").lower() == "100-continue" and bool(self.remaining or self.chunk_state)
+        return True
+
+    def _read_body(self):
+        """Moves what's arrived of the body into it. Returns whether the body is complete."""
+        if self.chunk_state is None:
+            self._take(self.remaining)
+            return self.remaining == 0
+
+        buffer = self.buffer
+        while True:
+            if self.chunk_state == "data":
+                self._take(self.remaining)
+                if self.remaining:
+                    return False
+                self.chunk_state = "data end"
+            elif self.chunk_state == "data end":
+                if len(buffer) < 2:
+                    return False
+                if buffer[:2] != b"\r\n":
+                    raise RequestError(400, "Bad Request")
+                del buffer[:2]
+                self.chunk_state = "size"
+            elif self.chunk_state == "size":
+                line_end = buffer.find(b"\r\n")
+                if line_end == -1:
+                    if len(buffer) > MAX_CHUNK_LINE:
+                        raise RequestError(400, "Bad Request")
+                    return False
+                try:
+                    # Chunk extensions, after a ";", aren't used.
+                    self.remaining = int(bytes(buffer[:line_end]).split(b";", 1)[0], 16)
+                except ValueError:
+                    raise RequestError(400, "Bad Request")
+                del buffer[:line_end + 2]
+                if self.remaining < 0:
+                    raise RequestError(400, "Bad Request")
+                if self.body.size + self.remaining > self.max_body_size:
+                    raise RequestError(413, "Content Too Large")
+                self.chunk_state = "data" if self.remaining else "trailer"
+            else:
+                # Trailer fields, which aren't used, end with a blank line.
+                if buffer[:2] == b"\r\n":
+                    del buffer[:2]
+                    return True
+                trailer_end = buffer.find(b"\r\n\r\n")
+                if trailer_end == -1:
+                    if len(buffer) > self.max_header_size:
+                        raise RequestError(431, "Request Header Fields Too Large")
+                    return False
+                del buffer[:trailer_end + 4]
+                return True
+
+    def _take(self, count):
+        """Moves up to `count` bytes from the front of the buffer into the body."""
+        count = min(count, len(self.buffer))
+        if count:
+            self.body.write(self.buffer[:count])
+            del self.buffer[:count]
+            self.remaining -= count
@@ -1,187 +1,712 @@
+import random
+import signal
 import socket
 import threading
+import time
+import traceback
+import collections
 import os
+import queue
+import selectors
 import sys
 import urllib.parse
 
+from mrya_natives import natives
+from modules.http_parser import MAX_BODY_IN_MEMORY, MAX_BODY_SIZE, MAX_HEADER_SIZE, RequestError, RequestParser
+
 # This will be the bridge between the Python server and the Mrya handler function.
 mrya_context = {
     "interpreter": None,
     "handler": None
 }
 
+# How request handlers, which run at the same time on their own threads, share the program's globals
+# (config key GLOBALS). Each request always has its own execution context (see
+# MryaInterpreter.execution_context): its local variables, call stack and script directory.
+# "shared": handlers run concurrently and read and write the same global variables and modules.
+# "serialized": handlers take turns, for programs that update globals in several steps per request.
+GLOBALS_POLICIES = ("shared", "serialized")
+
+def call_handler(request_map):
+    """Calls the Mrya handler for one request, on this thread's own execution context."""
+    context = mrya_context["interpreter"].execution_context()
+    lock = mrya_context.get("lock")
+    if lock is None:
+        return context.call_function_or_method(mrya_context["handler"], [request_map])
+    with lock:
+        return context.call_function_or_method(mrya_context["handler"], [request_map])
+
+# Persistent connections (HTTP/1.1 keep-alive): a client can send several requests over one
+# connection, even before the replies to the earlier ones arrive (pipelining). They're read and
+# answered one after another, so the replies go back in the order the requests came.
+KEEP_ALIVE_TIMEOUT = 5 # Seconds an idle connection is kept open (config key KEEP_ALIVE_TIMEOUT; 0 closes after each reply)
+MAX_KEEP_ALIVE_REQUESTS = 100 # Requests answered on one connection before it's closed (config key MAX_KEEP_ALIVE_REQUESTS)
+
+# Set when the server is shutting down, so connections close after their current request.
+stopping = threading.Event()
+
+def new_parser():
+    """A parser for a new connection, with the configured limits."""
+    config = mrya_context.get("config", {})
+    return RequestParser(config.get("MAX_HEADER_SIZE", MAX_HEADER_SIZE), config.get("MAX_BODY_SIZE", MAX_BODY_SIZE),
+                         config.get("MAX_BODY_IN_MEMORY", MAX_BODY_IN_MEMORY))
+
+def read_request(client_socket, parser):
+    """Reads the next request from a connection, or None once the client is done."""
+    while True:
+        request = parser.next_request()
+        if request is not None:
+            return request
+        if parser.send_continue:
+            parser.send_continue = False
+            client_socket.sendall(CONTINUE)
+        if not parser.receive(client_socket):
+            return None
+
+def error_response(error):
+    """The response to a request the parser rejected; the connection is closed after it."""
+    return f"HTTP/1.1 {error.status} {error.reason}\r\nContent-Length: 0\r\nConnection: close\r\n\r\n".encode('utf-8')
+
+# Sent to a client that asked to wait for it (Expect: 100-continue) before it sends a body.
+CONTINUE = b"HTTP/1.1 100 Continue\r\n\r\n"
+
+def keeps_alive(version, headers):
+    """Whether the client wants the connection kept open after this request."""
+    connection = headers.get("connection", "").lower()
+    if version == "HTTP/1.0":
+        return "keep-alive" in connection
+    return "close" not in connection
+
+def stays_open(request, handled, timeout, max_requests, holds_thread=True):
+    """Whether a connection is kept open after answering its `handled`th request."""
+    # While other connections wait for a thread, one that holds a thread is closed after its reply to make way.
+    return (timeout > 0 and handled < max_requests and not stopping.is_set()
+            and (not holds_thread or connection_pool.waiting.empty()) and keeps_alive(request[2], request[3]))
+
 def handle_client(client_socket):
-    """Handles a single client connection."""
+    """Handles a client connection, answering its requests until it closes, goes idle or reaches the request limit."""
     global mrya_context
+    config = mrya_context.get("config", {})
+    timeout = config.get("KEEP_ALIVE_TIMEOUT", KEEP_ALIVE_TIMEOUT)
+    max_requests = config.get("MAX_KEEP_ALIVE_REQUESTS", MAX_KEEP_ALIVE_REQUESTS)
+    parser = new_parser()
+    handled = 0
     try:
-        request_data = b""
-        # Read until the end of headers (empty line)
+        # An idle client (before or between requests) is let go after the timeout.
+        client_socket.settimeout(timeout or KEEP_ALIVE_TIMEOUT)
         while True:
-            chunk = client_socket.recv(1024)
-            if not chunk:
-                break
-            request_data += chunk
-            if b"\r\n\r\n" in request_data:
-                break
-        if not request_data:
-            return
+            try:
+                request = read_request(client_socket, parser)
+            except (socket.timeout, ConnectionError):
+                return
+            except RequestError as e:
+                client_socket.sendall(error_response(e))
+                return
+            if request is None:
+                return
+            handled += 1
+            keep_alive = stays_open(request, handled, timeout, max_requests)
+            try:
+                response, keep_alive = build_response(client_socket.getpeername()[0], request, keep_alive, timeout, max_requests - handled)
+            finally:
+                request[4].close()
+            client_socket.sendall(response)
+            if not keep_alive:
+                return
+    finally:
+        client_socket.close()
 
-        # Decode request data
-        request_text = request_data.decode('utf-8', errors='replace')
+def build_response(client_ip, request, keep_alive, timeout, remaining):
+    """Answers one request. Returns the response, and whether the connection stays open for another."""
+    method, full_path, version, headers, body = request
 
-        # Basic HTTP request parsing
-        lines = request_text.split('\r\n')
-        if not lines:
-            return
-        
+    # Parse path and query string
+    parsed_url = urllib.parse.urlparse(full_path)
+    path = parsed_url.path
+    query = urllib.parse.parse_qs(parsed_url.query)
+
+    # Simple security check for allowed IPs if configured
+    allowed_ips = mrya_context.get("config", {}).get("ALLOWED_IPS")
+    if allowed_ips is not None and isinstance(allowed_ips, list) and client_ip not in allowed_ips:
+        # Send a 403 Forbidden response
+        response = "HTTP/1.1 403 Forbidden\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+        return response.encode('utf-8'), False
+    interpreter = mrya_context.get("interpreter")
+    handler = mrya_context.get("handler")
+
+    if not interpreter or not handler:
+        response_body_raw = "Mrya handler not configured."
+        status_code = 500
+    else:
+        # Build request map for Mrya handler
+        request_map = {
+            "method": method,
+            "path": path,
+            "query": {k: v[0] if len(v)==1 else v for k,v in query.items()},
+            "headers": headers,
+            "body": body, # Read and decoded only if the handler uses it
+            "form": {},
+            "params": {}
+        }
+        # Parse form data if POST and content-type is urlencoded
+        if method.upper() == "POST":
+            content_type = headers.get("content-type", "")
+            if "application/x-www-form-urlencoded" in content_type:
+                form_data = urllib.parse.parse_qs(body.text())
+                request_map["form"] = {k: v[0] if len(v)==1 else v for k,v in form_data.items()}
+
+        # Call the Mrya handler with the request map
+        response_map = call_handler(request_map)
+        interpreter.output.flush() # Show what the handler output, whatever the flush policy
+        status_code = int(response_map.get("status", 500)) 
+        response_body_raw = response_map.get("body", b"")
+    
+    # Default content type
+    content_type = "text/html; charset=utf-8"
+    response_body_bytes = b""
+    
+    # If the body is raw bytes (from fetch()), it's likely a static file.
+    # Determine the content type from the request path.
+    if isinstance(response_body_raw, bytes):
+        content_type_map = {
+            ".css": "text/css",
+            ".js": "application/javascript",
+            ".json": "application/json",
+            ".png": "image/png",
+            ".jpg": "image/jpeg",
+            ".jpeg": "image/jpeg",
+            ".gif": "image/gif",
+            ".svg": "image/svg+xml",
+            ".ico": "image/x-icon"
+        }
+        file_ext = os.path.splitext(path)[1]
+        # Default to a generic byte stream if extension is unknown
+        content_type = content_type_map.get(file_ext, "application/octet-stream") 
+        response_body_bytes = response_body_raw
+    else:
+        # It's a regular string response, encode it.
+        response_body_bytes = str(response_body_raw).encode('utf-8')
+
+    # Construct HTTP response
+    status_text = {200: "OK", 404: "Not Found", 500: "Internal Server Error"}.get(status_code, "Error")
+    response = f"HTTP/1.1 {status_code} {status_text}\r\n"
+    response += f"Content-Type: {content_type}\r\n"
+    response += f"Content-Length: {len(response_body_bytes)}\r\n"
+    if keep_alive:
+        response += f"Connection: keep-alive\r\nKeep-Alive: timeout={int(timeout)}, max={remaining}\r\n\r\n"
+    else:
+        response += "Connection: close\r\n\r\n"
+
+    return response.encode('utf-8') + response_body_bytes, keep_alive
+
+# Connections are handled by a fixed number of threads (config key THREADS). Accepted connections
+# wait in a queue of limited size (QUEUE_SIZE) for a free thread; once it's full, new ones are
+# turned away with 503 Service Unavailable at once, rather than piling up threads and memory. More
+# connections than that can wait in the system's backlog (BACKLOG) before they're even accepted.
+THREADS = 16
+QUEUE_SIZE = 64
+BACKLOG = 128
+
+# The pool of the running server, for stats().
+connection_pool = None
+
+class ConnectionPool:
+    """
+    The threads handling connections, and the accepted connections waiting for them. With the
+    selectors backend, the threads handle single requests, which wait in the queue the same way.
+    """
+    def __init__(self, threads, queue_size, handle):
+        self.handle = handle
+        self.waiting = queue.Queue(queue_size)
+        self.counts_lock = threading.Lock()
+        self.accepted = 0
+        self.rejected = 0
+        self.busy = 0
+        # Daemon threads, so a server stopped with Ctrl+C doesn't wait on idle ones.
+        self.threads = [threading.Thread(target=self.work, daemon=True) for _ in range(threads)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, item):
+        """Queues a connection (or request) for a thread. Returns False, to turn it away, if the queue is full."""
         try:
-            method, full_path, _ = lines[0].split()
-        except ValueError:
-            return # Malformed request line
-
-        # Parse path and query string
-        parsed_url = urllib.parse.urlparse(full_path)
-        path = parsed_url.path
-        query = urllib.parse.parse_qs(parsed_url.query)
-
-        # Parse headers
-        headers = {}
-        i = 1
-        while i < len(lines) and lines[i] != "":
-            if ": " in lines[i]:
-                key, value = lines[i].split(": ", 1)
-                headers[key.lower()] = value
-            i += 1
-
-        # Read body if POST or PUT
-        body = b""
-        content_length = int(headers.get("content-length", "0"))
-        if content_length > 0:
-            remaining = content_length - len(request_data.split(b"\r\n\r\n",1)[1])
-            while remaining > 0:
-                chunk = client_socket.recv(min(1024, remaining))
-                if not chunk:
-                    break
-                body += chunk
-                remaining -= len(chunk)
-            body = request_data.split(b"\r\n\r\n",1)[1] + body
-        else:
-            body = request_data.split(b"\r\n\r\n",1)[1] if b"\r\n\r\n" in request_data else b""
-
-        # Simple security check for allowed IPs if configured
-        client_ip = client_socket.getpeername()[0]
-        allowed_ips = mrya_context.get("config", {}).get("ALLOWED_IPS")
-        if allowed_ips is not None and isinstance(allowed_ips, list) and client_ip not in allowed_ips:
-            # Send a 403 Forbidden response
-            response = "HTTP/1.1 403 Forbidden\r\nConnection: close\r\n\r\n"
-            client_socket.sendall(response.encode('utf-8'))
-            return
-        interpreter = mrya_context.get("interpreter")
-        handler = mrya_context.get("handler")
+            self.waiting.put_nowait(item)
+        except queue.Full:
+            with self.counts_lock:
+                self.rejected += 1
+            return False
+        with self.counts_lock:
+            self.accepted += 1
+        return True
 
-        if not interpreter or not handler:
-            response_body = "Mrya handler not configured."
-            status_code = 500
-        else:
-            # Build request map for Mrya handler
-            request_map = {
-                "method": method,
-                "path": path,
-                "query": {k: v[0] if len(v)==1 else v for k,v in query.items()},
-                "headers": headers,
-                "body": body.decode('utf-8', errors='replace'),
-                "form": {},
-                "params": {}
-            }
-            # Parse form data if POST and content-type is urlencoded
-            if method.upper() == "POST":
-                content_type = headers.get("content-type", "")
-                if "application/x-www-form-urlencoded" in content_type:
-                    form_data = urllib.parse.parse_qs(request_map["body"])
-                    request_map["form"] = {k: v[0] if len(v)==1 else v for k,v in form_data.items()}
-
-            # Call the Mrya handler with the request map
-            response_map = interpreter.call_function_or_method(handler, [request_map])
-            status_code = int(response_map.get("status", 500)) 
-            response_body_raw = response_map.get("body", b"")
-        
-        # Default content type
-        content_type = "text/html; charset=utf-8"
-        response_body_bytes = b""
-        
-        # If the body is raw bytes (from fetch()), it's likely a static file.
-        # Determine the content type from the request path.
-        if isinstance(response_body_raw, bytes):
-            content_type_map = {
-                ".css": "text/css",
-                ".js": "application/javascript",
-                ".json": "application/json",
-                ".png": "image/png",
-                ".jpg": "image/jpeg",
-                ".jpeg": "image/jpeg",
-                ".gif": "image/gif",
-                ".svg": "image/svg+xml",
-                ".ico": "image/x-icon"
+    def work(self):
+        while True:
+            item = self.waiting.get()
+            if item is None:
+                return
+            with self.counts_lock:
+                self.busy += 1
+            try:
+                self.handle(item)
+            except Exception:
+                traceback.print_exc() # One failing connection shouldn't take its thread with it
+            finally:
+                with self.counts_lock:
+                    self.busy -= 1
+
+    def stop(self, timeout):
+        """Lets the threads finish the connections already accepted, waiting up to `timeout` seconds."""
+        deadline = time.monotonic() + timeout
+        for _ in self.threads:
+            self.waiting.put(None)
+        for thread in self.threads:
+            thread.join(max(0, deadline - time.monotonic()))
+
+    def stats(self):
+        with self.counts_lock:
+            return {
+                "threads": len(self.threads),
+                "busy": self.busy,
+                "queued": self.waiting.qsize(),
+                "queue_size": self.waiting.maxsize,
+                "accepted": self.accepted,
+                "rejected": self.rejected,
             }
-            file_ext = os.path.splitext(path)[1]
-            # Default to a generic byte stream if extension is unknown
-            content_type = content_type_map.get(file_ext, "application/octet-stream") 
-            response_body_bytes = response_body_raw
-        else:
-            # It's a regular string response, encode it.
-            response_body_bytes = str(response_body_raw).encode('utf-8')
-
-        # Construct HTTP response
-        status_text = {200: "OK", 404: "Not Found", 500: "Internal Server Error"}.get(status_code, "Error")
-        response = f"HTTP/1.1 {status_code} {status_text}\r\n"
-        response += f"Content-Type: {content_type}\r\n"
-        response += f"Content-Length: {len(response_body_bytes)}\r\n"
-        response += "Connection: close\r\n\r\n"
 
-        client_socket.sendall(response.encode('utf-8') + response_body_bytes)
+UNAVAILABLE = b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\nRetry-After: 1\r\nConnection: close\r\n\r\n"
+
+def reject(client_socket):
+    """Turns a connection away with 503, without waiting on the client."""
+    try:
+        client_socket.setblocking(False)
+        try:
+            client_socket.recv(65536) # Read what's arrived, or closing would reset the connection before the reply is read
+        except (BlockingIOError, ConnectionError):
+            pass
+        client_socket.send(UNAVAILABLE)
+        client_socket.shutdown(socket.SHUT_WR)
+    except OSError:
+        pass
     finally:
         client_socket.close()
 
-def server_loop(host, port):
+def stats():
+    """http_server.stats(): a map of how busy this server process is: its threads, busy threads, queued and rejected connections."""
+    if connection_pool is None:
+        raise RuntimeError("The server isn't running.")
+    return connection_pool.stats()
+
+def open_listener(host, port, backlog=BACKLOG):
+    """Binds the server's listening socket."""
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     server_socket.bind((host, port))
-    server_socket.listen(5)
-    print(f"Mrya server running on http://{host}:{port} ...")
+    server_socket.listen(backlog)
+    return server_socket
 
+# How connections are read from and written to (config key SERVER_BACKEND).
+# "threads": a connection has a pool thread to itself while it's open, which reads and writes with
+# blocking calls. An open connection, even an idle one, holds a thread.
+# "selectors": one thread watches every connection at once and only reads and writes what's ready,
+# so an idle connection costs just its socket and buffer, and tens of thousands can stay open.
+# Complete requests go to the pool's threads, where the Mrya handler is free to block.
+SERVER_BACKENDS = ("threads", "selectors")
+
+def serve(server_socket):
+    """Serves connections until the listening socket is closed, leaving the pool to be stopped."""
+    global connection_pool
+    config = mrya_context.get("config", {})
+    if config.get("SERVER_BACKEND", "threads") == "selectors":
+        loop = EventLoop(server_socket)
+        connection_pool = ConnectionPool(config.get("THREADS", THREADS), config.get("QUEUE_SIZE", QUEUE_SIZE), loop.run_request)
+        loop.run()
+    else:
+        connection_pool = ConnectionPool(config.get("THREADS", THREADS), config.get("QUEUE_SIZE", QUEUE_SIZE), handle_client)
+        accept_loop(server_socket)
+
+def accept_loop(server_socket):
+    """Hands connections to the pool's threads until the listening socket is closed."""
     while True:
-        client_socket, addr = server_socket.accept()
-        client_thread = threading.Thread(target=handle_client, args=(client_socket,))
-        client_thread.start()
+        try:
+            client_socket, addr = server_socket.accept()
+        except OSError:
+            if stopping.is_set() or server_socket.fileno() == -1:
+                return # Closed (or shut down) to stop
+            raise
+        if not connection_pool.submit(client_socket):
+            reject(client_socket)
+
+class Connection:
+    """A client connection of the selectors backend."""
+    __slots__ = ("socket", "ip", "parser", "outgoing", "handled", "keep_alive")
+
+    def __init__(self, client_socket, ip):
+        self.socket = client_socket
+        self.ip = ip
+        self.parser = new_parser() # Holds what's been received, but not yet taken by a request
+        self.outgoing = None # The part of the response still to send
+        self.handled = 0
+        self.keep_alive = False
+
+class EventLoop:
+    """
+    The selectors backend. A connection is either waiting for a request (registered for reading),
+    having one handled (not registered, so pipelined requests wait in its buffer), or being sent the
+    response (registered for writing).
+    """
+    def __init__(self, server_socket):
+        config = mrya_context.get("config", {})
+        self.timeout = config.get("KEEP_ALIVE_TIMEOUT", KEEP_ALIVE_TIMEOUT)
+        self.max_requests = config.get("MAX_KEEP_ALIVE_REQUESTS", MAX_KEEP_ALIVE_REQUESTS)
+        self.server_socket = server_socket
+        self.selector = selectors.DefaultSelector()
+        self.open = 0
+        # Connections waiting for a request, the longest idle first, with when they were last active.
+        self.idle = collections.OrderedDict()
+        # Responses from the pool's threads, passed to the loop with a byte on the wake-up socket.
+        self.finished = collections.deque()
+        self.wake_reader, self.wake_writer = socket.socketpair()
+        self.wake_reader.setblocking(False)
+        self.wake_writer.setblocking(False)
+
+    def run(self):
+        """Serves until the listening socket is closed (or the server is stopping), then finishes the requests being handled."""
+        self.server_socket.setblocking(False)
+        self.selector.register(self.server_socket, selectors.EVENT_READ, (self.accept, None))
+        self.selector.register(self.wake_reader, selectors.EVENT_READ, (self.wake, None))
+        while not stopping.is_set() and self.server_socket.fileno() != -1:
+            self.poll()
+            self.expire(self.timeout or KEEP_ALIVE_TIMEOUT)
+        try:
+            self.selector.unregister(self.server_socket)
+        except (KeyError, ValueError):
+            pass
+        deadline = time.monotonic() + SHUTDOWN_GRACE
+        while self.open and time.monotonic() < deadline:
+            self.expire(0) # No new requests once stopping
+            self.poll()
+        for key in list(self.selector.get_map().values()):
+            if key.data[1] is not None:
+                self.close(key.data[1])
+        self.selector.close()
+        self.wake_reader.close()
+        self.wake_writer.close()
+
+    def poll(self):
+        for key, mask in self.selector.select(timeout=POLL_INTERVAL):
+            callback, connection = key.data
+            callback(connection)
+
+    def expire(self, timeout):
+        """Closes the connections idle for `timeout` seconds or more."""
+        limit = time.monotonic() - timeout
+        idle = self.idle
+        while idle:
+            connection, since = next(iter(idle.items()))
+            if since > limit:
+                break
+            self.close(connection)
+
+    def accept(self, _):
+        for _ in range(100): # A batch at a time, so a flood of connections doesn't starve the rest
+            try:
+                client_socket, addr = self.server_socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return # The listening socket was closed to shut down, or out of file descriptors for now
+            client_socket.setblocking(False)
+            connection = Connection(client_socket, addr[0])
+            self.open += 1
+            self.wait_for_request(connection)
+
+    def wait_for_request(self, connection):
+        self.selector.register(connection.socket, selectors.EVENT_READ, (self.read, connection))
+        self.idle[connection] = time.monotonic()
+
+    def read(self, connection):
+        try:
+            count = connection.parser.receive(connection.socket)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            count = 0
+        if not count:
+            self.close(connection)
+            return
+        self.idle[connection] = time.monotonic()
+        self.idle.move_to_end(connection)
+        self.next_request(connection)
+
+    def next_request(self, connection):
+        """Starts handling the next request in the connection's buffer, if it's all arrived."""
+        parser = connection.parser
+        try:
+            request = parser.next_request()
+        except RequestError as e:
+            self.selector.unregister(connection.socket)
+            del self.idle[connection]
+            self.respond(connection, error_response(e), False)
+            return
+        if request is None:
+            if parser.send_continue:
+                parser.send_continue = False
+                try:
+                    connection.socket.send(CONTINUE)
+                except OSError:
+                    pass # Small enough to fit unless the client's gone, which the next read finds out
+            return
+        connection.handled += 1
+        keep_alive = stays_open(request, connection.handled, self.timeout, self.max_requests, holds_thread=False)
+        self.selector.unregister(connection.socket)
+        del self.idle[connection]
+        if not connection_pool.submit((connection, request, keep_alive)):
+            self.respond(connection, UNAVAILABLE, False)
+
+    def run_request(self, item):
+        """On a pool thread: works out the response, then passes it back to the loop to send."""
+        connection, request, keep_alive = item
+        response = None
+        try:
+            response, keep_alive = build_response(connection.ip, request, keep_alive, self.timeout,
+                                                  self.max_requests - connection.handled)
+        finally:
+            request[4].close()
+            # A failed handler's connection is closed by the loop (response None); the error is reported by the pool.
+            self.finished.append((connection, response, keep_alive))
+            try:
+                self.wake_writer.send(b"\0")
+            except BlockingIOError:
+                pass # Already full of wake-ups the loop hasn't read
+
+    def wake(self, _):
+        try:
+            while self.wake_reader.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+        finished = self.finished
+        while finished:
+            connection, response, keep_alive = finished.popleft()
+            if response is None:
+                self.close(connection)
+            else:
+                self.respond(connection, response, keep_alive)
+
+    def respond(self, connection, response, keep_alive):
+        connection.keep_alive = keep_alive
+        connection.outgoing = memoryview(response)
+        if self.send(connection):
+            self.selector.register(connection.socket, selectors.EVENT_WRITE, (self.write, connection))
+        else:
+            self.sent(connection)
+
+    def write(self, connection):
+        if not self.send(connection):
+            self.selector.unregister(connection.socket)
+            self.sent(connection)
+
+    def send(self, connection):
+        """Sends what it can of the response. Returns whether there's still more to send."""
+        try:
+            sent = connection.socket.send(connection.outgoing)
+        except (BlockingIOError, InterruptedError):
+            return True
+        except OSError:
+            connection.keep_alive = False # Gone, so there's nothing more to send
+            return False
+        connection.outgoing = connection.outgoing[sent:]
+        return len(connection.outgoing) > 0
+
+    def sent(self, connection):
+        connection.outgoing = None
+        if not connection.keep_alive:
+            self.close(connection)
+            return
+        self.wait_for_request(connection)
+        self.next_request(connection) # Requests the client sent without waiting for this response
+
+    def close(self, connection):
+        try:
+            self.selector.unregister(connection.socket)
+        except (KeyError, ValueError):
+            pass
+        self.idle.pop(connection, None)
+        connection.socket.close()
+        self.open -= 1
+
+def server_loop(host, port):
+    server_socket = open_listener(host, port, mrya_context["config"].get("BACKLOG", BACKLOG))
+    print(f"Mrya server running on http://{host}:{port} ...")
+    serve(server_socket)
 
 def file_watcher(interpreter, watch_dirs):
     """Monitors files for changes and restarts the script."""
     mtimes = {}
     while True:
-        for directory in watch_dirs:
-            for root, _, files in os.walk(directory):
-                for filename in files:
-                    # Watch Mrya, HTML, CSS, and JS files
-                    if filename.endswith(('.mrya', '.html', '.css', '.js')):
-                        path = os.path.join(root, filename)
-                        try:
-                            mtime = os.stat(path).st_mtime
-                            if path not in mtimes:
-                                mtimes[path] = mtime
-                            elif mtimes[path] < mtime:
-                                print(f"\n* Change detected in '{path}'. Restarting server...")
-                                # This replaces the current process with a new one
-                                os.execv(sys.executable, [sys.executable] + sys.argv)
-                        except FileNotFoundError:
-                            # File might have been deleted, restart
-                            print(f"\n* Deletion detected for '{path}'. Restarting server...")
-                            os.execv(sys.executable, [sys.executable] + sys.argv)
+        check_for_changes(interpreter, watch_dirs, mtimes)
         interpreter.native_modules['time'].methods['sleep'](1)
 
-def run_server(interpreter, handler, host, port, config):
+def check_for_changes(interpreter, watch_dirs, mtimes, before_restart=None):
+    """Restarts the script if a watched file changed since the last check. `mtimes` carries over between checks."""
+    for directory in watch_dirs:
+        for root, _, files in os.walk(directory):
+            for filename in files:
+                # Watch Mrya, HTML, CSS, and JS files
+                if filename.endswith(('.mrya', '.html', '.css', '.js')):
+                    path = os.path.join(root, filename)
+                    try:
+                        mtime = os.stat(path).st_mtime
+                        if path not in mtimes:
+                            mtimes[path] = mtime
+                        elif mtimes[path] < mtime:
+                            restart(interpreter, f"\n* Change detected in '{path}'. Restarting server...", before_restart)
+                    except FileNotFoundError:
+                        # File might have been deleted, restart
+                        restart(interpreter, f"\n* Deletion detected for '{path}'. Restarting server...", before_restart)
+
+def restart(interpreter, message, before_restart=None):
+    if before_restart is not None:
+        before_restart()
+    interpreter.output.flush()
+    print(message)
+    # This replaces the current process with a new one
+    os.execv(sys.executable, [sys.executable] + sys.argv)
+
+def watch_dirs():
+    # The current directory (where the script is run) and the packages directory
+    return [os.getcwd(), os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "packages"))]
+
+# --- Worker processes (config key WORKERS) ---
+# The master process has already parsed the program and run its imports when run_server is called,
+# so forked workers start as copies of it, ready to serve. They all accept from the one listening
+# socket they inherit, which spreads connections across them (and so across CPU cores).
+SHUTDOWN_GRACE = 10 # Seconds a stopping worker gets to finish the requests it's handling
+POLL_INTERVAL = 1 # Seconds between the master's checks on its workers (and on watched files, in DEBUG mode)
+
+class _Shutdown(Exception):
+    """Raised in the master by SIGTERM, to stop the workers the same way as Ctrl+C."""
+
+def run_workers(interpreter, server_socket, count, debug):
+    """Runs `count` worker processes on `server_socket`, replacing any that die, until interrupted."""
+    workers = {} # pid -> when it started
+
+    def start_worker():
+        pid = os.fork()
+        if pid == 0:
+            worker_main(interpreter, server_socket)
+        workers[pid] = time.monotonic()
+
+    def stop_workers():
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + SHUTDOWN_GRACE + 1
+        while workers and time.monotonic() < deadline:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+            if pid:
+                workers.pop(pid, None)
+            else:
+                time.sleep(0.05)
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGKILL) # Still busy after the grace period
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+        workers.clear()
+
+    def on_sigterm(signum, frame):
+        raise _Shutdown()
+
+    for _ in range(count):
+        start_worker()
+    signal.signal(signal.SIGTERM, on_sigterm)
+    mtimes = {}
+    try:
+        while True:
+            if debug:
+                check_for_changes(interpreter, watch_dirs(), mtimes, before_restart=stop_workers)
+            # Replace workers that died, unless they were stopped on purpose.
+            while workers:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+                if not pid:
+                    break
+                started = workers.pop(pid, None)
+                if started is None:
+                    continue
+                print(f"* Worker {pid} stopped unexpectedly (exit code {os.waitstatus_to_exitcode(status)}). Starting a new one.")
+                if time.monotonic() - started < POLL_INTERVAL:
+                    time.sleep(POLL_INTERVAL) # Don't spin if workers die as soon as they start
+                start_worker()
+            time.sleep(POLL_INTERVAL)
+    except (KeyboardInterrupt, _Shutdown):
+        print("\nShutting down server.")
+    finally:
+        stop_workers()
+        server_socket.close()
+
+def worker_main(interpreter, server_socket):
+    """The body of a forked worker: serves until the master sends SIGTERM, then finishes its requests and exits."""
+    exit_code = 0
+    try:
+        random.seed() # Or every worker would draw the same "random" numbers as the master
+        # Ctrl+C reaches the whole process group; the master handles it and stops the workers.
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        def on_sigterm(signum, frame):
+            stopping.set()
+            server_socket.close()
+        signal.signal(signal.SIGTERM, on_sigterm)
+        serve(server_socket)
+        connection_pool.stop(SHUTDOWN_GRACE) # Finish the requests still being handled
+    except BaseException:
+        traceback.print_exc()
+        exit_code = 1
+    finally:
+        interpreter.output.flush()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        # Skip the interpreter shutdown the master still has to do itself (atexit handlers and the like).
+        os._exit(exit_code)
+
+def configure(interpreter, handler, config):
+    """Checks the config and sets up the context the server's threads answer requests with."""
     global mrya_context
-    mrya_context = {"interpreter": interpreter, "handler": handler, "config": config}
-    
+    policy = config.get("GLOBALS", "shared")
+    if policy not in GLOBALS_POLICIES:
+        raise RuntimeError(f"Unknown GLOBALS policy '{policy}', expected one of: {', '.join(GLOBALS_POLICIES)}.")
+    for key in ("WORKERS", "THREADS", "QUEUE_SIZE", "BACKLOG", "MAX_HEADER_SIZE", "MAX_BODY_SIZE", "MAX_BODY_IN_MEMORY"):
+        value = config.get(key, 1)
+        if type(value) is not int or value < 1:
+            raise RuntimeError(f"{key} must be a positive whole number, but got '{value}'.")
+    for key in ("KEEP_ALIVE_TIMEOUT", "MAX_KEEP_ALIVE_REQUESTS"):
+        value = config.get(key, 1)
+        if type(value) not in (int, float) or value < 0:
+            raise RuntimeError(f"{key} must be a number that's 0 or more, but got '{value}'.")
+    backend = config.get("SERVER_BACKEND", "threads")
+    if backend not in SERVER_BACKENDS:
+        raise RuntimeError(f"Unknown SERVER_BACKEND '{backend}', expected one of: {', '.join(SERVER_BACKENDS)}.")
+    lock = threading.Lock() if policy == "serialized" else None
+    mrya_context = {"interpreter": interpreter, "handler": handler, "config": config, "lock": lock}
+
+def run_server(interpreter, handler, host, port, config):
+    configure(interpreter, handler, config)
+    workers = config.get("WORKERS", 1)
+    interpreter.output.flush() # The server runs until the process ends, so don't hold output back
+
+    if workers > 1:
+        if hasattr(os, "fork"):
+            server_socket = open_listener(host, int(port), config.get("BACKLOG", BACKLOG))
+            print(f"Mrya server running on http://{host}:{port} with {workers} worker processes ...")
+            if config.get("DEBUG"):
+                print("* Debug mode is ON. Watching for file changes...")
+            sys.stdout.flush() # Before forking, so the workers don't print it again
+            run_workers(interpreter, server_socket, workers, config.get("DEBUG"))
+            return None
+        print("* Worker processes need os.fork(), which this system doesn't have. Running in one process.")
+
     # Run the server loop in a daemon thread
     server_thread = threading.Thread(target=server_loop, args=(host, int(port)))
     server_thread.daemon = True
@@ -191,11 +716,67 @@ def run_server(interpreter, handler, host, port, config):
     if config.get("DEBUG"):
         print("* Debug mode is ON. Watching for file changes...")
         # Watch the current directory (where the script is run) and the packages directory
-        watch_dirs = [os.getcwd(), os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "packages"))]
-        file_watcher(interpreter, watch_dirs)
+        file_watcher(interpreter, watch_dirs())
     else:
         try:
             while True:
                 interpreter.native_modules['time'].methods['sleep'](3600) # Sleep for a long time
         except KeyboardInterrupt:
-            print("\nShutting down server.")
\ No newline at end of file
+            print("\nShutting down server.")
+
+# A server started with http_server.start(), which serves from a background thread while the program
+# goes on, e.g. a test sending it requests. Only one runs at a time, in the program's own process.
+background_server = None
+
+class BackgroundServer:
+    """A server started by http_server.start()."""
+    __slots__ = ("socket", "thread")
+
+    def __init__(self, server_socket, thread):
+        self.socket = server_socket
+        self.thread = thread
+
+    def __str__(self):
+        return f"<http server on port {port(self)}>"
+
+def start_server(interpreter, handler, host, port, config):
+    """
+    http_server.start(handler, host, port, config): like run(), but returns at once with the server,
+    which is served from a background thread until server.stop(). Port 0 picks a free port, which
+    server.port() tells. WORKERS and DEBUG are ignored.
+    """
+    global background_server
+    if background_server is not None:
+        raise RuntimeError("A server started with http_server.start() is already running; stop it first.")
+    configure(interpreter, handler, config)
+    server_socket = open_listener(host, int(port), config.get("BACKLOG", BACKLOG))
+    thread = threading.Thread(target=serve, args=(server_socket,), daemon=True)
+    thread.start()
+    background_server = BackgroundServer(server_socket, thread)
+    return background_server
+
+def port(server):
+    """server.port(): the port the server is listening on."""
+    return server.socket.getsockname()[1]
+
+def stop(server):
+    """server.stop(): stops taking connections and returns once the requests being handled are answered."""
+    global background_server
+    if server is not background_server:
+        return None # Already stopped
+    stopping.set()
+    try:
+        server.socket.shutdown(socket.SHUT_RDWR) # Wakes the thread waiting to accept a connection
+    except OSError:
+        pass
+    server.thread.join()
+    connection_pool.stop(SHUTDOWN_GRACE)
+    server.socket.close()
+    stopping.clear()
+    background_server = None
+    return None
+
+BackgroundServer.native_methods = natives({
+    "port": port,
+    "stop": stop,
+})
@@ -0,0 +1,144 @@
+import threading
+import time as py_time
+from collections import OrderedDict
+
+from mrya_ast import FunctionDeclaration
+from mrya_natives import NativeFunction
+
+DEFAULT_MAXSIZE = 128
+
+class MemoCache:
+    """The results of one memoized function, keyed by its arguments, with LRU and TTL eviction."""
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize # None for no limit
+        self.ttl = ttl # Seconds a result stays valid, or None to keep it until it's evicted
+        self.entries = OrderedDict() # key -> (result, expiry time), least recently used first
+        self.hits = 0
+        self.misses = 0
+        # Request handlers run on several threads, and may share a memoized helper.
+        self.lock = threading.Lock()
+
+    def lookup(self, key):
+        """Returns (True, result) for a live entry, or (False, None)."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                result, expires = entry
+                if expires is None or py_time.monotonic() < expires:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return True, result
+                del self.entries[key]
+            self.misses += 1
+            return False, None
+
+    def store(self, key, result):
+        expires = py_time.monotonic() + self.ttl if self.ttl is not None else None
+        with self.lock:
+            self.entries[key] = (result, expires)
+            self.entries.move_to_end(key)
+            if self.maxsize is not None and len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+            }
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+def memo(*args):
+    """
+    memo(func) or, as a decorator, %memo or %memo(maxsize, ttl): caches a function's results by its
+    arguments. maxsize (default 128, nil for no limit) bounds the number of results kept, dropping the
+    least recently used; ttl (default nil, never) is how many seconds a result stays valid.
+    """
+    if len(args) == 1 and _is_function(args[0]):
+        return _memoize(args[0], DEFAULT_MAXSIZE, None)
+    if len(args) > 2:
+        raise RuntimeError(f"memo() expects a function, or a maxsize and ttl, but got {len(args)} arguments.")
+    maxsize = args[0] if args else DEFAULT_MAXSIZE
+    ttl = args[1] if len(args) > 1 else None
+    if maxsize is not None and (type(maxsize) is not int or maxsize < 1):
+        raise RuntimeError("memo() maxsize must be a positive integer or nil.")
+    if ttl is not None and (type(ttl) not in (int, float) or ttl <= 0):
+        raise RuntimeError("memo() ttl must be a positive number of seconds or nil.")
+
+    def decorator(func):
+        if not _is_function(func):
+            raise RuntimeError("memo() can only decorate functions.")
+        return _memoize(func, maxsize, ttl)
+    return NativeFunction(decorator, name="memo")
+
+def stats(func):
+    """Returns a map of a memoized function's cache: hits, misses, size, maxsize and ttl."""
+    return _cache_of(func).stats()
+
+def clear(func):
+    """Empties a memoized function's cache and resets its stats."""
+    _cache_of(func).clear()
+    return None
+
+def _memoize(func, maxsize, ttl):
+    cache = MemoCache(maxsize, ttl)
+
+    def memoized(interpreter, *arguments):
+        try:
+            key = tuple(_key(argument) for argument in arguments)
+        except TypeError:
+            # Something without a stable identity, like a native handle, so it's never cached.
+            return _call(interpreter, func, list(arguments))
+        found, result = cache.lookup(key)
+        if found:
+            return result
+        result = _call(interpreter, func, list(arguments))
+        cache.store(key, result)
+        return result
+
+    memoized.memo_cache = cache
+    name = getattr(getattr(func, "name", None), "lexeme", None) or "memoized"
+    return NativeFunction(memoized, name=name, needs_interpreter=True)
+
+def _call(interpreter, func, arguments):
+    if type(func) is NativeFunction:
+        return func.invoke(interpreter, arguments)
+    return interpreter.call_function_or_method(func, arguments)
+
+def _cache_of(func):
+    cache = getattr(getattr(func, "function", None), "memo_cache", None)
+    if cache is None:
+        raise RuntimeError("Expected a function decorated with memo.")
+    return cache
+
+def _key(value):
+    """
+    A hashable key for a Mrya value. Lists and maps are keyed by their contents, so equal structures
+    share an entry; other objects (instances, functions) by identity. Strings, ints and nil are used
+    as they are; floats and bools are tagged with their type, so `1`, `1.0` and `true` stay apart.
+    """
+    value_type = type(value)
+    if value_type is str or value_type is int or value is None:
+        return value
+    if value_type is list:
+        return (list, tuple(_key(item) for item in value))
+    if value_type is dict:
+        return (dict, frozenset((_key(key), _key(item)) for key, item in value.items()))
+    if value_type is float or value_type is bool:
+        return (value_type, value)
+    hash(value) # Raises TypeError for unhashable values
+    return (object, value)
+
+def _is_function(value):
+    # Only needed when a decorator is applied, by which time mrya_interpreter (which imports this
+    # module while it loads) has defined these.
+    from mrya_interpreter import MryaBoundMethod, MryaModuleMethod
+    return isinstance(value, (FunctionDeclaration, MryaBoundMethod, MryaModuleMethod, NativeFunction))
@@ -0,0 +1,149 @@
+import asyncio
+import sys
+
+from mrya_natives import NativeFunction, awaitable, natives
+from modules.tasks import is_awaitable
+
+# The socket API waits on the network, so it's used with `await` inside async functions (or at the
+# top level): while one connection waits for data, the event loop runs the others.
+
+class MryaConnection:
+    """A TCP connection, from net.connect() or handed to a net.serve() handler. Sends and receives text."""
+    __slots__ = ("reader", "writer")
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    def __str__(self):
+        peer = self.writer.get_extra_info("peername")
+        return f"<connection to {peer[0]}:{peer[1]}>" if peer else "<connection>"
+
+class MryaServer:
+    """A listening socket started by net.serve()."""
+    __slots__ = ("server",)
+
+    def __init__(self, server):
+        self.server = server
+
+    def __str__(self):
+        return f"<server on port {port(self)}>"
+
+def _not_awaited(name):
+    return RuntimeError(f"{name}() has to be awaited, e.g. `let result = await {name}(...)`.")
+
+# --- net.* ---
+def connect(host, port):
+    """net.connect(host, port): opens a connection. Has to be awaited."""
+    raise _not_awaited("net.connect")
+
+async def connect_async(host, port):
+    reader, writer = await asyncio.open_connection(str(host), int(port))
+    return MryaConnection(reader, writer)
+
+def serve(interpreter, host, port, handler):
+    """
+    net.serve(host, port, handler): listens for connections, calling handler(connection) for each one
+    as a task of its own; an async handler can wait on its connection without holding up the others.
+    Port 0 picks a free port, which server.port() tells. Has to be awaited.
+    """
+    raise _not_awaited("net.serve")
+
+async def serve_async(interpreter, host, port, handler):
+    async def on_connection(reader, writer):
+        connection = MryaConnection(reader, writer)
+        try:
+            if type(handler) is NativeFunction:
+                result = handler.invoke(interpreter, [connection])
+            else:
+                result = interpreter.call_function_or_method(handler, [connection])
+            if is_awaitable(result):
+                await result
+        except Exception as e:
+            # One failing connection shouldn't stop the server, so it's reported and closed.
+            print(f"Error in connection handler: {e}", file=sys.stderr)
+        finally:
+            writer.close()
+    server = await asyncio.start_server(on_connection, str(host), int(port))
+    return MryaServer(server)
+
+# --- connection.* ---
+def send(connection, data):
+    """connection.send(data): sends text (or the bytes from fetch_raw). Has to be awaited."""
+    raise _not_awaited("send")
+
+async def send_async(connection, data):
+    connection.writer.write(data if isinstance(data, bytes) else str(data).encode("utf-8"))
+    await connection.writer.drain()
+
+def receive(connection, max_bytes=65536):
+    """connection.receive(max_bytes): the next text to arrive, up to max_bytes; "" once the other side is done. Has to be awaited."""
+    raise _not_awaited("receive")
+
+async def receive_async(connection, max_bytes=65536):
+    data = await connection.reader.read(int(max_bytes))
+    return data.decode("utf-8", errors="replace")
+
+def receive_line(connection):
+    """connection.receive_line(): the next line, without its line ending; nil once the other side is done. Has to be awaited."""
+    raise _not_awaited("receive_line")
+
+async def receive_line_async(connection):
+    line = await connection.reader.readline()
+    if not line:
+        return None
+    return line.decode("utf-8", errors="replace").rstrip("\r\n")
+
+def close_connection(connection):
+    """connection.close(): closes the connection. Awaiting it also waits until it's closed."""
+    connection.writer.close()
+    return None
+
+async def close_connection_async(connection):
+    connection.writer.close()
+    try:
+        await connection.writer.wait_closed()
+    except OSError:
+        pass # Already reset by the other side, so it's closed either way
+
+# --- server.* ---
+def port(server):
+    """server.port(): the port the server is listening on."""
+    return server.server.sockets[0].getsockname()[1] if server.server.sockets else None
+
+def serve_forever(server):
+    """server.serve_forever(): keeps handling connections until the server is closed. Has to be awaited."""
+    raise _not_awaited("serve_forever")
+
+async def serve_forever_async(server):
+    try:
+        await server.server.serve_forever()
+    except asyncio.CancelledError:
+        if server.server.is_serving():
+            raise
+        # Closed by server.close(), which ends the wait normally.
+
+def close_server(server):
+    """server.close(): stops listening. Connections already being handled carry on."""
+    server.server.close()
+    return None
+
+MryaConnection.native_methods = awaitable(natives({
+    "send": send,
+    "receive": receive,
+    "receive_line": receive_line,
+    "close": close_connection,
+}), {
+    "send": send_async,
+    "receive": receive_async,
+    "receive_line": receive_line_async,
+    "close": close_connection_async,
+})
+
+MryaServer.native_methods = awaitable(natives({
+    "port": port,
+    "serve_forever": serve_forever,
+    "close": close_server,
+}), {
+    "serve_forever": serve_forever_async,
+})
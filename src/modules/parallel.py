@@ -0,0 +1,178 @@
+import io
+import multiprocessing
+import os
+import pickle
+
+from mrya_ast import FunctionDeclaration
+from mrya_natives import NativeFunction, natives
+
+# The interpreter forked workers run calls on. Set just before a pool forks, so every worker starts
+# with a copy of it: the parsed program, its global variables and the module cache.
+_interpreter = None
+
+class WorkerError(Exception):
+    """A call that failed inside a worker, carried back to the parent as its message."""
+
+class MryaPool:
+    """
+    Worker processes forked from the running program, for spreading CPU-bound calls across cores.
+    Functions and classes travel between processes by name, so only what was defined when the pool
+    started (top-level functions and classes, and functions of imported modules) can be used with it.
+    Where processes can't be forked (e.g. on Windows), calls run one by one in this process instead.
+    """
+    def __init__(self, interpreter, workers=None):
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if type(workers) is not int or workers < 1:
+            raise RuntimeError("A pool needs a positive whole number of workers.")
+        self.interpreter = interpreter
+        self.workers = workers
+        self.processes = None
+        self.closed = False
+        if "fork" in multiprocessing.get_all_start_methods():
+            global _interpreter
+            _interpreter = interpreter
+            # Flushed first, or every worker would inherit (and later repeat) the buffered output.
+            interpreter.output.flush()
+            self.processes = multiprocessing.get_context("fork").Pool(workers)
+
+    def map(self, func, items):
+        if isinstance(items, range):
+            items = list(items)
+        if not isinstance(items, list):
+            raise RuntimeError("map() expects a list or range of items.")
+        if self.processes is None:
+            return [_call(self.interpreter, func, item) for item in items]
+        if not items:
+            return []
+
+        # A few chunks per worker keeps them all busy when some items take longer than others,
+        # while sending each chunk as one message.
+        size = max(1, -(-len(items) // (self.workers * 4)))
+        chunks = [_dumps(self.interpreter, (func, items[start:start + size])) for start in range(0, len(items), size)]
+        try:
+            replies = self.processes.map(_run_chunk, chunks, chunksize=1)
+        except WorkerError as e:
+            raise RuntimeError(f"A worker failed: {e}")
+        results = []
+        for reply in replies:
+            results.extend(_loads(self.interpreter, reply))
+        return results
+
+    def close(self):
+        self.closed = True
+        if self.processes is not None:
+            self.processes.close()
+            self.processes.join()
+            self.processes = None
+
+    def __str__(self):
+        return f"<pool of {self.workers} workers>"
+
+def parallel_map(interpreter, func, items, workers=None):
+    """parallel_map(func, items, workers): like calling func on each item, but spread over worker processes."""
+    workers_pool = MryaPool(interpreter, workers)
+    try:
+        return workers_pool.map(func, items)
+    finally:
+        workers_pool.close()
+
+def pool(interpreter, workers=None):
+    """pool(workers): starts worker processes to reuse across pool.map() calls; pool.close() stops them."""
+    return MryaPool(interpreter, workers)
+
+def map_items(pool, func, items):
+    """pool.map(func, items): the results of func on each item, worked out by the pool's workers."""
+    if pool.closed:
+        raise RuntimeError("This pool has been closed.")
+    return pool.map(func, items)
+
+def close(pool):
+    """pool.close(): stops the pool's workers."""
+    pool.close()
+    return None
+
+MryaPool.native_methods = natives({
+    "map": map_items,
+    "close": close,
+})
+
+# --- In the workers ---
+def _run_chunk(payload):
+    try:
+        func, items = _loads(_interpreter, payload)
+        return _dumps(_interpreter, [_call(_interpreter, func, item) for item in items])
+    except Exception as e:
+        # Mrya's errors hold tokens and can't always be pickled, so only the message goes back.
+        raise WorkerError(str(e)) from None
+    finally:
+        _interpreter.output.flush()
+
+def _call(interpreter, func, item):
+    if type(func) is NativeFunction:
+        return func.invoke(interpreter, [item])
+    return interpreter.call_function_or_method(func, [item])
+
+# --- Sending values between processes ---
+# Lists, maps, strings and numbers are pickled as they are. Functions, classes and module functions
+# hold a whole environment, so they're sent as a name and looked up again on the other side; an
+# instance is its fields and the name of its class.
+class _MryaPickler(pickle.Pickler):
+    def __init__(self, file, interpreter):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        # The types are looked up once per pickler and kept for persistent_id, which checks every
+        # value sent. A module-level import would be circular: mrya_interpreter imports this module.
+        from mrya_interpreter import MryaClass, MryaModuleMethod
+        self.interpreter = interpreter
+        self.class_type = MryaClass
+        self.module_method_type = MryaModuleMethod
+
+    def persistent_id(self, obj):
+        obj_type = type(obj)
+        if obj_type is FunctionDeclaration or obj_type is self.class_type:
+            name = obj.name.lexeme if obj_type is FunctionDeclaration else obj.name
+            box = _globals(self.interpreter).values.get(name)
+            if box is None or box.value is not obj:
+                raise pickle.PicklingError(f"'{name}' isn't a top-level function or class, so workers can't find it.")
+            return ("global", name)
+        if obj_type is self.module_method_type:
+            for path, module in self.interpreter.module_cache.items():
+                if module is obj.module:
+                    return ("module", path, obj.func_decl.name.lexeme)
+            raise pickle.PicklingError(f"The module of '{obj.func_decl.name.lexeme}' isn't an imported file.")
+        return None
+
+class _MryaUnpickler(pickle.Unpickler):
+    def __init__(self, file, interpreter):
+        super().__init__(file)
+        self.interpreter = interpreter
+
+    def persistent_load(self, pid):
+        from mrya_interpreter import MryaBox, MryaModuleMethod
+        if pid[0] == "global":
+            box = _globals(self.interpreter).values.get(pid[1])
+            if box is None:
+                raise pickle.UnpicklingError(f"'{pid[1]}' was defined after the pool started.")
+            return box.value
+        module = self.interpreter.module_cache.get(pid[1])
+        if module is None:
+            raise pickle.UnpicklingError(f"'{pid[1]}' was imported after the pool started.")
+        declaration = module.methods[pid[2]]
+        return MryaModuleMethod(module, declaration.value if isinstance(declaration, MryaBox) else declaration)
+
+def _dumps(interpreter, value):
+    buffer = io.BytesIO()
+    try:
+        _MryaPickler(buffer, interpreter).dump(value)
+    except (pickle.PicklingError, TypeError, AttributeError) as e:
+        raise RuntimeError(f"Can't send a value to a worker: {e}")
+    return buffer.getvalue()
+
+def _loads(interpreter, payload):
+    return _MryaUnpickler(io.BytesIO(payload), interpreter).load()
+
+def _globals(interpreter):
+    env = interpreter.env
+    while env.enclosing is not None:
+        env = env.enclosing
+    return env
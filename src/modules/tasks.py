@@ -0,0 +1,84 @@
+import asyncio
+import functools
+
+from mrya_natives import natives
+
+class MryaTask:
+    """
+    An awaitable started with spawn(): it runs on the interpreter's event loop alongside the rest of
+    the program, making progress whenever whatever is running waits. `await task` gives its result.
+    """
+    __slots__ = ("future", "awaited")
+
+    def __init__(self, future):
+        self.future = future
+        self.awaited = False # Awaited by the program, so it has seen the result (or the error)
+
+    def __await__(self):
+        self.awaited = True
+        return self.future.__await__()
+
+    def __str__(self):
+        if self.future.done():
+            return "<task done>"
+        return "<task running>"
+
+def spawn(interpreter, awaitable):
+    """spawn(awaitable): starts running an awaitable, e.g. an async function's call, and returns its task."""
+    if not is_awaitable(awaitable):
+        raise RuntimeError("spawn() expects something to await, like the result of calling an async function.")
+    task = MryaTask(asyncio.ensure_future(awaitable, loop=interpreter.event_loop()))
+    # The program waits for tasks it never awaited before it ends, and reports their errors then.
+    interpreter.tasks.add(task)
+    def forget(future):
+        if task.awaited or future.cancelled() or future.exception() is None:
+            interpreter.tasks.discard(task)
+    task.future.add_done_callback(forget)
+    return task
+
+def gather(interpreter, *awaitables):
+    """gather(...awaitables): an awaitable for all of them at once, giving a list of their results in order."""
+    loop = interpreter.event_loop()
+    for awaitable in awaitables:
+        if not is_awaitable(awaitable):
+            raise RuntimeError("gather() expects things to await, like the results of calling async functions.")
+    futures = [asyncio.ensure_future(awaitable, loop=loop) for awaitable in awaitables]
+    if not futures:
+        done = loop.create_future()
+        done.set_result([])
+        return done
+    return asyncio.gather(*futures)
+
+def done(task):
+    """task.done(): true once the task has finished, failed or been cancelled."""
+    return task.future.done()
+
+def cancel(task):
+    """task.cancel(): stops the task at the point where it's waiting. Returns false if it had already finished."""
+    return task.future.cancel()
+
+MryaTask.native_methods = natives({
+    "done": done,
+    "cancel": cancel,
+})
+
+def is_awaitable(value):
+    return hasattr(type(value), "__await__")
+
+# --- Awaitable versions of blocking natives ---
+async def sleep(seconds):
+    """await time.sleep(seconds): pauses this task, letting the others run meanwhile."""
+    try:
+        seconds = float(seconds)
+    except (ValueError, TypeError):
+        raise RuntimeError(f"sleep() requires a number, but got '{seconds}'.")
+    await asyncio.sleep(seconds)
+
+def in_thread(function):
+    """
+    An async version of a blocking native, like fetch or store: the call runs on one of the event
+    loop's worker threads, so other tasks carry on while it waits on the disk.
+    """
+    async def run_in_thread(*args):
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(function, *args))
+    return run_in_thread
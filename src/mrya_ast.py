@@ -2,8 +2,9 @@ class Expr:
     pass
 
 class Literal(Expr):
-    def __init__(self, value):
+    def __init__(self, value, token=None):
         self.value = value
+        self.token = token # For a literal folded by the optimizer, the token of the expression it replaced
 
 class HString(Expr):
     def __init__(self, parts):
@@ -16,6 +17,11 @@ class Splat(Expr):
 class Variable(Expr):
     def __init__(self, name_token):  # Accept token, not string
         self.name = name_token       # Store token itself here
+        # Filled in by the resolver: frames to walk up, and the slot in that frame.
+        # A slot of None means a by-name lookup in the module/global scope.
+        self.depth = None
+        self.slot = None
+        self.boxed = True # Whether that slot holds a MryaBox rather than the value itself
 
 class BinaryExpression(Expr):
     def __init__(self, left, operator, right):
@@ -39,14 +45,24 @@ class Unary(Expr):
         self.operator = operator
         self.right = right
 
+class Await(Expr):
+    def __init__(self, keyword, value):
+        self.keyword = keyword  # 'await' token, for error reporting
+        self.value = value  # What's awaited: usually a call of an async function
+
 class This(Expr):
     def __init__(self, keyword):
         self.keyword = keyword
+        self.depth = None
+        self.slot = None
 
 class Inherit(Expr):
     def __init__(self, keyword, method):
         self.keyword = keyword
         self.method = method
+        self.depth = None
+        self.slot = None
+        self.this_slot = None
 
 class Stmt:
     pass
@@ -57,19 +73,25 @@ class LetStatement(Stmt):
         self.initializer = initializer
         self.type_annotation = type_annotation
         self.is_const = is_const
+        self.slot = None
+        self.boxed = True
 
 class OutputStatement(Stmt):
     def __init__(self, expression):
         self.expression = expression
 
 class FunctionDeclaration(Stmt):
-    def __init__(self, name, params, body, decorators=None, is_variadic=False):
+    def __init__(self, name, params, body, decorators=None, is_variadic=False, is_generator=False, is_async=False):
         self.name = name
         self.params = params
         self.body = body
         self.is_variadic = is_variadic
+        self.is_generator = is_generator # True if the body contains a yield
+        self.is_async = is_async # Declared with `async func`
         self.decorators = decorators if decorators is not None else []
         self.env = None # To hold the closure environment
+        self.slot = None
+        self.layout = None # FrameLayout of the body, set by the resolver
 
 class FunctionCall(Expr):
     def __init__(self, callee, arguments):
@@ -80,6 +102,7 @@ class ReturnStatement(Stmt):
     def __init__(self, keyword, value):
         self.keyword = keyword  # 'return' token, for error reporting
         self.value = value  # Expr or None
+        self.tail_call = False # Set by the resolver when the value is a call the function can hand its frame to
 
 class IfStatement(Stmt):
     def __init__(self, condition, then_branch, else_branch=None):
@@ -97,6 +120,12 @@ class ForStatement(Stmt):
         self.variable = variable
         self.iterable = iterable
         self.body = body
+        self.layout = None
+
+class YieldStatement(Stmt):
+    def __init__(self, keyword, value):
+        self.keyword = keyword  # 'yield' token, for error reporting
+        self.value = value  # Expr or None
 
 class BreakStatement(Stmt):
     def __init__(self, keyword):
@@ -110,6 +139,7 @@ class CatchClause(Stmt):
     def __init__(self, error_type, body):
         self.error_type = error_type # Optional IDENTIFIER token
         self.body = body
+        self.layout = None
 
 class TryStatement(Stmt):
     def __init__(self, try_block, catch_clauses, finally_block):
@@ -123,6 +153,7 @@ class ClassDeclaration(Stmt):
         self.methods = methods
         self.superclass = superclass
         self.decorators = decorators if decorators is not None else []
+        self.slot = None
 
 class SetProperty(Stmt):
     def __init__(self, obj, name, value):
@@ -134,6 +165,10 @@ class Assignment(Stmt):
     def __init__(self, name, value):
         self.name = name
         self.value = value
+        self.depth = None
+        self.slot = None
+        self.boxed = True
+        self.proven_guard = None # A type guard the optimizer proved the value passes, see MryaOptimizer
 
 class SubscriptGet(Expr):
     def __init__(self, obj, index_expr, closing_bracket):
@@ -154,11 +189,14 @@ class InputCall(Expr):
 class ImportStatement(Stmt):
     def __init__(self, path_expr):
         self.path_expr = path_expr
+        self.slot = None
 
 class ListLiteral(Expr):
     def __init__(self, elements):
         self.elements = elements
+        self.constant = None # Set by the optimizer when every element is a constant: a list to copy
 
 class MapLiteral(Expr):
     def __init__(self, pairs):
-        self.pairs = pairs # List of (key_expr, value_expr) tuples
\ No newline at end of file
+        self.pairs = pairs # List of (key_expr, value_expr) tuples
+        self.constant = None # Set by the optimizer when every key and value is a constant: a map to copy
\ No newline at end of file
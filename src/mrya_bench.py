@@ -0,0 +1,79 @@
+import sys, os
+sys.path.insert(0, os.path.dirname(__file__))
+
+import argparse
+import contextlib
+import io
+import time
+
+from mrya_lexer import MryaLexer
+from mrya_parser import MryaParser
+from mrya_resolver import MryaResolver
+from mrya_optimizer import MryaOptimizer, DEFAULT_LEVEL
+from mrya_interpreter import ReturnValue
+from mrya_main import ENGINES
+
+# -------------------------
+# Argument parser setup
+# -------------------------
+parser = argparse.ArgumentParser(description="Time MRYA benchmarks under each execution engine.")
+parser.add_argument("files", nargs="*", help="Benchmark files to run (default: every .mrya file in 'benchmarks').")
+parser.add_argument("--engine", action="append", choices=sorted(ENGINES), help="Engine to time; repeat to compare several (default: all).")
+parser.add_argument("-O", type=int, choices=[0, 1, 2], default=DEFAULT_LEVEL, dest="optimize", help="Optimization level to run the benchmarks at.")
+parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark; the best time is reported.")
+
+def run_once(filename, engine, optimize=DEFAULT_LEVEL):
+    """Parses, resolves and runs a file, returning (seconds, captured output)."""
+    with open(filename, 'r') as file:
+        source = file.read()
+
+    start = time.perf_counter()
+    statements = MryaParser(MryaLexer(source).scan_tokens()).parse()
+    statements = MryaOptimizer(optimize).optimize(statements)
+    MryaResolver().resolve(statements)
+    interpreter = ENGINES[engine]()
+    interpreter.optimize_level = optimize
+    interpreter.set_current_directory(os.path.dirname(os.path.abspath(filename)))
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        try:
+            interpreter.interpret(statements)
+        except ReturnValue:
+            pass
+    return time.perf_counter() - start, output.getvalue()
+
+def bench(filename, engines, repeat, optimize=DEFAULT_LEVEL):
+    """Times one file under each engine and checks that every engine printed the same thing."""
+    results = {}
+    expected = None
+    for engine in engines:
+        best = None
+        for _ in range(repeat):
+            seconds, output = run_once(filename, engine, optimize)
+            best = seconds if best is None else min(best, seconds)
+        if expected is None:
+            expected = output
+        elif output != expected:
+            print(f"  warning: engine '{engine}' printed different output for {filename}")
+        results[engine] = best
+    return results
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    engines = args.engine or list(ENGINES)
+    files = args.files or sorted(
+        os.path.join("benchmarks", f) for f in os.listdir("benchmarks") if f.endswith(".mrya")
+    )
+
+    baseline = engines[0]
+    print(f"{'benchmark':<28}" + "".join(f"{engine:>12}" for engine in engines))
+    for filename in files:
+        results = bench(filename, engines, args.repeat, args.optimize)
+        row = f"{os.path.basename(filename):<28}"
+        for engine in engines:
+            row += f"{results[engine]:>11.3f}s"
+        if len(engines) > 1:
+            row += "   " + ", ".join(
+                f"{engine} x{results[baseline] / results[engine]:.2f}" for engine in engines[1:]
+            )
+        print(row)
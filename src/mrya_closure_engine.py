@@ -0,0 +1,785 @@
+from mrya_ast import Expr, Literal, HString, Splat, Variable, Get, BinaryExpression, Logical, Unary, Await, LetStatement, OutputStatement, FunctionDeclaration, FunctionCall, ReturnStatement, IfStatement, WhileStatement, ForStatement, BreakStatement, ContinueStatement, TryStatement, ClassDeclaration, SetProperty, This, Inherit, Assignment, SubscriptGet, SubscriptSet, ImportStatement, ListLiteral, MapLiteral
+from mrya_errors import MryaRuntimeError, MryaTypeError, MryaRaisedError
+from mrya_interpreter import MryaInterpreter, MryaBox, UNBOUND, MryaModule, MryaInstance, MryaBoundMethod, Environment, BREAK, CONTINUE, ReturnSignal, TailCall
+from mrya_tokens import TokenType
+
+def _no_op(it):
+    return None
+
+def _frame(env, depth):
+    while depth:
+        env = env.enclosing
+        depth -= 1
+    return env
+
+class MryaClosureCompiler:
+    """
+    Turns each AST node into a specialized Python closure, once, with its children pre-bound.
+    Statement closures take the interpreter and return a completion signal (or None);
+    expression closures take the interpreter and return a value.
+    """
+    def __init__(self):
+        self._statement_compilers = {
+            LetStatement: self._let,
+            OutputStatement: self._output,
+            ClassDeclaration: self._class,
+            FunctionDeclaration: self._function,
+            ReturnStatement: self._return,
+            IfStatement: self._if,
+            WhileStatement: self._while,
+            ForStatement: self._for,
+            BreakStatement: lambda stmt: lambda it: BREAK,
+            ContinueStatement: lambda stmt: lambda it: CONTINUE,
+            TryStatement: self._try,
+            Assignment: self._assignment,
+            SetProperty: self._set_property,
+            SubscriptSet: self._subscript_set,
+            ImportStatement: self._import,
+        }
+        self._expression_compilers = {
+            Literal: self._literal,
+            Variable: self._variable,
+            ListLiteral: self._list,
+            HString: self._h_string,
+            Get: self._get,
+            Inherit: lambda expr: lambda it: it._inherit_method(expr),
+            This: self._this,
+            SubscriptGet: self._subscript_get,
+            Unary: self._unary,
+            Await: lambda expr: lambda it: it._await_expression(expr),
+            BinaryExpression: self._binary,
+            FunctionCall: self._call,
+            Logical: self._logical,
+            Splat: self._splat,
+            MapLiteral: self._map,
+        }
+
+    # --- Entry points ---
+    def statement(self, stmt):
+        fn = stmt.__dict__.get("_closure")
+        if fn is None:
+            compiler = self._statement_compilers.get(type(stmt))
+            if compiler is not None:
+                fn = compiler(stmt)
+            elif isinstance(stmt, Expr):
+                fn = self._expression_statement(stmt)
+            else:
+                fn = self._unsupported(f"Unknown statement type: {type(stmt).__name__}")
+            stmt._closure = fn
+        return fn
+
+    def expression(self, expr):
+        fn = expr.__dict__.get("_closure")
+        if fn is None:
+            compiler = self._expression_compilers.get(type(expr))
+            if compiler is None:
+                fn = self._unsupported(f"Unsupported expression type; {type(expr).__name__}")
+            else:
+                fn = compiler(expr)
+            expr._closure = fn
+        return fn
+
+    def block(self, statements):
+        fns = [self.statement(stmt) for stmt in statements]
+        if not fns:
+            return _no_op
+        if len(fns) == 1:
+            return fns[0]
+        if len(fns) == 2:
+            first, second = fns
+            def block2(it):
+                signal = first(it)
+                if signal is not None:
+                    return signal
+                return second(it)
+            return block2
+        fns = tuple(fns)
+        def block(it):
+            for fn in fns:
+                signal = fn(it)
+                if signal is not None:
+                    return signal
+            return None
+        return block
+
+    def function_body(self, declaration):
+        fn = declaration.__dict__.get("_closure_body")
+        if fn is None:
+            if declaration.is_generator or declaration.is_async:
+                # The body runs later, as the generator is iterated or the coroutine awaited
+                # (see MryaInterpreter._run_generator).
+                def generator_body(it):
+                    return ReturnSignal(it._suspended_call(declaration, it.env))
+                fn = generator_body
+            else:
+                fn = self.block(declaration.body)
+            declaration._closure_body = fn
+        return fn
+
+    @staticmethod
+    def _unsupported(message):
+        # Raised when the node runs, not when its block is compiled, like the tree-walker does.
+        def unsupported(it):
+            raise RuntimeError(message)
+        return unsupported
+
+    # --- Statements ---
+    def _expression_statement(self, stmt):
+        expression = self.expression(stmt)
+        def expression_statement(it):
+            expression(it)
+        return expression_statement
+
+    def _let(self, stmt):
+        slot = stmt.slot
+        if slot is not None and not stmt.boxed:
+            value_fn = self.expression(stmt.initializer)
+            def let_raw(it):
+                it.env.slots[slot] = value_fn(it)
+            return let_raw
+        if stmt.is_const:
+            value_fn = self.expression(stmt.initializer)
+            def make_box(it):
+                return MryaBox(value_fn(it), is_const=True)
+        elif isinstance(stmt.initializer, Variable):
+            # `let a = b` shares b's box when b lives in the current frame (reference semantics).
+            source = stmt.initializer
+            value_fn = self.expression(source)
+            if source.depth == 0 and source.slot is not None:
+                source_slot = source.slot
+                def make_box(it):
+                    box = it.env.slots[source_slot]
+                    return box if box is not UNBOUND else MryaBox(value_fn(it))
+            elif source.depth == 0 or source.depth is None:
+                source_name = source.name.lexeme
+                def make_box(it):
+                    box = it.env.values.get(source_name)
+                    return box if box is not None else MryaBox(value_fn(it))
+            else:
+                def make_box(it):
+                    return MryaBox(value_fn(it))
+        else:
+            value_fn = self.expression(stmt.initializer)
+            def make_box(it):
+                return MryaBox(value_fn(it))
+
+        if stmt.type_annotation:
+            def let_typed(it):
+                it._define_let(stmt, make_box(it))
+            return let_typed
+        if slot is not None:
+            def let_slot(it):
+                it.env.slots[slot] = make_box(it)
+            return let_slot
+        name = stmt.name.lexeme
+        def let_global(it):
+            it.env.values[name] = make_box(it)
+        return let_global
+
+    def _output(self, stmt):
+        value_fn = self.expression(stmt.expression)
+        def output(it):
+            it._output_value(value_fn(it))
+        return output
+
+    def _class(self, stmt):
+        def class_declaration(it):
+            it._declare_class(stmt)
+        return class_declaration
+
+    def _function(self, stmt):
+        def function_declaration(it):
+            it._declare_function(stmt)
+        return function_declaration
+
+    def _return(self, stmt):
+        if stmt.value is None:
+            none = ReturnSignal(None)
+            return lambda it: none
+        if stmt.tail_call:
+            call = stmt.value
+            callee_fn = self.expression(call.callee)
+            evaluate_arguments = self._arguments(call)
+            def tail_call(it):
+                return it._tail_call(call, callee_fn(it), evaluate_arguments(it))
+            return tail_call
+        value_fn = self.expression(stmt.value)
+        def return_statement(it):
+            return ReturnSignal(value_fn(it))
+        return return_statement
+
+    def _if(self, stmt):
+        condition = self.expression(stmt.condition)
+        then_branch = self.block(stmt.then_branch)
+        if stmt.else_branch:
+            else_branch = self.block(stmt.else_branch)
+            def if_else(it):
+                if condition(it):
+                    return then_branch(it)
+                return else_branch(it)
+            return if_else
+        def if_statement(it):
+            if condition(it):
+                return then_branch(it)
+            return None
+        return if_statement
+
+    def _while(self, stmt):
+        condition = self.expression(stmt.condition)
+        body = self.block(stmt.body)
+        def while_statement(it):
+            while condition(it):
+                signal = body(it)
+                if signal is not None:
+                    if signal is BREAK:
+                        break
+                    if signal is CONTINUE:
+                        continue
+                    return signal
+            return None
+        return while_statement
+
+    def _for(self, stmt):
+        iterable_fn = self.expression(stmt.iterable)
+        body = self.block(stmt.body)
+        layout = stmt.layout
+        boxed = layout is not None and layout.boxed[0]
+        variable = stmt.variable
+        if MryaInterpreter._reuses_loop_frame(layout):
+            size = layout.size
+            def for_in_one_frame(it):
+                iterable = it._for_iterable(stmt, iterable_fn(it))
+                env = it.env
+                loop_env = Environment(enclosing=env, layout=layout)
+                slots = loop_env.slots
+                unbound = [UNBOUND] * (size - 1) if size > 1 else None
+                it.env = loop_env
+                try:
+                    for item in iterable:
+                        slots[0] = MryaBox(item) if boxed else item
+                        if unbound is not None:
+                            slots[1:] = unbound
+                        signal = body(it)
+                        if signal is not None:
+                            if signal is BREAK:
+                                break
+                            if signal is CONTINUE:
+                                continue
+                            return signal
+                finally:
+                    it.env = env
+                return None
+            return for_in_one_frame
+        def for_statement(it):
+            iterable = it._for_iterable(stmt, iterable_fn(it))
+            env = it.env
+            try:
+                for item in iterable:
+                    # A fresh frame per iteration, so closures capture the item they saw.
+                    loop_env = Environment(enclosing=env, layout=layout)
+                    if layout is not None:
+                        loop_env.slots[0] = MryaBox(item) if boxed else item
+                    else:
+                        loop_env.define_variable(variable, MryaBox(item))
+                    it.env = loop_env
+                    signal = body(it)
+                    if signal is not None:
+                        if signal is BREAK:
+                            break
+                        if signal is CONTINUE:
+                            continue
+                        return signal
+            finally:
+                it.env = env
+            return None
+        return for_statement
+
+    def _try(self, stmt):
+        try_block = self.block(stmt.try_block)
+        clause_bodies = {id(clause): self.block(clause.body) for clause in stmt.catch_clauses}
+        finally_block = self.block(stmt.finally_block) if stmt.finally_block else None
+        def try_catch(it):
+            env = it.env
+            try:
+                return try_block(it)
+            except (MryaRuntimeError, MryaTypeError, MryaRaisedError) as e:
+                it.env = env
+                clause = it._find_catch_clause(stmt, e)
+                if clause is None:
+                    raise e # Re-raise the exception if no catch block handled it
+                it.env = Environment(enclosing=env, layout=clause.layout)
+                try:
+                    return clause_bodies[id(clause)](it)
+                finally:
+                    it.env = env
+        if finally_block is None:
+            return try_catch
+        def try_finally(it):
+            env = it.env
+            try:
+                signal = try_catch(it)
+            except BaseException:
+                it.env = env
+                # A return, break or continue in the finally block discards the error.
+                final_signal = finally_block(it)
+                if final_signal is not None:
+                    return final_signal
+                raise
+            final_signal = finally_block(it)
+            return final_signal if final_signal is not None else signal
+        return try_finally
+
+    def _assignment(self, stmt):
+        value_fn = self.expression(stmt.value)
+        name_token = stmt.name
+        depth = stmt.depth
+        slot = stmt.slot
+        proven = stmt.proven_guard
+        if depth is None:
+            def assign_by_name(it):
+                it.env.assign(name_token, value_fn(it))
+            return assign_by_name
+        if slot is None:
+            name = name_token.lexeme
+            def assign_global(it):
+                value = value_fn(it)
+                env = _frame(it.env, depth)
+                box = env.values.get(name)
+                if box is None:
+                    env.assign(name_token, value)
+                else:
+                    env.assign_box(box, name_token, value, proven)
+            return assign_global
+        if not stmt.boxed:
+            if depth == 0:
+                def assign_raw_local(it):
+                    value = value_fn(it)
+                    env = it.env
+                    if env.slots[slot] is UNBOUND:
+                        env.assign(name_token, value)
+                    else:
+                        env.slots[slot] = value
+                return assign_raw_local
+            def assign_raw_outer(it):
+                value = value_fn(it)
+                env = _frame(it.env, depth)
+                if env.slots[slot] is UNBOUND:
+                    env.assign(name_token, value)
+                else:
+                    env.slots[slot] = value
+            return assign_raw_outer
+        if depth == 0:
+            def assign_local(it):
+                value = value_fn(it)
+                env = it.env
+                box = env.slots[slot]
+                if box is UNBOUND:
+                    env.assign(name_token, value)
+                else:
+                    env.assign_box(box, name_token, value, proven)
+            return assign_local
+        def assign_outer(it):
+            value = value_fn(it)
+            env = _frame(it.env, depth)
+            box = env.slots[slot]
+            if box is UNBOUND:
+                env.assign(name_token, value)
+            else:
+                env.assign_box(box, name_token, value, proven)
+        return assign_outer
+
+    def _set_property(self, stmt):
+        object_fn = self.expression(stmt.object)
+        value_fn = self.expression(stmt.value)
+        name = stmt.name.lexeme
+        def set_property(it):
+            obj = object_fn(it)
+            value = value_fn(it)
+            if type(obj) is MryaInstance:
+                obj.fields[name] = value
+            else:
+                it._set_property(stmt, obj, value)
+        return set_property
+
+    def _subscript_set(self, stmt):
+        object_fn = self.expression(stmt.object)
+        index_fn = self.expression(stmt.index)
+        value_fn = self.expression(stmt.value)
+        def subscript_set(it):
+            obj = object_fn(it)
+            index = index_fn(it)
+            value = value_fn(it)
+            if type(obj) is dict and type(index) is str:
+                obj[index] = value
+            else:
+                it._subscript_set(stmt, obj, index, value)
+        return subscript_set
+
+    def _import(self, stmt):
+        path_fn = self.expression(stmt.path_expr)
+        def import_statement(it):
+            it._import_statement(stmt, path_fn(it))
+        return import_statement
+
+    # --- Expressions ---
+    def _literal(self, expr):
+        value = expr.value
+        return lambda it: value
+
+    def _variable(self, expr):
+        name_token = expr.name
+        name = name_token.lexeme
+        depth = expr.depth
+        slot = expr.slot
+        if depth is None:
+            def variable_by_name(it):
+                return it.env.get_variable(name_token)
+            return variable_by_name
+        if slot is None:
+            if depth == 0:
+                def global_variable(it):
+                    env = it.env
+                    box = env.values.get(name)
+                    if box is None:
+                        return env.get_variable(name_token)
+                    return box.value
+                return global_variable
+            def outer_global_variable(it):
+                env = _frame(it.env, depth)
+                box = env.values.get(name)
+                if box is None:
+                    return env.get_variable(name_token)
+                return box.value
+            return outer_global_variable
+        if not expr.boxed:
+            if depth == 0:
+                def raw_local_variable(it):
+                    value = it.env.slots[slot]
+                    if value is UNBOUND:
+                        return it.env.get_variable(name_token)
+                    return value
+                return raw_local_variable
+            if depth == 1:
+                def raw_enclosing_variable(it):
+                    env = it.env.enclosing
+                    value = env.slots[slot]
+                    if value is UNBOUND:
+                        return env.get_variable(name_token)
+                    return value
+                return raw_enclosing_variable
+            def raw_outer_variable(it):
+                env = _frame(it.env, depth)
+                value = env.slots[slot]
+                if value is UNBOUND:
+                    return env.get_variable(name_token)
+                return value
+            return raw_outer_variable
+        if depth == 0:
+            def local_variable(it):
+                env = it.env
+                box = env.slots[slot]
+                if box is UNBOUND:
+                    return env.get_variable(name_token)
+                return box.value
+            return local_variable
+        if depth == 1:
+            def enclosing_variable(it):
+                env = it.env.enclosing
+                box = env.slots[slot]
+                if box is UNBOUND:
+                    return env.get_variable(name_token)
+                return box.value
+            return enclosing_variable
+        def outer_variable(it):
+            env = _frame(it.env, depth)
+            box = env.slots[slot]
+            if box is UNBOUND:
+                return env.get_variable(name_token)
+            return box.value
+        return outer_variable
+
+    def _this(self, expr):
+        depth = expr.depth
+        slot = expr.slot
+        if depth is None or slot is None:
+            return lambda it: it._this_value(expr)
+        keyword = expr.keyword
+        def this(it):
+            instance = _frame(it.env, depth).slots[slot]
+            if instance is UNBOUND:
+                return it.env.get_variable(keyword)
+            return instance
+        return this
+
+    def _list(self, expr):
+        if expr.constant is not None:
+            template = expr.constant
+            return lambda it: template.copy()
+        element_fns = [self.expression(element) for element in expr.elements]
+        def list_literal(it):
+            return [fn(it) for fn in element_fns]
+        return list_literal
+
+    def _map(self, expr):
+        if expr.constant is not None:
+            template = expr.constant
+            return lambda it: template.copy()
+        pair_fns = [(self.expression(key), self.expression(value)) for key, value in expr.pairs]
+        def map_literal(it):
+            map_obj = {}
+            for key_fn, value_fn in pair_fns:
+                key = key_fn(it)
+                map_obj[key] = value_fn(it)
+            return map_obj
+        return map_literal
+
+    def _h_string(self, expr):
+        part_fns = []
+        for part in expr.parts:
+            if isinstance(part, Literal):
+                text = str(part.value)
+                part_fns.append(lambda it, text=text: text)
+            else:
+                value_fn = self.expression(part)
+                part_fns.append(lambda it, value_fn=value_fn: str(value_fn(it)))
+        def h_string(it):
+            return "".join([fn(it) for fn in part_fns])
+        return h_string
+
+    def _get(self, expr):
+        object_fn = self.expression(expr.object)
+        name = expr.name.lexeme
+        def get(it):
+            obj = object_fn(it)
+            if type(obj) is dict:
+                return obj.get(name)
+            if type(obj) is MryaInstance:
+                fields = obj.fields
+                if name in fields:
+                    return fields[name]
+            return it._get_property(expr, obj)
+        return get
+
+    def _subscript_get(self, expr):
+        object_fn = self.expression(expr.object)
+        index_fn = self.expression(expr.index)
+        def subscript_get(it):
+            obj = object_fn(it)
+            index = index_fn(it)
+            if type(index) is int and type(obj) is list:
+                try:
+                    return obj[index]
+                except IndexError:
+                    pass
+            elif type(obj) is dict and type(index) is str:
+                return obj.get(index)
+            return it._subscript_get(expr, obj, index)
+        return subscript_get
+
+    def _unary(self, expr):
+        operand = self.expression(expr.right)
+        operator = expr.operator
+        if operator.type == TokenType.BANG:
+            def negate(it):
+                return not operand(it)
+            return negate
+        def unary(it):
+            right = operand(it)
+            if type(right) is int or type(right) is float:
+                return -right
+            return it._unary_operation(operator, right)
+        return unary
+
+    def _binary(self, expr):
+        left_fn = self.expression(expr.left)
+        right_fn = self.expression(expr.right)
+        operator = expr.operator
+        op = operator.type
+
+        if op == TokenType.PLUS:
+            def plus(it):
+                left = left_fn(it)
+                right = right_fn(it)
+                left_type = type(left)
+                if (left_type is int or left_type is float or left_type is str) and left_type is type(right):
+                    return left + right
+                return it._binary_operation(operator, left, right)
+            return plus
+
+        if op == TokenType.MINUS:
+            def minus(it):
+                left = left_fn(it)
+                right = right_fn(it)
+                if (type(left) is int or type(left) is float) and (type(right) is int or type(right) is float):
+                    return left - right
+                return it._binary_operation(operator, left, right)
+            return minus
+
+        if op == TokenType.STAR:
+            def times(it):
+                left = left_fn(it)
+                right = right_fn(it)
+                if (type(left) is int or type(left) is float) and (type(right) is int or type(right) is float):
+                    return left * right
+                return it._binary_operation(operator, left, right)
+            return times
+
+        if op in (TokenType.EQUAL_EQUAL, TokenType.BANG_EQUAL):
+            negate = op == TokenType.BANG_EQUAL
+            def equality(it):
+                left = left_fn(it)
+                right = right_fn(it)
+                if type(left) is MryaInstance:
+                    return it._binary_operation(operator, left, right)
+                return (left != right) if negate else (left == right)
+            return equality
+
+        comparisons = {
+            TokenType.LESS: lambda a, b: a < b,
+            TokenType.LESS_EQUAL: lambda a, b: a <= b,
+            TokenType.GREATER: lambda a, b: a > b,
+            TokenType.GREATER_EQUAL: lambda a, b: a >= b,
+        }
+        if op == TokenType.LESS:
+            def less(it):
+                left = left_fn(it)
+                right = right_fn(it)
+                try:
+                    return left < right
+                except TypeError:
+                    return it._binary_operation(operator, left, right)
+            return less
+        if op in comparisons:
+            compare = comparisons[op]
+            def comparison(it):
+                left = left_fn(it)
+                right = right_fn(it)
+                try:
+                    return compare(left, right)
+                except TypeError:
+                    return it._binary_operation(operator, left, right)
+            return comparison
+
+        def binary(it):
+            return it._binary_operation(operator, left_fn(it), right_fn(it))
+        return binary
+
+    def _logical(self, expr):
+        left_fn = self.expression(expr.left)
+        right_fn = self.expression(expr.right)
+        if expr.operator.type == TokenType.OR:
+            def logical_or(it):
+                # Short-circuit: if left is true, the whole expression is true
+                if left_fn(it):
+                    return True
+                return bool(right_fn(it))
+            return logical_or
+        def logical_and(it):
+            # Short-circuit: if left is false, the whole expression is false
+            if not left_fn(it):
+                return False
+            return bool(right_fn(it))
+        return logical_and
+
+    def _splat(self, expr):
+        def splat(it):
+            raise MryaRuntimeError(None, "The '...' operator can only be used inside a function call.")
+        return splat
+
+    def _call(self, expr):
+        callee_fn = self.expression(expr.callee)
+        evaluate_arguments = self._arguments(expr)
+        def call(it):
+            callee = callee_fn(it)
+            if type(callee) is FunctionDeclaration:
+                return it._call_declaration(callee, evaluate_arguments(it))
+            if type(callee) is MryaBoundMethod:
+                return it.call_function_or_method(callee.method, evaluate_arguments(it), callee.instance)
+            if type(callee) is MryaModule:
+                it._raise_module_call(expr)
+            return it._call_value(expr, callee, evaluate_arguments(it))
+        return call
+
+    def _arguments(self, expr):
+        """Compiles a call's arguments to one function that evaluates them into a list."""
+        has_splat = any(isinstance(arg, Splat) for arg in expr.arguments)
+        if has_splat:
+            parts = [(True, self.expression(arg.expression)) if isinstance(arg, Splat) else (False, self.expression(arg))
+                     for arg in expr.arguments]
+            def evaluate_arguments(it):
+                arguments = []
+                for is_splat, fn in parts:
+                    if is_splat:
+                        arguments.extend(it._splat_values(fn(it)))
+                    else:
+                        arguments.append(fn(it))
+                return arguments
+        else:
+            argument_fns = [self.expression(arg) for arg in expr.arguments]
+            if not argument_fns:
+                evaluate_arguments = lambda it: []
+            elif len(argument_fns) == 1:
+                only = argument_fns[0]
+                evaluate_arguments = lambda it: [only(it)]
+            elif len(argument_fns) == 2:
+                first, second = argument_fns
+                evaluate_arguments = lambda it: [first(it), second(it)]
+            else:
+                evaluate_arguments = lambda it: [fn(it) for fn in argument_fns]
+        return evaluate_arguments
+
+
+class MryaClosureInterpreter(MryaInterpreter):
+    """Runs programs by compiling the AST to closures instead of walking it node by node."""
+    def __init__(self):
+        super().__init__()
+        self.compiler = MryaClosureCompiler()
+
+    def _execute(self, stmt):
+        return self.compiler.statement(stmt)(self)
+
+    def _evaluate(self, expr, unbox=True):
+        if not unbox:
+            return super()._evaluate(expr, unbox)
+        return self.compiler.expression(expr)(self)
+
+    def _execute_block(self, statements, environment):
+        block = self.compiler.block(statements)
+        previous_env = self.env
+        try:
+            self.env = environment
+            return block(self)
+        finally:
+            self.env = previous_env
+
+    def _prepare_function(self, declaration):
+        # Compiled once on the declaration, so the functions copied from it share the closures.
+        self.compiler.function_body(declaration)
+
+    def _call_declaration(self, declaration, arguments):
+        """Calls a plain Mrya function, skipping the generic dispatch of call_function_or_method."""
+        layout = declaration.layout
+        if layout is None or declaration.is_variadic or len(arguments) != len(declaration.params):
+            return self.call_function_or_method(declaration, arguments)
+        closure_env = declaration.env if declaration.env is not None else self.env
+        call_env = Environment(closure_env, layout)
+        slots = call_env.slots
+        boxed = layout.boxed
+        for slot, value in zip(layout.param_slots, arguments):
+            slots[slot] = MryaBox(value) if boxed[slot] else value
+        return self._run_function_body(declaration, call_env)
+
+    def _run_function_body(self, declaration, call_env):
+        body = self.compiler.function_body(declaration)
+        previous_env = self.env
+        try:
+            self.env = call_env
+            signal = body(self)
+            while type(signal) is TailCall:
+                self.env = signal.env
+                signal = self.compiler.function_body(signal.declaration)(self)
+        finally:
+            self.env = previous_env
+        if signal is not None and type(signal) is ReturnSignal:
+            return signal.value
+        return None
@@ -0,0 +1,499 @@
+from mrya_ast import Expr, Literal, HString, Splat, Variable, Get, BinaryExpression, Logical, Unary, Await, LetStatement, OutputStatement, FunctionDeclaration, FunctionCall, ReturnStatement, IfStatement, WhileStatement, ForStatement, BreakStatement, ContinueStatement, TryStatement, ClassDeclaration, SetProperty, This, Inherit, Assignment, SubscriptGet, SubscriptSet, ImportStatement, ListLiteral, MapLiteral
+from mrya_tokens import TokenType
+from mrya_interpreter import MryaInterpreter, UNBOUND
+
+# --- Opcodes ---
+# Every instruction is an (opcode, argument) pair. Jump arguments are instruction indexes.
+# The *_FAST opcodes work on slots the resolver left unboxed, which hold values directly.
+(
+    CONST, POP, LOAD_FAST, LOAD_LOCAL, LOAD_OUTER, LOAD_GLOBAL, LOAD_NAME, LOAD_REF, LOAD_THIS, LOAD_INHERIT,
+    LET_FAST, LET_SLOT, LET_NAME, LET_TYPED, MAKE_CONST,
+    STORE_FAST, ASSIGN_LOCAL, ASSIGN_OUTER, ASSIGN_GLOBAL, ASSIGN_NAME,
+    GET_ATTR, SET_ATTR, SUBSCR, STORE_SUBSCR,
+    BINARY_ADD, BINARY_SUB, BINARY_MUL, BINARY_OP, COMPARE_LT, COMPARE, COMPARE_EQ, COMPARE_NE,
+    NOT, NEGATE, TO_BOOL,
+    JUMP, POP_JUMP_IF_FALSE, POP_JUMP_IF_TRUE,
+    BUILD_LIST, BUILD_MAP, BUILD_STRING, COPY_CONST, LIST_APPEND, LIST_EXTEND,
+    CALL, CALL_LIST, TAIL_CALL, RETURN, END,
+    OUTPUT, DECLARE_FUNCTION, DECLARE_CLASS, IMPORT,
+    GET_ITER, FOR_ITER, FOR_NEXT, PUSH_ENV, POP_ENV,
+    SETUP_TRY, POP_TRY, SELECT_CATCH, RERAISE,
+    RAISE_ERROR, MAKE_GENERATOR, AWAIT,
+) = range(65)
+
+OPCODE_NAMES = {
+    value: name for name, value in list(globals().items())
+    if name.isupper() and isinstance(value, int) and name != "OPCODE_NAMES"
+}
+
+_COMPARISONS = {
+    TokenType.GREATER: lambda a, b: a > b,
+    TokenType.GREATER_EQUAL: lambda a, b: a >= b,
+    TokenType.LESS_EQUAL: lambda a, b: a <= b,
+}
+
+class CodeObject:
+    """A compiled function body or top-level block."""
+    def __init__(self, name, instructions):
+        self.name = name
+        self.instructions = instructions
+
+    def disassemble(self):
+        lines = [f"== {self.name} =="]
+        for index, (op, arg) in enumerate(self.instructions):
+            lines.append(f"{index:4} {OPCODE_NAMES[op]:<18} {_describe(arg)}")
+        return "\n".join(lines)
+
+def _describe(arg):
+    if arg is None:
+        return ""
+    if hasattr(arg, "lexeme"):
+        return arg.lexeme
+    if isinstance(arg, tuple):
+        return ", ".join(_describe(part) for part in arg)
+    if isinstance(arg, (int, float, str, bool)):
+        return repr(arg)
+    return type(arg).__name__
+
+# Entries on the compiler's scope stack. They record what a jump out of the middle of a
+# statement has to undo: loop iterators on the value stack, pushed environments, active
+# try handlers and finally blocks that still have to run.
+class _Loop:
+    def __init__(self, is_for, reuses_frame=False):
+        self.is_for = is_for
+        self.reuses_frame = reuses_frame # A for-loop that keeps one environment for all its iterations
+        self.start = None
+        self.breaks = []
+
+class _Try:
+    def __init__(self, finally_block, in_catch):
+        self.finally_block = finally_block
+        self.in_catch = in_catch # Inside a catch body, which runs in its own environment
+
+class _PendingError:
+    """The exception being carried through a finally block on the value stack."""
+
+class MryaCompiler:
+    """Lowers resolved AST nodes to bytecode for MryaVM."""
+    def __init__(self):
+        self.code = None
+        self.scopes = None
+
+    # --- Entry points ---
+    def compile_function(self, declaration):
+        if declaration.is_generator or declaration.is_async:
+            # Calling a generator (or async) function just returns a generator (or coroutine) over
+            # its frame; the body is walked by MryaInterpreter._run_generator as it's iterated (or awaited).
+            code = CodeObject(declaration.name.lexeme, [(MAKE_GENERATOR, declaration), (RETURN, None)])
+        else:
+            code = self._compile_unit(declaration.name.lexeme, declaration.body, is_function=True)
+        declaration._code = code
+        return code
+
+    def compile_block(self, statements, name="<block>"):
+        return self._compile_unit(name, statements, is_function=False)
+
+    def compile_expression(self, expr):
+        saved = self.code, self.scopes
+        self.code, self.scopes = [], []
+        self._expression(expr)
+        self._emit(RETURN)
+        code = CodeObject("<expression>", self.code)
+        self.code, self.scopes = saved
+        return code
+
+    def _compile_unit(self, name, statements, is_function):
+        # Function bodies are compiled on their first call, which may happen while another unit is being compiled.
+        saved = self.code, self.scopes
+        self.code, self.scopes = [], []
+        self._block(statements)
+        if is_function:
+            self._emit(CONST, None)
+            self._emit(RETURN)
+        else:
+            self._emit(END)
+        code = CodeObject(name, self.code)
+        self.code, self.scopes = saved
+        return code
+
+    # --- Emitting ---
+    def _emit(self, op, arg=None):
+        self.code.append((op, arg))
+        return len(self.code) - 1
+
+    def _patch(self, index, arg):
+        self.code[index] = (self.code[index][0], arg)
+
+    def _here(self):
+        return len(self.code)
+
+    # --- Statements ---
+    def _block(self, statements):
+        for stmt in statements:
+            self._statement(stmt)
+
+    def _statement(self, stmt):
+        if isinstance(stmt, LetStatement):
+            if stmt.slot is not None and not stmt.boxed:
+                self._expression(stmt.initializer)
+                self._emit(LET_FAST, stmt.slot)
+                return
+            if stmt.is_const:
+                self._expression(stmt.initializer)
+                self._emit(MAKE_CONST)
+            elif isinstance(stmt.initializer, Variable):
+                # `let a = b` shares b's box when b lives in the current frame.
+                self._emit(LOAD_REF, stmt.initializer)
+            else:
+                self._expression(stmt.initializer)
+            if stmt.type_annotation:
+                self._emit(LET_TYPED, stmt)
+            elif stmt.slot is not None:
+                self._emit(LET_SLOT, stmt.slot)
+            else:
+                self._emit(LET_NAME, stmt.name)
+
+        elif isinstance(stmt, OutputStatement):
+            self._expression(stmt.expression)
+            self._emit(OUTPUT)
+
+        elif isinstance(stmt, ClassDeclaration):
+            self._emit(DECLARE_CLASS, stmt)
+
+        elif isinstance(stmt, FunctionDeclaration):
+            self._emit(DECLARE_FUNCTION, stmt)
+
+        elif isinstance(stmt, ReturnStatement):
+            if stmt.tail_call:
+                # When the callee is a Mrya function, TAIL_CALL replaces this frame with the callee's,
+                # and the RETURN after it is never reached. Other callees are called as usual.
+                self._call(stmt.value, tail=True)
+                self._return()
+            elif stmt.value is not None:
+                self._expression(stmt.value)
+            else:
+                self._emit(CONST, None)
+            self._return()
+
+        elif isinstance(stmt, Expr):
+            self._expression(stmt)
+            self._emit(POP)
+
+        elif isinstance(stmt, IfStatement):
+            self._expression(stmt.condition)
+            jump_to_else = self._emit(POP_JUMP_IF_FALSE)
+            self._block(stmt.then_branch)
+            if stmt.else_branch:
+                jump_to_end = self._emit(JUMP)
+                self._patch(jump_to_else, self._here())
+                self._block(stmt.else_branch)
+                self._patch(jump_to_end, self._here())
+            else:
+                self._patch(jump_to_else, self._here())
+
+        elif isinstance(stmt, WhileStatement):
+            loop = _Loop(is_for=False)
+            loop.start = self._here()
+            self._expression(stmt.condition)
+            exit_jump = self._emit(POP_JUMP_IF_FALSE)
+            self.scopes.append(loop)
+            self._block(stmt.body)
+            self.scopes.pop()
+            self._emit(JUMP, loop.start)
+            self._patch(exit_jump, self._here())
+            for index in loop.breaks:
+                self._patch(index, self._here())
+
+        elif isinstance(stmt, ForStatement) and MryaInterpreter._reuses_loop_frame(stmt.layout):
+            # Nothing in the body can capture the loop's frame, so it is entered once and
+            # rebound in place by FOR_NEXT. Leaving the loop normally pops it again.
+            layout = stmt.layout
+            self._expression(stmt.iterable)
+            self._emit(GET_ITER, stmt)
+            self._emit(PUSH_ENV, layout)
+            loop = _Loop(is_for=True, reuses_frame=True)
+            loop.start = self._emit(FOR_NEXT)
+            self.scopes.append(loop)
+            self._block(stmt.body)
+            self.scopes.pop()
+            self._emit(JUMP, loop.start)
+            unbound = (UNBOUND,) * (layout.size - 1) if layout.size > 1 else None
+            self._patch(loop.start, (layout.boxed[0], unbound, self._here()))
+            for index in loop.breaks:
+                self._patch(index, self._here())
+
+        elif isinstance(stmt, ForStatement):
+            self._expression(stmt.iterable)
+            self._emit(GET_ITER, stmt)
+            loop = _Loop(is_for=True)
+            loop.start = self._emit(FOR_ITER)
+            self.scopes.append(loop)
+            self._block(stmt.body)
+            self.scopes.pop()
+            self._emit(POP_ENV)
+            self._emit(JUMP, loop.start)
+            self._patch(loop.start, (stmt.layout, stmt.variable, self._here()))
+            for index in loop.breaks:
+                self._patch(index, self._here())
+
+        elif isinstance(stmt, BreakStatement):
+            self._loop_exit(stmt, is_break=True)
+
+        elif isinstance(stmt, ContinueStatement):
+            self._loop_exit(stmt, is_break=False)
+
+        elif isinstance(stmt, TryStatement):
+            self._try(stmt)
+
+        elif isinstance(stmt, Assignment):
+            self._expression(stmt.value)
+            if stmt.depth is None:
+                self._emit(ASSIGN_NAME, stmt.name)
+            elif stmt.slot is None:
+                self._emit(ASSIGN_GLOBAL, (stmt.depth, stmt.name.lexeme, stmt.name, True, stmt.proven_guard))
+            elif stmt.depth == 0 and not stmt.boxed:
+                self._emit(STORE_FAST, (stmt.slot, stmt.name))
+            elif stmt.depth == 0:
+                self._emit(ASSIGN_LOCAL, (stmt.slot, stmt.name, stmt.proven_guard))
+            else:
+                self._emit(ASSIGN_OUTER, (stmt.depth, stmt.slot, stmt.name, stmt.boxed, stmt.proven_guard))
+
+        elif isinstance(stmt, SetProperty):
+            self._expression(stmt.object)
+            self._expression(stmt.value)
+            self._emit(SET_ATTR, stmt)
+
+        elif isinstance(stmt, SubscriptSet):
+            self._expression(stmt.object)
+            self._expression(stmt.index)
+            self._expression(stmt.value)
+            self._emit(STORE_SUBSCR, stmt)
+
+        elif isinstance(stmt, ImportStatement):
+            self._expression(stmt.path_expr)
+            self._emit(IMPORT, stmt)
+
+        else:
+            self._emit(RAISE_ERROR, f"Unknown statement type: {type(stmt).__name__}")
+
+    def _try(self, stmt):
+        finally_block = stmt.finally_block or None
+
+        # try { ... }
+        self.scopes.append(_Try(finally_block, in_catch=False))
+        setup = self._emit(SETUP_TRY)
+        self._block(stmt.try_block)
+        self._emit(POP_TRY)
+        self.scopes.pop()
+        done_jumps = [self._emit(JUMP)]
+
+        # The handler starts with the error on the stack.
+        self._patch(setup, self._here())
+        select = self._emit(SELECT_CATCH)
+        targets = {}
+        catch_handlers = []
+        for clause in stmt.catch_clauses:
+            # SELECT_CATCH has already pushed the clause's environment.
+            targets[id(clause)] = self._here()
+            self.scopes.append(_Try(finally_block, in_catch=True))
+            if finally_block:
+                catch_handlers.append(self._emit(SETUP_TRY))
+            self._block(clause.body)
+            if finally_block:
+                self._emit(POP_TRY)
+            self.scopes.pop()
+            self._emit(POP_ENV)
+            done_jumps.append(self._emit(JUMP))
+
+        # An error from a catch body lands here still inside that body's environment.
+        if catch_handlers:
+            for index in catch_handlers:
+                self._patch(index, self._here())
+            self._emit(POP_ENV)
+        unhandled = self._here()
+        self._patch(select, (stmt, targets, unhandled))
+        if finally_block:
+            self.scopes.append(_PendingError())
+            self._block(finally_block)
+            self.scopes.pop()
+        self._emit(RERAISE)
+
+        for index in done_jumps:
+            self._patch(index, self._here())
+        if finally_block:
+            self._block(finally_block)
+
+    def _unwind(self, entry, for_return):
+        """Emits what leaving `entry` early has to undo."""
+        if isinstance(entry, _Loop):
+            self._emit(POP_ENV)
+            if not for_return:
+                self._emit(POP) # The loop's iterator
+        elif isinstance(entry, _Try):
+            if entry.finally_block:
+                self._emit(POP_TRY)
+            if entry.in_catch:
+                self._emit(POP_ENV)
+            if entry.finally_block:
+                # The finally block is compiled as if it sat outside the try statement.
+                saved = self.scopes
+                self.scopes = self.scopes[:self.scopes.index(entry)]
+                self._block(entry.finally_block)
+                self.scopes = saved
+        elif isinstance(entry, _PendingError) and not for_return:
+            self._emit(POP)
+
+    def _return(self):
+        # Leaving the frame discards its stack and environments, so only finally blocks need to run.
+        pending = [i for i, entry in enumerate(self.scopes) if isinstance(entry, _Try) and entry.finally_block]
+        if pending:
+            for entry in reversed(self.scopes[pending[0]:]):
+                if not (isinstance(entry, _Loop) and not entry.is_for):
+                    self._unwind(entry, for_return=True)
+        self._emit(RETURN)
+
+    def _call(self, expr, tail=False):
+        self._expression(expr.callee)
+        if any(isinstance(arg, Splat) for arg in expr.arguments):
+            self._emit(BUILD_LIST, 0)
+            for arg in expr.arguments:
+                if isinstance(arg, Splat):
+                    self._expression(arg.expression)
+                    self._emit(LIST_EXTEND)
+                else:
+                    self._expression(arg)
+                    self._emit(LIST_APPEND)
+            if tail:
+                self._emit(TAIL_CALL, (None, expr)) # A count of None: the arguments are in a list
+            else:
+                self._emit(CALL_LIST, expr)
+        else:
+            for arg in expr.arguments:
+                self._expression(arg)
+            self._emit(TAIL_CALL if tail else CALL, (len(expr.arguments), expr))
+
+    def _loop_exit(self, stmt, is_break):
+        loops = [entry for entry in self.scopes if isinstance(entry, _Loop)]
+        if not loops:
+            # A stray break/continue outside any loop of this function ends the call, returning nil.
+            self._emit(CONST, None)
+            self._return()
+            return
+        loop = loops[-1]
+        for entry in reversed(self.scopes[self.scopes.index(loop) + 1:]):
+            if not (isinstance(entry, _Loop) and not entry.is_for):
+                self._unwind(entry, for_return=False)
+        if is_break:
+            if loop.is_for:
+                self._emit(POP_ENV)
+                self._emit(POP)
+            loop.breaks.append(self._emit(JUMP))
+        else:
+            if loop.is_for and not loop.reuses_frame:
+                self._emit(POP_ENV)
+            self._emit(JUMP, loop.start)
+
+    # --- Expressions ---
+    def _expression(self, expr):
+        if isinstance(expr, Literal):
+            self._emit(CONST, expr.value)
+
+        elif isinstance(expr, Variable):
+            if expr.depth is None:
+                self._emit(LOAD_NAME, expr.name)
+            elif expr.slot is None:
+                self._emit(LOAD_GLOBAL, (expr.depth, expr.name.lexeme, expr.name))
+            elif expr.depth == 0:
+                self._emit(LOAD_LOCAL if expr.boxed else LOAD_FAST, (expr.slot, expr.name))
+            else:
+                self._emit(LOAD_OUTER, (expr.depth, expr.slot, expr.name, expr.boxed))
+
+        elif isinstance(expr, (ListLiteral, MapLiteral)) and expr.constant is not None:
+            self._emit(COPY_CONST, expr.constant)
+
+        elif isinstance(expr, ListLiteral):
+            for element in expr.elements:
+                self._expression(element)
+            self._emit(BUILD_LIST, len(expr.elements))
+
+        elif isinstance(expr, HString):
+            for part in expr.parts:
+                if isinstance(part, Literal):
+                    self._emit(CONST, str(part.value))
+                else:
+                    self._expression(part)
+            self._emit(BUILD_STRING, len(expr.parts))
+
+        elif isinstance(expr, Get):
+            self._expression(expr.object)
+            self._emit(GET_ATTR, expr)
+
+        elif isinstance(expr, Inherit):
+            self._emit(LOAD_INHERIT, expr)
+
+        elif isinstance(expr, This):
+            self._emit(LOAD_THIS, expr)
+
+        elif isinstance(expr, SubscriptGet):
+            self._expression(expr.object)
+            self._expression(expr.index)
+            self._emit(SUBSCR, expr)
+
+        elif isinstance(expr, Await):
+            # Only reached outside an async function's body, where awaiting runs the event loop.
+            self._emit(AWAIT, expr)
+
+        elif isinstance(expr, Unary):
+            self._expression(expr.right)
+            if expr.operator.type == TokenType.BANG:
+                self._emit(NOT)
+            else:
+                self._emit(NEGATE, expr.operator)
+
+        elif isinstance(expr, BinaryExpression):
+            self._expression(expr.left)
+            self._expression(expr.right)
+            op = expr.operator.type
+            if op == TokenType.PLUS:
+                self._emit(BINARY_ADD, expr.operator)
+            elif op == TokenType.MINUS:
+                self._emit(BINARY_SUB, expr.operator)
+            elif op == TokenType.STAR:
+                self._emit(BINARY_MUL, expr.operator)
+            elif op == TokenType.LESS:
+                self._emit(COMPARE_LT, expr.operator)
+            elif op in _COMPARISONS:
+                self._emit(COMPARE, (_COMPARISONS[op], expr.operator))
+            elif op == TokenType.EQUAL_EQUAL:
+                self._emit(COMPARE_EQ, expr.operator)
+            elif op == TokenType.BANG_EQUAL:
+                self._emit(COMPARE_NE, expr.operator)
+            else:
+                self._emit(BINARY_OP, expr.operator)
+
+        elif isinstance(expr, FunctionCall):
+            self._call(expr)
+
+        elif isinstance(expr, Logical):
+            # Both operators produce a boolean, not the deciding operand.
+            self._expression(expr.left)
+            is_or = expr.operator.type == TokenType.OR
+            short_circuit = self._emit(POP_JUMP_IF_TRUE if is_or else POP_JUMP_IF_FALSE)
+            self._expression(expr.right)
+            self._emit(TO_BOOL)
+            jump_to_end = self._emit(JUMP)
+            self._patch(short_circuit, self._here())
+            self._emit(CONST, is_or)
+            self._patch(jump_to_end, self._here())
+
+        elif isinstance(expr, Splat):
+            self._emit(RAISE_ERROR, None)
+
+        elif isinstance(expr, MapLiteral):
+            for key_expr, value_expr in expr.pairs:
+                self._expression(key_expr)
+                self._expression(value_expr)
+            self._emit(BUILD_MAP, len(expr.pairs))
+
+        else:
+            self._emit(RAISE_ERROR, f"Unsupported expression type; {type(expr).__name__}")
@@ -1,10 +1,17 @@
-from mrya_ast import Expr, Literal, HString, Splat, Variable, Get, BinaryExpression, Logical, Unary, LetStatement, OutputStatement, FunctionDeclaration, FunctionCall, ReturnStatement, IfStatement, WhileStatement, ForStatement, BreakStatement, ContinueStatement, TryStatement, CatchClause, ClassDeclaration, SetProperty, This, Inherit, Assignment, SubscriptGet, SubscriptSet, InputCall, ImportStatement, ListLiteral, MapLiteral
+from mrya_ast import Expr, Literal, HString, Splat, Variable, Get, BinaryExpression, Logical, Unary, Await, LetStatement, OutputStatement, FunctionDeclaration, FunctionCall, ReturnStatement, YieldStatement, IfStatement, WhileStatement, ForStatement, BreakStatement, ContinueStatement, TryStatement, CatchClause, ClassDeclaration, SetProperty, This, Inherit, Assignment, SubscriptGet, SubscriptSet, InputCall, ImportStatement, ListLiteral, MapLiteral
 from mrya_errors import LexerError, MryaRuntimeError, MryaTypeError, MryaRaisedError, ClassFunctionError
 from modules.math_equations import evaluate_binary_expression
 from modules.file_io import fetch, fetch_raw, store, append_to
 from mrya_tokens import TokenType, Token
+from mrya_resolver import MryaResolver
+from mrya_natives import NativeFunction, awaitable, native, natives
+from mrya_output import StdoutSink
+import asyncio
+import copy
+import operator
 import os
-import inspect
+import threading
+import weakref
 from modules import arrays as arrays
 from modules import maps as maps
 from modules import math_utils as math_utils
@@ -16,8 +23,16 @@ from modules import gui_module as gui_module
 from modules import http_server as http_server_module
 from modules import html_renderer as html_renderer_module
 from modules import jsoft_module as jsoft_module
+from modules import memo as memo_module
+from modules import builder as builder_module
+from modules import parallel as parallel_module
+from modules import tasks as tasks_module
+from modules import net as net_module
+from modules.builder import StringBuilder
+from modules.http_parser import RequestBody
 
-import __main__
+def _optional_int(value):
+    return int(value) if value is not None else None
 
 class MryaModule:
     """A simple class to represent a Mrya module with methods."""
@@ -42,9 +57,49 @@ class MryaModule:
 
 class MryaBox:
     """A mutable box to hold a variable's value, enabling reference semantics."""
-    def __init__(self, value, is_const=False):
+    __slots__ = ("value", "is_const", "guard")
+    def __init__(self, value, is_const=False, guard=None):
         self.value = value
         self.is_const = is_const
+        self.guard = guard # The type guard of a typed variable, run on every store (see type_guard)
+
+# Type names usable in annotations, most specific first, since bool is a subclass of int.
+TYPE_NAMES = (("bool", bool), ("int", int), ("float", float), ("string", str), ("list", list), ("map", dict))
+_PYTHON_TYPES = dict(TYPE_NAMES)
+_TYPE_GUARDS = {}
+
+def mrya_type_name(value):
+    for name, python_type in TYPE_NAMES:
+        if isinstance(value, python_type):
+            return name
+    return type(value).__name__
+
+def type_guard(expected_type):
+    """
+    Returns the guard for an annotation, a function (value, token) that raises MryaTypeError when the
+    value doesn't have that type. Guards are built once per type name, so two variables with the same
+    annotation share one, and callers can tell which type a box is guarded for by identity.
+    """
+    guard = _TYPE_GUARDS.get(expected_type)
+    if guard is None:
+        guard = _TYPE_GUARDS[expected_type] = _compile_type_guard(expected_type)
+    return guard
+
+def _compile_type_guard(expected_type):
+    python_type = _PYTHON_TYPES.get(expected_type)
+    def fail(value, token):
+        raise MryaTypeError(token, f"Type mismatch for '{token.lexeme}'. Expected '{expected_type}', but got value of type '{mrya_type_name(value)}'.")
+    if python_type is None:
+        return fail # Not a type Mrya knows, so nothing matches it
+    def guard(value, token):
+        # The exact type is the common case; anything else (like a bool for an int) takes the full check.
+        if type(value) is not python_type and mrya_type_name(value) != expected_type:
+            fail(value, token)
+    return guard
+
+# Marks a frame slot whose variable hasn't been defined yet. Slots the resolver left unboxed
+# hold their value directly, so None (nil) can't double as "unbound".
+UNBOUND = object()
 
 class MryaModuleMethod:
     """A bound method for module functions that preserves the module's environment."""
@@ -53,42 +108,41 @@ class MryaModuleMethod:
         self.func_decl = func_decl
     
     def __call__(self, interpreter, arguments):
-        # Use the module's environment as the enclosing environment
-        call_env = Environment(enclosing=self.module.env)
-        
-        # --- Bind parameters, now with variadic support ---
-        if self.func_decl.is_variadic:
-            num_fixed_params = len(self.func_decl.params) - 1
-            if len(arguments) < num_fixed_params:
-                raise MryaRuntimeError(self.func_decl.name, f"Function '{self.func_decl.name.lexeme}' expects at least {num_fixed_params} arguments, but got {len(arguments)}.")
-
-            # Bind fixed parameters
-            for i in range(num_fixed_params):
-                call_env.define_variable(self.func_decl.params[i].lexeme, MryaBox(arguments[i]))
-
-            # Bind variadic parameter to a list of remaining arguments
-            variadic_args = arguments[num_fixed_params:]
-            variadic_param_name = self.func_decl.params[-1].lexeme
-            call_env.define_variable(variadic_param_name, MryaBox(variadic_args))
-        else:
-            if len(arguments) != len(self.func_decl.params):
-                raise MryaRuntimeError(self.func_decl.name, f"Function '{self.func_decl.name.lexeme}' expects {len(self.func_decl.params)} arguments, but got {len(arguments)}.")
-
-            for i, param in enumerate(self.func_decl.params):
-                call_env.define_variable(param.lexeme, MryaBox(arguments[i]))
-        
+        call_env = self.call_environment(interpreter, arguments)
         # Execute the function body in the module's environment
-        try:
-            interpreter._execute_block(self.func_decl.body, call_env)
-            return None
-        except ReturnValue as return_value:
-            return return_value.value
+        return interpreter._run_function_body(self.func_decl, call_env)
+
+    def call_environment(self, interpreter, arguments):
+        # Use the function's closure, which for module-level functions is the module's environment
+        closure_env = self.func_decl.env if self.func_decl.env is not None else self.module.env
+        call_env = Environment(enclosing=closure_env, layout=self.func_decl.layout)
+        interpreter._bind_arguments(self.func_decl, call_env, arguments)
+        return call_env
+
+# Methods a class can define to overload an operator or builtin.
+OPERATOR_METHODS = ("_plus_", "_minus_", "_times_", "_divide_", "_equals_", "_get_", "_set_", "_len_", "_out_", "_iter_", "_next_")
+
+# Binary operators that dispatch to one of those methods (`!=` negates `_equals_`).
+_BINARY_OPERATOR_METHODS = {
+    TokenType.PLUS: "_plus_",
+    TokenType.MINUS: "_minus_",
+    TokenType.STAR: "_times_",
+    TokenType.SLASH: "_divide_",
+    TokenType.EQUAL_EQUAL: "_equals_",
+    TokenType.BANG_EQUAL: "_equals_",
+}
 
 class MryaClass:
     def __init__(self, name, superclass, methods):
         self.name = name
-        self.methods = methods
+        self.methods = methods # The class's own methods and static attributes
         self.superclass = superclass
+        self._subclasses = weakref.WeakSet()
+        if superclass is not None:
+            superclass._subclasses.add(self)
+        # Lookups go through tables flattened from the whole superclass chain. Changing
+        # `methods` (see set_attribute) rebuilds them for this class and every subclass.
+        self._refresh()
 
     def __call__(self, interpreter, arguments):
         instance = MryaInstance(self)
@@ -99,11 +153,40 @@ class MryaClass:
         return instance
 
     def find_method(self, name):
-        if name in self.methods:
-            return self.methods[name]
-        if self.superclass:
-            return self.superclass.find_method(name)
-        return None
+        return self._table.get(name)
+
+    def defining_class(self, declaration):
+        """The class in this one's chain that defines `declaration`, or the root class if none does."""
+        owner = self._owners.get(declaration)
+        if owner is None:
+            owner = self
+            while owner.superclass:
+                owner = owner.superclass
+        return owner
+
+    def set_attribute(self, name, value):
+        """Stores a static attribute (or replaces a method) on the class."""
+        self.methods[name] = value
+        self._refresh()
+
+    def _refresh(self):
+        superclass = self.superclass
+        # Start from the superclass's tables, so this class's definitions override its ancestors'.
+        table = dict(superclass._table) if superclass is not None else {}
+        owners = dict(superclass._owners) if superclass is not None else {}
+        table.update(self.methods)
+        for value in self.methods.values():
+            if isinstance(value, FunctionDeclaration):
+                owners[value] = self
+        self._table = table
+        self._owners = owners # Maps each method declaration to the class that defines it
+        # Operator slots: only the overloads this class actually has, so a miss is one failed lookup.
+        self.operators = {name: table[name] for name in OPERATOR_METHODS if table.get(name)}
+        self.binary_operators = {
+            op: table[name] for op, name in _BINARY_OPERATOR_METHODS.items() if table.get(name)
+        }
+        for subclass in self._subclasses:
+            subclass._refresh()
 
     def __str__(self):
         return f"<class {self.name}>"
@@ -139,13 +222,73 @@ class MryaInstance:
     def __str__(self):
         return f"<Instance of {self._klass.name}>"
 
+class MryaGenerator:
+    """
+    What calling a generator function returns. Its body runs only as a for-loop asks for values,
+    pausing at each yield with its frame kept, so a pipeline of generators holds one item at a time.
+    """
+    __slots__ = ("name", "steps")
+    def __init__(self, interpreter, declaration, env):
+        self.name = declaration.name.lexeme
+        self.steps = interpreter._run_generator(declaration, env)
+
+    def __iter__(self):
+        return self.steps
+
+    def __str__(self):
+        return f"<Generator {self.name}>"
+
+class MryaCoroutine:
+    """
+    What calling an async function returns: its body, not started yet. `await` runs it to its result,
+    and spawn() runs it alongside the rest of the program. At each `await` inside it, the body pauses
+    (like a generator at a yield) and the event loop gets on with other tasks until it can carry on.
+    """
+    __slots__ = ("name", "steps")
+    def __init__(self, interpreter, declaration, env):
+        self.name = declaration.name.lexeme
+        self.steps = interpreter._run_generator(declaration, env)
+
+    def __await__(self):
+        steps = self.steps
+        if steps is None:
+            raise RuntimeError(f"The call of '{self.name}' has already been awaited; spawn() it to await its task more than once.")
+        self.steps = None
+        return _drive(steps).__await__()
+
+    def __str__(self):
+        return f"<Coroutine {self.name}>"
+
+async def _drive(steps):
+    """
+    Runs an async function's body on the event loop. The body's Python generator hands out what each
+    `await` waits on (see _generator_await); this awaits it and sends the result, or the error, back in.
+    """
+    value = None
+    error = None
+    while True:
+        try:
+            awaited = steps.send(value) if error is None else steps.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            value = await awaited
+            error = None
+        except BaseException as e:
+            # Including cancellation, so the body's `end` blocks still run.
+            value = None
+            error = e
+
 class Environment:
-    def __init__(self, enclosing=None):
+    __slots__ = ("values", "functions", "enclosing", "layout", "slots")
+
+    def __init__(self, enclosing=None, layout=None):
         self.values = {}
-        self.types = {} # Store type annotations
-        self.constants = set() # Store names of constant variables
         self.functions = {}
         self.enclosing = enclosing
+        # Frames built from a resolved FrameLayout keep their variables in slots, indexed statically.
+        self.layout = layout
+        self.slots = [UNBOUND] * layout.size if layout is not None else None
     
     def define_variable(self, name, value):
         # This method now expects 'value' to be a MryaBox
@@ -154,29 +297,28 @@ class Environment:
         else: # It's a Token
             self.values[name.lexeme] = value
     
-    def define_typed_variable(self, name_token, value, type_token):
-        # This method also expects 'value' to be a MryaBox
-        self.values[name_token.lexeme] = value
-        self.types[name_token.lexeme] = type_token.lexeme
-
-    def get_type(self, name):
-        if name in self.types:
-            return self.types[name]
-        if self.enclosing:
-            return self.enclosing.get_type(name)
-        return None
-        
     def define_function(self, name_token, func_decl):
         self.functions[name_token.lexeme] = func_decl
-        
+
     def get_variable(self, name_token):
         name = name_token.lexeme
-        if name in self.values:
-            return self.values[name].value
-        if self.enclosing:
-            return self.enclosing.get_variable(name_token)
-        if name in self.functions: # Fallback to check global functions
-            return self.functions[name]
+        env = self
+        while env is not None:
+            box = env.values.get(name)
+            if box is not None:
+                return box.value
+            if env.layout is not None:
+                slot = env.layout.names.get(name)
+                if slot is not None:
+                    value = env.slots[slot]
+                    if value is not UNBOUND:
+                        return value.value if env.layout.boxed[slot] else value
+            env = env.enclosing
+        env = self
+        while env.enclosing:
+            env = env.enclosing
+        if name in env.functions: # Fallback to check global functions
+            return env.functions[name]
         raise MryaRuntimeError(name_token, f"Variable '{name}' is not defined.")
     
     def get_function(self, name_token):
@@ -189,34 +331,67 @@ class Environment:
     
     def assign(self, name_token, value):
         name = name_token.lexeme
-        if name in self.values:
-            box = self.values[name]
-            if box.is_const:
-                raise MryaRuntimeError(name_token, f"Cannot assign to constant variable '{name}'.")
-            expected_type = self.get_type(name)
-            if expected_type:
-                MryaInterpreter._check_type(expected_type, value, name_token)
-            box.value = value
-        elif self.enclosing:
-            self.enclosing.assign(name_token, value)
-        else:
-            raise MryaRuntimeError(name_token, f"Cannot assign to undefined variable '{name}'.")
+        env = self
+        while env is not None:
+            box = env.values.get(name)
+            if box is None and env.layout is not None:
+                slot = env.layout.names.get(name)
+                if slot is not None and env.slots[slot] is not UNBOUND:
+                    if not env.layout.boxed[slot]:
+                        env.slots[slot] = value
+                        return
+                    box = env.slots[slot]
+            if box is not None:
+                env.assign_box(box, name_token, value)
+                return
+            env = env.enclosing
+        raise MryaRuntimeError(name_token, f"Cannot assign to undefined variable '{name}'.")
+
+    @staticmethod
+    def assign_box(box, name_token, value, proven=None):
+        """
+        Stores into a variable's box, enforcing const and type annotations. `proven` is the guard the
+        optimizer showed the value always passes (see MryaOptimizer), so a box with that guard skips it.
+        """
+        if box.is_const:
+            raise MryaRuntimeError(name_token, f"Cannot assign to constant variable '{name_token.lexeme}'.")
+        guard = box.guard
+        if guard is not None and guard is not proven:
+            guard(value, name_token)
+        box.value = value
 
 class MryaInterpreter:
     def __init__(self):
         self.env = Environment()
+        self.global_env = self.env
+        self.optimize_level = None # Level imported modules are optimized at (see mrya_optimizer); None uses the default
+        self.output = StdoutSink() # Where output() writes, see mrya_output
+        self.loop = None # The asyncio event loop async functions run on, made when first needed (see event_loop)
+        self.tasks = set() # Spawned tasks the program hasn't awaited yet (see modules.tasks)
 
         # Native Modules
         # Native Modules
         time_mod = MryaModule("time")
-        time_mod.methods = {
+        time_mod.methods = natives({
             "sleep": time_module.sleep,
             "time": time_module.time,
             "datetime": time_module.datetime_now,
-        }
+        })
+        # What `await time.sleep(...)` runs instead: it pauses only the task, not the whole program.
+        awaitable(time_mod.methods, {"sleep": tasks_module.sleep})
+
+        net_mod = MryaModule("net")
+        net_mod.methods = natives({
+            "connect": net_module.connect,
+            "serve": net_module.serve,
+        })
+        awaitable(net_mod.methods, {
+            "connect": net_module.connect_async,
+            "serve": net_module.serve_async,
+        })
 
         fs_mod = MryaModule("fs")
-        fs_mod.methods = {
+        fs_mod.methods = natives({
             "exists": fs_utils.exists,
             "is_file": fs_utils.is_file,
             "is_dir": fs_utils.is_dir,
@@ -225,24 +400,25 @@ class MryaInterpreter:
             "make_dir": fs_utils.make_dir,
             "remove_file": fs_utils.remove_file,
             "remove_dir": fs_utils.remove_dir,
-        }
+        })
 
         string_mod = MryaModule("string")
+        # String functions coerce their arguments to strings (and indexes to ints) before the call.
         string_mod.methods = {
-            "upper": lambda s: str(s).upper(),
-            "lower": lambda s: str(s).lower(),
-            "trim": lambda s: str(s).strip(),
-            "replace": lambda s, old, new: str(s).replace(str(old), str(new)),
-            "split": lambda s, sep: str(s).split(str(sep)),
-            "startsWith": lambda s, prefix: str(s).startswith(str(prefix)),
-            "endsWith": lambda s, suffix: str(s).endswith(str(suffix)),
-            "contains": lambda s, sub: str(sub) in str(s),
-            "slice": lambda s, start, end=None: str(s)[int(start):int(end) if end is not None else None],
-            "join": lambda sep, lst: str(sep).join([str(i) for i in lst]),
+            "upper": native(str.upper, name="upper", arity=1, coercions=(str,)),
+            "lower": native(str.lower, name="lower", arity=1, coercions=(str,)),
+            "trim": native(str.strip, name="trim", arity=1, coercions=(str,)),
+            "replace": native(str.replace, name="replace", arity=3, coercions=(str, str, str)),
+            "split": native(str.split, name="split", arity=2, coercions=(str, str)),
+            "startsWith": native(str.startswith, name="startsWith", arity=2, coercions=(str, str)),
+            "endsWith": native(str.endswith, name="endsWith", arity=2, coercions=(str, str)),
+            "contains": native(operator.contains, name="contains", arity=2, coercions=(str, str)),
+            "slice": native(lambda s, start, end=None: s[start:end], name="slice", coercions=(str, int, _optional_int)),
+            "join": native(lambda sep, lst: sep.join([str(i) for i in lst]), name="join", coercions=(str,)),
         }
 
         math_mod = MryaModule("math")
-        math_mod.methods = {
+        math_mod.methods = natives({
             "abs": math_utils.absfn,
             "randint": math_utils.randint,
             "round": math_utils.roundfn,
@@ -256,10 +432,10 @@ class MryaInterpreter:
             "log": math_utils.log,
             "exp": math_utils.exp,
             "pow": math_utils.pow,
-        }
+        })
 
         window_mod = MryaModule("window")
-        window_mod.methods = {
+        window_mod.methods = natives({
             "init": window_module.init,
             "create_display": window_module.create_display,
             "update": window_module.update,
@@ -273,7 +449,7 @@ class MryaInterpreter:
             "get_event_key": window_module.get_event_key,
             "get_key_state": window_module.get_key_state,
             "update_key_states": window_module.update_key_states
-        }
+        })
 
         builtins = {
             "exit": self._builtin_exit,
@@ -281,12 +457,23 @@ class MryaInterpreter:
             "to_float": self._builtin_to_float,
             "to_bool": self._builtin_to_bool,
             "request": self._builtin_request,
-            "fetch": self._builtin_fetch, # Patched to resolve paths
-            "fetch_raw": self._builtin_fetch_raw,
-            "store": lambda *args: store(self, *args),
-            "append_to": lambda *args: append_to(self, *args),
-            "import": self._builtin_import,
-            "length": self._builtin_length,
+            # These resolve paths against the calling context's directory (see execution_context).
+            "fetch": NativeFunction(MryaInterpreter._builtin_fetch, name="fetch", needs_interpreter=True),
+            "fetch_raw": NativeFunction(MryaInterpreter._builtin_fetch_raw, name="fetch_raw", needs_interpreter=True),
+            "store": store, # Takes the interpreter, see NativeFunction
+            "append_to": append_to,
+            "import": NativeFunction(MryaInterpreter._builtin_import, name="import", needs_interpreter=True),
+            # Calls a class's _len_ on the calling context, which may be a request handler's thread.
+            "length": NativeFunction(MryaInterpreter._builtin_length, name="length", needs_interpreter=True),
+            "flush": self._builtin_flush,
+            "range": self._builtin_range,
+            "builder": builder_module.builder,
+            # Worker processes
+            "parallel_map": parallel_module.parallel_map,
+            "pool": parallel_module.pool,
+            # Async tasks
+            "spawn": tasks_module.spawn,
+            "gather": tasks_module.gather,
             # List commands
             "list": arrays.create,
             "get": arrays.get,
@@ -317,6 +504,10 @@ class MryaInterpreter:
             "pow": math_utils.pow,
             "raise": error_module.mrya_raise,
             "assert": error_module.mrya_assert,
+            # Memoization
+            "memo": memo_module.memo,
+            "memo_stats": memo_module.stats,
+            "memo_clear": memo_module.clear,
             # "Private" built-ins for the jsoft package
             "_jsoft_parse": jsoft_module.parse,
             "_jsoft_stringify": jsoft_module.stringify,
@@ -415,12 +606,16 @@ class MryaInterpreter:
             "_math_exp": math_utils.exp,
             "_math_pow": math_utils.pow,
         }
+        builtins = natives(builtins)
+        # File I/O can also be awaited, which runs it on a worker thread so other tasks carry on meanwhile.
+        awaitable(builtins, {name: tasks_module.in_thread(builtins[name].function) for name in ("fetch", "fetch_raw", "store", "append_to")})
         for name, fn in builtins.items():
             # Wrap built-in functions in a constant box
             self.env.define_variable(name, MryaBox(fn, is_const=True))
 
         self.native_modules = {
             "time": time_mod,
+            "net": net_mod,
             "fs": fs_mod,
             "string": string_mod,
             "math": math_mod,
@@ -428,31 +623,60 @@ class MryaInterpreter:
         }
 
         http_mod = MryaModule("http_server")
-        http_mod.methods = {
-            "run": http_server_module.run_server
-        }
+        http_mod.methods = natives({
+            "run": http_server_module.run_server,
+            "start": http_server_module.start_server,
+            "stats": http_server_module.stats
+        })
         self.native_modules["http_server"] = http_mod
 
         html_mod = MryaModule("html_renderer")
-        html_mod.methods = {
+        html_mod.methods = natives({
             "render": html_renderer_module.render
-        }
+        })
         self.native_modules["html_renderer"] = html_mod
 
         self.imported_files = set()
         self.module_cache = {} # Add a cache for module objects
+        # Held while a file is imported, so two threads importing it at once don't both run it.
+        self.import_lock = threading.RLock()
         self.current_directory = os.getcwd()
         self.initial_directory = os.getcwd()
     
     def _builtin_exit():
         raise MryaRaisedError("Program exited..")
 
+    def execution_context(self):
+        """
+        A copy of the interpreter for running Mrya code on another thread, like an HTTP request handler.
+        What the program has defined is shared: global variables, imported modules, natives and output.
+        The execution state is its own: the current environment, script directory, event loop and (in
+        the compiling engines) compiler, which running code swaps in and out as it goes.
+        """
+        context = copy.copy(self)
+        context.env = self.global_env
+        context.loop = None
+        context.tasks = set()
+        return context
+
     def interpret(self, statements):
-        for stmt in statements:
-            self._execute(stmt)
+        try:
+            for stmt in statements:
+                signal = self._execute(stmt)
+                if signal is not None and type(signal) is ReturnSignal:
+                    # A top-level return ends the program; callers like the test suite handle it.
+                    raise ReturnValue(signal.value)
+            self._finish_tasks()
+        finally:
+            self.output.flush()
     
     def _execute(self, stmt):
+        """Runs a statement. Returns None, or a completion signal (BREAK, CONTINUE or a ReturnSignal)."""
         if isinstance(stmt, LetStatement):
+            if stmt.slot is not None and not stmt.boxed:
+                # A plain local that is never aliased lives in its slot without a box.
+                self.env.slots[stmt.slot] = self._evaluate(stmt.initializer)
+                return
             if stmt.is_const:
                 # For const, we always want the final value, not a reference.
                 # So we evaluate with unbox=True to get the raw value.
@@ -465,82 +689,23 @@ class MryaInterpreter:
                 # If the initializer was another variable, we get its box.
                 # Otherwise, we create a new non-constant box.
                 box = init_value if isinstance(init_value, MryaBox) else MryaBox(init_value, is_const=False)
-
-            if stmt.type_annotation:
-                self._check_type(stmt.type_annotation.lexeme, box.value, stmt.type_annotation)
-                self.env.define_typed_variable(stmt.name, box, stmt.type_annotation)
-            else:
-                self.env.define_variable(stmt.name, box)
+            self._define_let(stmt, box)
             
         elif isinstance(stmt, OutputStatement):
-            value = self._evaluate(stmt.expression)
-            
-            # Handle custom output for class instances
-            if isinstance(value, MryaInstance):
-                out_method = value._klass.find_method("_out_")
-                if out_method:
-                    bound_method = MryaBoundMethod(value, out_method)
-                    # Call the _out_ method to get the string representation
-                    output_value = str(bound_method(self, []))
-                else:
-                    output_value = str(value) # Use default representation
-            else:
-                output_value = value
-            if os.path.basename(getattr(__main__, "__file__", "")) != "mrya_suite.py": # Avoid output during test suite
-                print(output_value)
+            self._output_value(self._evaluate(stmt.expression))
         
         elif isinstance(stmt, ClassDeclaration):
-            superclass = None
-            if stmt.superclass:
-                superclass = self._evaluate(stmt.superclass)
-                if not isinstance(superclass, MryaClass):
-                    raise MryaRuntimeError(stmt.superclass.name, "Superclass must be a class.")
-
-            methods = {method.name.lexeme: method for method in stmt.methods}
-            
-            # The initial class object
-            klass_obj = MryaClass(stmt.name.lexeme, superclass, methods)
-
-            # Apply decorators
-            decorated_obj = klass_obj
-            if stmt.decorators:
-                # Decorators are applied from the bottom up
-                for decorator_expr in reversed(stmt.decorators):
-                    decorator_func = self._evaluate(decorator_expr)
-                    # Check if it's a Mrya function, a bound method, or a Python callable
-                    is_mrya_callable = isinstance(decorator_func, (FunctionDeclaration, MryaBoundMethod, MryaModuleMethod))
-                    if not is_mrya_callable and not callable(decorator_func):
-                        # This needs a token for better error reporting.
-                        raise MryaRuntimeError(decorator_expr.name, f"Decorator must be a callable function.")
-                    decorated_obj = self.call_function_or_method(decorator_func, [decorated_obj])
-
-            self.env.define_variable(stmt.name, MryaBox(decorated_obj, is_const=True))
+            self._declare_class(stmt)
 
         elif isinstance(stmt, FunctionDeclaration):
-            # The function object itself
-            # Capture the current environment to create a closure.
-            stmt.env = self.env
-
-            func_obj = stmt
-
-            # Apply decorators
-            decorated_obj = func_obj
-            if stmt.decorators:
-                # Decorators are applied from the bottom up
-                for decorator_expr in reversed(stmt.decorators):
-                    decorator_func = self._evaluate(decorator_expr)
-                    is_mrya_callable = isinstance(decorator_func, (FunctionDeclaration, MryaBoundMethod, MryaModuleMethod))
-                    if not is_mrya_callable and not callable(decorator_func):
-                        # This needs a token for better error reporting.
-                        raise MryaRuntimeError(decorator_expr.name, f"Decorator must be a callable function.")
-                    # Use the interpreter's call mechanism
-                    decorated_obj = self.call_function_or_method(decorator_func, [decorated_obj])
-
-            self.env.define_variable(stmt.name, MryaBox(decorated_obj, is_const=True))
+            self._declare_function(stmt)
 
         elif isinstance(stmt, ReturnStatement):
+            if stmt.tail_call:
+                call = stmt.value
+                return self._tail_call(call, self._evaluate(call.callee), self._call_arguments(call))
             value = self._evaluate(stmt.value) if stmt.value is not None else None
-            raise ReturnValue(value)
+            return ReturnSignal(value)
         
         elif isinstance(stmt, Expr):
             self._evaluate(stmt)
@@ -548,140 +713,564 @@ class MryaInterpreter:
         elif isinstance(stmt, IfStatement):
             condition = self._evaluate(stmt.condition)
             if condition:
-                for s in stmt.then_branch:
-                    self._execute(s)
+                return self._execute_statements(stmt.then_branch)
             elif stmt.else_branch:
-                for s in stmt.else_branch:
-                    self._execute(s)
+                return self._execute_statements(stmt.else_branch)
         
         elif isinstance(stmt, WhileStatement):
-            try:
-                while self._evaluate(stmt.condition):
-                    try:
-                        for inner_stmt in stmt.body:
-                            self._execute(inner_stmt)
-                    except ContinueInterrupt:
-                        continue # Python's continue, to continue the while loop
-            except BreakInterrupt:
-                pass # Exit the loop
+            while self._evaluate(stmt.condition):
+                signal = self._execute_statements(stmt.body)
+                if signal is not None:
+                    if signal is BREAK:
+                        break # Exit the loop
+                    if signal is not CONTINUE:
+                        return signal # A return passes through the loop
         
         elif isinstance(stmt, ForStatement):
-            iterable = self._evaluate(stmt.iterable)
-            if not isinstance(iterable, (list, str)):
-                raise MryaRuntimeError(stmt.variable, "For loop can only iterate over lists and strings.")
-
-            try:
-                for item in iterable:
-                    try:
-                        # Create a new environment for each iteration to properly scope the loop variable
-                        loop_env = Environment(enclosing=self.env)
-                        loop_env.define_variable(stmt.variable, MryaBox(item)) # This was incorrect, should be a new box
-                        
-                        # Execute the body in the new environment
-                        self._execute_block(stmt.body, loop_env)
-                    except ContinueInterrupt:
-                        continue # Python's continue, to continue the for loop
-            except BreakInterrupt:
-                pass # Exit the loop
+            iterable = self._for_iterable(stmt, self._evaluate(stmt.iterable))
+            if self._reuses_loop_frame(stmt.layout):
+                return self._for_in_one_frame(stmt, iterable)
+
+            for item in iterable:
+                # Create a new environment for each iteration to properly scope the loop variable
+                loop_env = Environment(enclosing=self.env, layout=stmt.layout)
+                if stmt.layout is not None:
+                    loop_env.slots[0] = MryaBox(item) if stmt.layout.boxed[0] else item
+                else:
+                    loop_env.define_variable(stmt.variable, MryaBox(item))
+                
+                # Execute the body in the new environment
+                signal = self._execute_block(stmt.body, loop_env)
+                if signal is not None:
+                    if signal is BREAK:
+                        break # Exit the loop
+                    if signal is not CONTINUE:
+                        return signal
 
         elif isinstance(stmt, BreakStatement):
-            raise BreakInterrupt()
+            return BREAK
         elif isinstance(stmt, ContinueStatement):
-            raise ContinueInterrupt()
+            return CONTINUE
         
         elif isinstance(stmt, TryStatement):
+            if not stmt.finally_block:
+                return self._try_catch(stmt)
             try:
-                self._execute_block(stmt.try_block, self.env)
-            except (MryaRuntimeError, MryaTypeError, MryaRaisedError) as e:
-                caught = False
-                for clause in stmt.catch_clauses:
-                    # Check if the clause can handle this error type.
-                    can_handle = False
-                    if clause.error_type:  # Specific catch like `catch MryaRuntimeError`
-                        error_name = type(e).__name__
-                        if clause.error_type.lexeme == error_name:
-                            can_handle = True
-                    else: # Generic catch {}
-                        can_handle = True
-
-                    if can_handle:
-                        self._execute_block(clause.body, Environment(enclosing=self.env))
-                        caught = True
-                        break # Only execute the first matching catch block
-                
-                if not caught:
-                    raise e # Re-raise the exception if no catch block handled it
-            finally:
-                if stmt.finally_block:
-                    self._execute_block(stmt.finally_block, self.env)
-
-
-
-
-
-
-
-
+                signal = self._try_catch(stmt)
+            except BaseException:
+                # A return, break or continue in the finally block discards the error.
+                final_signal = self._execute_block(stmt.finally_block, self.env)
+                if final_signal is not None:
+                    return final_signal
+                raise
+            final_signal = self._execute_block(stmt.finally_block, self.env)
+            return final_signal if final_signal is not None else signal
 
         elif isinstance(stmt, Assignment):
-            value = self._evaluate(stmt.value)
-            self.env.assign(stmt.name, value)
+            self._assign_value(stmt, self._evaluate(stmt.value))
 
         elif isinstance(stmt, SetProperty):
             obj = self._evaluate(stmt.object)
             value = self._evaluate(stmt.value)
+            self._set_property(stmt, obj, value)
 
-            if isinstance(obj, MryaInstance):
-                obj.fields[stmt.name.lexeme] = value
-            elif isinstance(obj, MryaClass):
-                # Allow setting "static" properties on a class.
-                # We can store them in the `methods` dict, which acts as the class's attribute store.
-                obj.methods[stmt.name.lexeme] = value
-            elif isinstance(obj, dict):
-                # Allow setting properties on maps using dot notation.
-                obj[stmt.name.lexeme] = value
-            else:
-                raise MryaRuntimeError(stmt.name, "Only instances, classes, and maps can have properties set.")
         elif isinstance(stmt, SubscriptSet):
             obj = self._evaluate(stmt.object)
             index = self._evaluate(stmt.index)
             value = self._evaluate(stmt.value)
-
-            if isinstance(obj, list):
-                if not isinstance(index, int):
-                    raise MryaRuntimeError(stmt.index.name if hasattr(stmt.index, 'name') else stmt.object.name, "List index must be an integer.")
-                try:
-                    obj[index] = value
-                except IndexError:
-                    raise MryaRuntimeError(stmt.index.name if hasattr(stmt.index, 'name') else stmt.object.name, f"List index {index} out of range.")
-            elif isinstance(obj, dict):
-                # In Mrya, map keys can be strings or numbers
-                if not isinstance(index, (str, int, float)):
-                     raise MryaRuntimeError(stmt.index.name if hasattr(stmt.index, 'name') else stmt.object.name, "Map keys must be strings or numbers.")
-                obj[index] = value
-            elif isinstance(obj, MryaInstance):
-                set_method = obj._klass.find_method("_set_")
-                if not set_method:
-                    raise ClassFunctionError(stmt.object.name, f"Class '{obj._klass.name}' does not define a '_set_' method and cannot be assigned to with [].")
-                bound_method = MryaBoundMethod(obj, set_method)
-                bound_method(self, [index, value])
-            else:
-                raise MryaRuntimeError(stmt.object.name, "Can only set items on lists and maps.")
+            self._subscript_set(stmt, obj, index, value)
              
         elif isinstance(stmt, ImportStatement):
             # This handles standalone `import("filename")` statements.
-            path_str = self._evaluate(stmt.path_expr)
-            module_obj = self._builtin_import(path_str)
- 
-            # Create a variable in the current environment with the module's name.
-            module_name = os.path.splitext(os.path.basename(path_str))[0]
-            # The token is for error reporting; line number isn't critical here.
-            module_name_token = Token(TokenType.IDENTIFIER, module_name, None, 0)
-            self.env.define_variable(module_name_token, MryaBox(module_obj, is_const=True))
+            self._import_statement(stmt, self._evaluate(stmt.path_expr))
 
         else:
             raise RuntimeError(f"Unknown statement type: {type(stmt).__name__}")
+
+    @staticmethod
+    def _reuses_loop_frame(layout):
+        """A for-loop can run every iteration in one frame when nothing in its body can keep the frame alive."""
+        return layout is not None and not layout.is_captured and not layout.is_dynamic
+
+    def _for_in_one_frame(self, stmt, iterable):
+        """Runs a for-loop whose body creates no closures, rebinding its frame in place on each iteration."""
+        layout = stmt.layout
+        loop_env = Environment(enclosing=self.env, layout=layout)
+        slots = loop_env.slots
+        # Clearing the rest of the frame keeps a read before a `let` behaving as on the first iteration.
+        unbound = [UNBOUND] * (layout.size - 1) if layout.size > 1 else None
+        boxed = layout.boxed[0]
+        body = stmt.body
+        previous_env = self.env
+        self.env = loop_env
+        try:
+            for item in iterable:
+                slots[0] = MryaBox(item) if boxed else item
+                if unbound is not None:
+                    slots[1:] = unbound
+                signal = self._execute_statements(body)
+                if signal is not None:
+                    if signal is BREAK:
+                        break
+                    if signal is not CONTINUE:
+                        return signal
+        finally:
+            self.env = previous_env
+        return None
+
+    # --- Generators ---
+    def _run_generator(self, declaration, env):
+        """
+        The Python generator behind a MryaGenerator or MryaCoroutine: runs the body in `env`, yielding
+        what each yield produces (or each await waits on), and returns what the body returns.
+        """
+        signal = yield from self._generator_statements(declaration.body, env)
+        if signal is not None and type(signal) is ReturnSignal:
+            return signal.value
+        return None
+
+    def _generator_statements(self, statements, env):
+        """
+        Runs statements of a generator body, like _execute_statements. A statement that can't pause or
+        jump out (see _can_suspend) runs on the current engine as usual; the rest are walked here, so
+        the Python generator can suspend mid-statement. self.env is only set while Mrya code runs, so a
+        paused generator leaves the consumer's environment alone.
+        """
+        for stmt in statements:
+            if not self._can_suspend(stmt):
+                previous_env = self.env
+                self.env = env
+                try:
+                    self._execute(stmt)
+                finally:
+                    self.env = previous_env
+                continue
+
+            stmt_type = type(stmt)
+            if stmt_type is YieldStatement:
+                yield self._generator_evaluate(stmt.value, env) if stmt.value is not None else None
+            elif stmt_type is ReturnStatement:
+                # Only an async function's return has a value, as a generator can't return one.
+                if stmt.value is None:
+                    return ReturnSignal(None)
+                if type(stmt.value) is Await:
+                    return ReturnSignal((yield from self._generator_await(stmt.value, env)))
+                return ReturnSignal(self._generator_evaluate(stmt.value, env))
+            elif stmt_type is Await:
+                yield from self._generator_await(stmt, env)
+            elif stmt_type is LetStatement:
+                value = yield from self._generator_await(stmt.initializer, env)
+                self._generator_call(env, self._define_let_value, stmt, value)
+            elif stmt_type is Assignment:
+                value = yield from self._generator_await(stmt.value, env)
+                self._generator_call(env, self._assign_value, stmt, value)
+            elif stmt_type is OutputStatement:
+                value = yield from self._generator_await(stmt.expression, env)
+                self._generator_call(env, self._output_value, value)
+            elif stmt_type is BreakStatement:
+                return BREAK
+            elif stmt_type is ContinueStatement:
+                return CONTINUE
+
+            elif stmt_type is IfStatement:
+                branch = stmt.then_branch if self._generator_evaluate(stmt.condition, env) else stmt.else_branch
+                if branch:
+                    signal = yield from self._generator_statements(branch, env)
+                    if signal is not None:
+                        return signal
+
+            elif stmt_type is WhileStatement:
+                while self._generator_evaluate(stmt.condition, env):
+                    signal = yield from self._generator_statements(stmt.body, env)
+                    if signal is not None:
+                        if signal is BREAK:
+                            break
+                        if signal is not CONTINUE:
+                            return signal
+
+            elif stmt_type is ForStatement:
+                iterable = self._for_iterable(stmt, self._generator_evaluate(stmt.iterable, env))
+                layout = stmt.layout
+                for item in iterable:
+                    loop_env = Environment(enclosing=env, layout=layout)
+                    if layout is not None:
+                        loop_env.slots[0] = MryaBox(item) if layout.boxed[0] else item
+                    else:
+                        loop_env.define_variable(stmt.variable, MryaBox(item))
+                    signal = yield from self._generator_statements(stmt.body, loop_env)
+                    if signal is not None:
+                        if signal is BREAK:
+                            break
+                        if signal is not CONTINUE:
+                            return signal
+
+            elif stmt_type is TryStatement:
+                try:
+                    try:
+                        signal = yield from self._generator_statements(stmt.try_block, env)
+                    except (MryaRuntimeError, MryaTypeError, MryaRaisedError) as e:
+                        clause = self._find_catch_clause(stmt, e)
+                        if clause is None:
+                            raise
+                        signal = yield from self._generator_statements(clause.body, Environment(enclosing=env, layout=clause.layout))
+                except BaseException:
+                    if stmt.finally_block:
+                        # A return, break or continue in the finally block discards the error.
+                        final_signal = yield from self._generator_statements(stmt.finally_block, env)
+                        if final_signal is not None:
+                            return final_signal
+                    raise
+                if stmt.finally_block:
+                    final_signal = yield from self._generator_statements(stmt.finally_block, env)
+                    if final_signal is not None:
+                        return final_signal
+                if signal is not None:
+                    return signal
+        return None
+
+    def _generator_evaluate(self, expr, env):
+        previous_env = self.env
+        self.env = env
+        try:
+            return self._evaluate(expr)
+        finally:
+            self.env = previous_env
+
+    def _generator_call(self, env, function, *args):
+        previous_env = self.env
+        self.env = env
+        try:
+            return function(*args)
+        finally:
+            self.env = previous_env
+
+    def _generator_await(self, expr, env):
+        """
+        `await` as the value of a statement in an async function: pauses the body, handing what it waits
+        on to _drive, and gives back the result once it's ready. Anything that isn't awaitable is its own result.
+        """
+        awaited = self._generator_call(env, self._await_operand, expr)
+        if not tasks_module.is_awaitable(awaited):
+            return awaited
+        try:
+            return (yield awaited)
+        except (MryaRuntimeError, MryaTypeError, MryaRaisedError):
+            raise
+        except Exception as e:
+            raise MryaRuntimeError(expr.keyword, f"Error while awaiting: {e}") from e
+
+    @staticmethod
+    def _can_suspend(stmt, in_loop=False):
+        """
+        Whether running `stmt` in a generator or async function can pause it (a yield, or an await as
+        the value of the statement) or leave the statement early (a return, or a break or continue of a
+        loop outside it). Cached on the statement.
+        """
+        can_suspend = stmt.__dict__.get("_can_suspend")
+        if can_suspend is not None and not in_loop:
+            return can_suspend
+        stmt_type = type(stmt)
+        if stmt_type is YieldStatement or stmt_type is ReturnStatement or stmt_type is Await:
+            can_suspend = True
+        elif stmt_type is LetStatement:
+            can_suspend = type(stmt.initializer) is Await
+        elif stmt_type is Assignment:
+            can_suspend = type(stmt.value) is Await
+        elif stmt_type is OutputStatement:
+            can_suspend = type(stmt.expression) is Await
+        elif stmt_type is BreakStatement or stmt_type is ContinueStatement:
+            can_suspend = not in_loop
+        elif stmt_type is IfStatement:
+            can_suspend = any(MryaInterpreter._can_suspend(s, in_loop) for s in stmt.then_branch + (stmt.else_branch or []))
+        elif stmt_type is WhileStatement or stmt_type is ForStatement:
+            can_suspend = any(MryaInterpreter._can_suspend(s, True) for s in stmt.body)
+        elif stmt_type is TryStatement:
+            blocks = [stmt.try_block, stmt.finally_block or []] + [clause.body for clause in stmt.catch_clauses]
+            can_suspend = any(MryaInterpreter._can_suspend(s, in_loop) for block in blocks for s in block)
+        else:
+            can_suspend = False
+        if not in_loop:
+            stmt._can_suspend = can_suspend
+        return can_suspend
+
+    # --- Async functions ---
+    def event_loop(self):
+        """The event loop async functions and spawned tasks run on. It runs while the program awaits."""
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+        return self.loop
+
+    def _await_operand(self, expr):
+        """
+        Evaluates what an Await waits on. `await f(...)` of a native with an awaitable version (like
+        time.sleep or fetch) calls that version, so the wait doesn't block the event loop.
+        """
+        operand = expr.value
+        if type(operand) is not FunctionCall:
+            return self._evaluate(operand)
+        callee = self._evaluate(operand.callee)
+        if type(callee) is NativeFunction and callee.async_function is not None:
+            callee = callee.awaiting()
+        return self._call_value(operand, callee, self._call_arguments(operand))
+
+    def _await_expression(self, expr):
+        """
+        `await` outside an async function body, i.e. at the top level: runs the event loop (and with
+        it any spawned tasks) until the awaited value is ready.
+        """
+        awaited = self._await_operand(expr)
+        if not tasks_module.is_awaitable(awaited):
+            return awaited
+        loop = self.event_loop()
+        if loop.is_running():
+            # Only a statement of an async function's own body can pause it (see _generator_await).
+            raise MryaRuntimeError(expr.keyword, "In an async function, 'await' has to be the whole value of a statement, e.g. `let result = await f()`.")
+        try:
+            return loop.run_until_complete(awaited)
+        except (MryaRuntimeError, MryaTypeError, MryaRaisedError):
+            raise
+        except Exception as e:
+            raise MryaRuntimeError(expr.keyword, f"Error while awaiting: {e}") from e
+
+    def _finish_tasks(self):
+        """Lets spawned tasks the program never awaited finish before it ends, raising the first error among them."""
+        while self.tasks:
+            futures = [task.future for task in self.tasks if not task.awaited]
+            self.tasks.clear()
+            if futures:
+                self.loop.run_until_complete(asyncio.gather(*futures))
+
+    def _try_catch(self, stmt):
+        """Runs the try block and, if it fails, the catch clause that handles the error."""
+        try:
+            return self._execute_block(stmt.try_block, self.env)
+        except (MryaRuntimeError, MryaTypeError, MryaRaisedError) as e:
+            clause = self._find_catch_clause(stmt, e)
+            if clause is None:
+                raise e # Re-raise the exception if no catch block handled it
+            return self._execute_block(clause.body, Environment(enclosing=self.env, layout=clause.layout))
+
+    # --- Statement semantics shared by every execution engine ---
+    def _define_let(self, stmt, box):
+        if stmt.type_annotation:
+            guard = type_guard(stmt.type_annotation.lexeme)
+            guard(box.value, stmt.type_annotation)
+            # The guard goes on the box, so it follows the variable (and any `let a = b` alias of it)
+            # instead of being looked up by name on every assignment.
+            box.guard = guard
+        self._define(stmt.slot, stmt.name, box)
+
+    def _define_let_value(self, stmt, value):
+        """Runs a let statement whose initializer has already been evaluated to `value`."""
+        if stmt.slot is not None and not stmt.boxed:
+            self.env.slots[stmt.slot] = value
+            return
+        self._define_let(stmt, MryaBox(value, is_const=stmt.is_const))
+
+    def _assign_value(self, stmt, value):
+        """Stores `value` into the variable an Assignment resolved to."""
+        env = self.env
+        depth = stmt.depth
+        if depth is None:
+            env.assign(stmt.name, value)
+            return
+        while depth:
+            env = env.enclosing
+            depth -= 1
+        if stmt.slot is not None:
+            box = env.slots[stmt.slot]
+            if box is UNBOUND:
+                box = None
+            elif not stmt.boxed:
+                env.slots[stmt.slot] = value
+                return
+        else:
+            box = env.values.get(stmt.name.lexeme)
+        if box is not None:
+            env.assign_box(box, stmt.name, value, stmt.proven_guard)
+        else:
+            # Not bound in its resolved frame (yet), so search outwards by name.
+            env.assign(stmt.name, value)
+
+    def _output_value(self, value):
+        # Handle custom output for class instances
+        if isinstance(value, MryaInstance):
+            out_method = value._klass.operators.get("_out_")
+            if out_method:
+                # Call the _out_ method to get the string representation
+                output_value = str(self.call_function_or_method(out_method, [], value))
+            else:
+                output_value = str(value) # Use default representation
+        else:
+            output_value = value
+        self.output.write(str(output_value))
+
+    def _apply_decorators(self, decorators, decorated_obj):
+        # Decorators are applied from the bottom up
+        for decorator_expr in reversed(decorators):
+            decorator_func = self._evaluate(decorator_expr)
+            # Check if it's a Mrya function, a bound method, or a Python callable
+            is_mrya_callable = isinstance(decorator_func, (FunctionDeclaration, MryaBoundMethod, MryaModuleMethod))
+            if not is_mrya_callable and not callable(decorator_func):
+                # This needs a token for better error reporting.
+                raise MryaRuntimeError(decorator_expr.name, f"Decorator must be a callable function.")
+            # Use the interpreter's call mechanism
+            if is_mrya_callable:
+                decorated_obj = self.call_function_or_method(decorator_func, [decorated_obj])
+            else:
+                # A native decorator, like %memo
+                decorated_obj = self._call_value(FunctionCall(decorator_expr, []), decorator_func, [decorated_obj])
+        return decorated_obj
+
+    def _declare_class(self, stmt):
+        superclass = None
+        if stmt.superclass:
+            superclass = self._evaluate(stmt.superclass)
+            if not isinstance(superclass, MryaClass):
+                raise MryaRuntimeError(stmt.superclass.name, "Superclass must be a class.")
+
+        methods = {method.name.lexeme: method for method in stmt.methods}
+        for method in stmt.methods:
+            # Methods close over the scope the class is declared in.
+            method.env = self.env
         
+        # The initial class object
+        klass_obj = MryaClass(stmt.name.lexeme, superclass, methods)
+
+        # Apply decorators
+        decorated_obj = klass_obj
+        if stmt.decorators:
+            decorated_obj = self._apply_decorators(stmt.decorators, klass_obj)
+
+        self._define(stmt.slot, stmt.name, MryaBox(decorated_obj, is_const=True))
+
+    def _declare_function(self, stmt):
+        env = self.env
+        if env.enclosing is None:
+            # A top-level declaration runs once, so the declaration itself is the function.
+            function = stmt
+        else:
+            # Each run of a nested declaration (a call of the function around it, a loop iteration, an
+            # import) makes a function of its own. The closure lives on the function, so one made on
+            # another thread, or in a later iteration, can't swap it out from under this one.
+            self._prepare_function(stmt)
+            function = FunctionDeclaration.__new__(FunctionDeclaration)
+            function.__dict__.update(stmt.__dict__)
+        # Capture the current environment to create a closure.
+        function.env = env
+
+        # Apply decorators
+        decorated_obj = function
+        if stmt.decorators:
+            decorated_obj = self._apply_decorators(stmt.decorators, function)
+
+        self._define(stmt.slot, stmt.name, MryaBox(decorated_obj, is_const=True))
+
+    def _prepare_function(self, declaration):
+        """Readies a declaration before it's copied into a function, so the copies share the work. See MryaVM."""
+
+    def _for_iterable(self, stmt, iterable):
+        """
+        What a for-loop steps through: lists, strings and ranges as they are, a map's keys, or the
+        items of an instance whose class defines _iter_ and/or _next_. Nothing is copied up front.
+        """
+        iterable_type = type(iterable)
+        if iterable_type is list or iterable_type is str or iterable_type is range:
+            return iterable
+        if iterable_type is MryaGenerator:
+            return iterable.steps
+        if iterable_type is dict:
+            return self._map_keys(stmt, iterable)
+        if isinstance(iterable, MryaInstance):
+            iter_method = iterable._klass.operators.get("_iter_")
+            if iter_method:
+                # _iter_ returns the iterator: the instance itself, another instance, or anything a loop accepts.
+                iterator = self.call_function_or_method(iter_method, [], iterable)
+                if iterator is not iterable:
+                    return self._for_iterable(stmt, iterator)
+            next_method = iterable._klass.operators.get("_next_")
+            if next_method:
+                return self._instance_items(iterable, next_method)
+            raise ClassFunctionError(stmt.variable, f"Class '{iterable._klass.name}' does not define an '_iter_' or '_next_' method.")
+        raise MryaRuntimeError(stmt.variable, "For loop can only iterate over lists, strings, ranges, maps, generators and iterable instances.")
+
+    @staticmethod
+    def _map_keys(stmt, mapping):
+        try:
+            yield from mapping
+        except RuntimeError:
+            # Python refuses to go on once the map has grown or shrunk.
+            raise MryaRuntimeError(stmt.variable, "Map changed size during iteration.")
+
+    def _instance_items(self, iterator, next_method):
+        """Calls _next_ until it returns nil."""
+        while True:
+            item = self.call_function_or_method(next_method, [], iterator)
+            if item is None:
+                return
+            yield item
+
+    @staticmethod
+    def _find_catch_clause(stmt, error):
+        """Returns the first catch clause that can handle the error, or None."""
+        for clause in stmt.catch_clauses:
+            if clause.error_type:  # Specific catch like `catch MryaRuntimeError`
+                if clause.error_type.lexeme == type(error).__name__:
+                    return clause
+            else: # Generic catch {}
+                return clause
+        return None
+
+    def _set_property(self, stmt, obj, value):
+        if isinstance(obj, MryaInstance):
+            obj.fields[stmt.name.lexeme] = value
+        elif isinstance(obj, MryaClass):
+            # Allow setting "static" properties on a class.
+            # We can store them in the `methods` dict, which acts as the class's attribute store.
+            obj.set_attribute(stmt.name.lexeme, value)
+        elif isinstance(obj, dict):
+            # Allow setting properties on maps using dot notation.
+            obj[stmt.name.lexeme] = value
+        else:
+            raise MryaRuntimeError(stmt.name, "Only instances, classes, and maps can have properties set.")
+
+    def _subscript_set(self, stmt, obj, index, value):
+        if isinstance(obj, list):
+            if not isinstance(index, int):
+                raise MryaRuntimeError(stmt.index.name if hasattr(stmt.index, 'name') else stmt.object.name, "List index must be an integer.")
+            try:
+                obj[index] = value
+            except IndexError:
+                raise MryaRuntimeError(stmt.index.name if hasattr(stmt.index, 'name') else stmt.object.name, f"List index {index} out of range.")
+        elif isinstance(obj, dict):
+            # In Mrya, map keys can be strings or numbers
+            if not isinstance(index, (str, int, float)):
+                 raise MryaRuntimeError(stmt.index.name if hasattr(stmt.index, 'name') else stmt.object.name, "Map keys must be strings or numbers.")
+            obj[index] = value
+        elif isinstance(obj, MryaInstance):
+            set_method = obj._klass.operators.get("_set_")
+            if not set_method:
+                raise ClassFunctionError(stmt.object.name, f"Class '{obj._klass.name}' does not define a '_set_' method and cannot be assigned to with [].")
+            self.call_function_or_method(set_method, [index, value], obj)
+        else:
+            raise MryaRuntimeError(stmt.object.name, "Can only set items on lists and maps.")
+
+    def _import_statement(self, stmt, path_str):
+        module_obj = self._builtin_import(path_str)
+
+        # Create a variable in the current environment with the module's name.
+        module_name = os.path.splitext(os.path.basename(path_str))[0]
+        # The token is for error reporting; line number isn't critical here.
+        module_name_token = Token(TokenType.IDENTIFIER, module_name, None, 0)
+        self._define(stmt.slot, module_name_token, MryaBox(module_obj, is_const=True))
+        
+    def _define(self, slot, name, box):
+        """Defines a variable in the current frame, by slot if the resolver assigned one."""
+        if slot is not None:
+            self.env.slots[slot] = box if self.env.layout.boxed[slot] else box.value
+        else:
+            self.env.define_variable(name, box)
+
     def set_current_directory(self, path):
         self.current_directory = path
 
@@ -726,108 +1315,127 @@ class MryaInterpreter:
                 filepath += ".mrya"
             full_path = os.path.abspath(os.path.join(self.current_directory, filepath))
 
-        # Check cache first to handle circular imports
-        if full_path in self.module_cache:
-            return self.module_cache[full_path]
+        with self.import_lock:
+            # Check cache first to handle circular imports
+            if full_path in self.module_cache:
+                return self.module_cache[full_path]
 
-        if not os.path.exists(full_path):
-            # Restore directory before raising error
-            self.current_directory = previous_directory
-            raise MryaRuntimeError(None, f"Import failed: '{full_path}' not found.")
+            if not os.path.exists(full_path):
+                # Restore directory before raising error
+                self.current_directory = previous_directory
+                raise MryaRuntimeError(None, f"Import failed: '{full_path}' not found.")
         
-        # Create and cache the module object BEFORE executing its code
-        module_obj = MryaModule(os.path.basename(filepath))
-        self.module_cache[full_path] = module_obj
+            # Create and cache the module object BEFORE executing its code
+            module_obj = MryaModule(os.path.basename(filepath))
+            self.module_cache[full_path] = module_obj
 
-        with open(full_path, "r", encoding="utf-8") as f:
-                  source = f.read()
+            with open(full_path, "r", encoding="utf-8") as f:
+                      source = f.read()
 
-        # Set the directory context for the new module (but not for packages)
-        if not is_package:
-            self.current_directory = os.path.dirname(full_path)
+            # Set the directory context for the new module (but not for packages)
+            if not is_package:
+                self.current_directory = os.path.dirname(full_path)
         
-        from mrya_lexer import MryaLexer
-        from mrya_parser import MryaParser
-        lexer = MryaLexer(source)
-        tokens = lexer.scan_tokens() # This might need error handling
-        parser = MryaParser(tokens)
-        statements = parser.parse()
-
-        # Create a new module-like object to return
-        module_env = Environment(enclosing=self.env)
-        # Store the environment on the module object so its functions can access it,
-        # but only after it's populated
-        module_obj.env = module_env
+            from mrya_lexer import MryaLexer
+            from mrya_parser import MryaParser
+            from mrya_optimizer import MryaOptimizer
+            lexer = MryaLexer(source)
+            tokens = lexer.scan_tokens() # This might need error handling
+            parser = MryaParser(tokens)
+            statements = MryaOptimizer(self.optimize_level).optimize(parser.parse())
+            MryaResolver().resolve(statements)
+
+            # Create a new module-like object to return
+            module_env = Environment(enclosing=self.env)
+            # Store the environment on the module object so its functions can access it,
+            # but only after it's populated
+            module_obj.env = module_env
 
-        try:
-            self._execute_block(statements, module_env)
-        except ReturnValue as return_value:
-            # --- Restore the previous directory context ---
-            self.current_directory = previous_directory
-            # If the file has a top-level return, return that value directly.
-            self.module_cache[full_path] = return_value.value
-            return return_value.value
-        finally:
-            # --- Restore the previous directory context ---
-            self.current_directory = previous_directory
+            try:
+                signal = self._execute_block(statements, module_env)
+            finally:
+                # --- Restore the previous directory context ---
+                self.current_directory = previous_directory
+
+            if signal is not None and type(signal) is ReturnSignal:
+                # If the file has a top-level return, return that value directly.
+                self.module_cache[full_path] = signal.value
+                return signal.value
 
-        # If no top-level return, populate the module object with all defined variables/functions.
-        module_obj.methods = module_env.values.copy()  # Store boxes for variables
-        module_obj.methods.update(module_env.functions)  # Add functions directly
-        return module_obj
+            # If no top-level return, populate the module object with all defined variables/functions.
+            module_obj.methods = module_env.values.copy()  # Store boxes for variables
+            module_obj.methods.update(module_env.functions)  # Add functions directly
+            return module_obj
 
     def _call_function(self, call):
         callee = self._evaluate(call.callee)
 
-        # Check for class instantiation
-        if isinstance(callee, MryaClass):
-            # Class initializers also support argument unpacking
-            args = []
-            for arg_expr in call.arguments:
-                if isinstance(arg_expr, Splat):
-                    value_to_unpack = self._evaluate(arg_expr.expression)
-                    if not isinstance(value_to_unpack, list):
-                        raise MryaRuntimeError(None, "The '...' operator can only be used to unpack lists in function calls.")
-                    args.extend(value_to_unpack)
-                else:
-                    args.append(self._evaluate(arg_expr))
-            return callee(self, args)
-        
         if isinstance(callee, MryaModule):
-            # This provides a helpful error when a user forgets to `return` a class from an imported file.
-            callee_token = call.callee.name if isinstance(call.callee, Variable) else call.callee
-            raise MryaRuntimeError(callee_token, f"Cannot call a module. If you intended to import a class, make sure the imported file ends with a 'return' statement.")
-        
-        # Centralize argument evaluation and unpacking
+            self._raise_module_call(call)
+        return self._call_value(call, callee, self._call_arguments(call))
+
+    def _call_arguments(self, call):
+        """Evaluates a call's arguments, unpacking any `...list`."""
         arguments = []
         for arg_expr in call.arguments:
             if isinstance(arg_expr, Splat):
-                value_to_unpack = self._evaluate(arg_expr.expression)
-                if not isinstance(value_to_unpack, list):
-                    raise MryaRuntimeError(None, "The '...' operator can only be used to unpack lists in function calls.")
-                arguments.extend(value_to_unpack)
+                arguments.extend(self._splat_values(self._evaluate(arg_expr.expression)))
             else:
                 arguments.append(self._evaluate(arg_expr))
+        return arguments
+
+    def _tail_call(self, call, callee, arguments):
+        """
+        Runs `return f(...)` (see MryaResolver._mark_tail_calls). A Mrya function isn't called here: its
+        frame is returned as a TailCall, and the _run_function_body that ran the current function
+        runs it next, so tail recursion doesn't grow the Python stack. Anything else is called as usual.
+        """
+        callee_type = type(callee)
+        if callee_type is FunctionDeclaration:
+            tail_call = TailCall(callee, self._call_environment(callee, arguments))
+        elif callee_type is MryaBoundMethod:
+            tail_call = TailCall(callee.method, self._call_environment(callee.method, arguments, callee.instance))
+        elif callee_type is MryaModuleMethod:
+            tail_call = TailCall(callee.func_decl, callee.call_environment(self, arguments))
+        else:
+            if callee_type is MryaModule:
+                self._raise_module_call(call)
+            return ReturnSignal(self._call_value(call, callee, arguments))
+        if tail_call.declaration.is_generator or tail_call.declaration.is_async:
+            # Calling a generator or async function doesn't run its body yet.
+            return ReturnSignal(self._suspended_call(tail_call.declaration, tail_call.env))
+        return tail_call
+
+    @staticmethod
+    def _splat_values(value_to_unpack):
+        if not isinstance(value_to_unpack, list):
+            raise MryaRuntimeError(None, "The '...' operator can only be used to unpack lists in function calls.")
+        return value_to_unpack
+
+    @staticmethod
+    def _raise_module_call(call):
+        # This provides a helpful error when a user forgets to `return` a class from an imported file.
+        callee_token = call.callee.name if isinstance(call.callee, Variable) else call.callee
+        raise MryaRuntimeError(callee_token, f"Cannot call a module. If you intended to import a class, make sure the imported file ends with a 'return' statement.")
+
+    def _call_value(self, call, callee, arguments):
+        """Calls an evaluated callee with evaluated arguments. `call` is the FunctionCall node, for errors."""
+        # Check for class instantiation
+        if isinstance(callee, MryaClass):
+            return callee(self, arguments)
+        
+        if isinstance(callee, MryaModule):
+            self._raise_module_call(call)
 
         if isinstance(callee, (MryaBoundMethod, MryaModuleMethod, FunctionDeclaration)):
             return self.call_function_or_method(callee, arguments)
 
         elif callable(callee): # For built-ins
             try:
-                # Check if the callable is a method of one of the native modules.
-                # This is a bit of a heuristic, but it works for our case.
-                # We only pass the interpreter instance to native module functions.
-                # We also exclude the interpreter's own _builtin_ methods.
-                is_native_module_func = any(callee in mod.methods.values() for mod in self.native_modules.values())
-                if is_native_module_func:
-                    # Inspect the function to see if it wants the interpreter instance.
-                    sig = inspect.signature(callee)
-                    if 'interpreter' in sig.parameters:
-                        return callee(self, *arguments)
-                    # Otherwise, call it without the interpreter instance.
-                    return callee(*arguments)
-                else:
-                    return callee(*arguments)
+                if type(callee) is NativeFunction:
+                    # Registered natives know their own calling convention.
+                    return callee.invoke(self, arguments)
+                return callee(*arguments)
             except (MryaRuntimeError, MryaTypeError, MryaRaisedError) as e:
                 # Let Mrya's own errors pass through without being wrapped.
                 # This MUST be the first handler to prevent our errors from being re-wrapped.
@@ -857,81 +1465,105 @@ class MryaInterpreter:
             # A module method has its own calling logic to use the module's environment.
             return callee(self, arguments)
 
-        declaration = callee
+        call_env = self._call_environment(callee, arguments, instance)
+        return self._run_function_body(callee, call_env)
+
+    def _call_environment(self, declaration, arguments, instance=None):
+        """Builds the frame a call to `declaration` runs in: its closure, 'this'/'inherit' and the arguments."""
         # When calling a function, its new environment should enclose the one
         # it was defined in (its closure), not the one it is being called from.
         closure_env = declaration.env if declaration.env is not None else self.env
-        call_env = Environment(enclosing=closure_env)
+        layout = declaration.layout
+        call_env = Environment(closure_env, layout)
 
         if instance: # If it's a method call, bind 'this'
-            current_class = instance._klass
-            if declaration not in current_class.methods.values(): # Search up the chain
-                while current_class.superclass and declaration not in current_class.methods.values():
-                    current_class = current_class.superclass
-            call_env.define_variable("inherit", MryaBox(current_class.superclass, is_const=True))
-            call_env.define_variable("this", MryaBox(instance, is_const=True))
-        
+            current_class = instance._klass.defining_class(declaration)
+            if layout is not None and layout.this_slot is not None:
+                # Nothing can assign to 'this' or 'inherit', so their slots hold the values themselves.
+                call_env.slots[layout.inherit_slot] = current_class.superclass
+                call_env.slots[layout.this_slot] = instance
+            else:
+                call_env.define_variable("inherit", MryaBox(current_class.superclass, is_const=True))
+                call_env.define_variable("this", MryaBox(instance, is_const=True))
+
+        if layout is not None and not declaration.is_variadic and len(arguments) == len(declaration.params):
+            # The common case of _bind_arguments, inlined since every call goes through here
+            slots = call_env.slots
+            boxed = layout.boxed
+            for slot, arg_value in zip(layout.param_slots, arguments):
+                slots[slot] = MryaBox(arg_value) if boxed[slot] else arg_value
+        else:
+            self._bind_arguments(declaration, call_env, arguments)
+        return call_env
+
+    def _suspended_call(self, declaration, call_env):
+        """What calling a generator or async function returns: its body, to run later."""
+        if declaration.is_async:
+            return MryaCoroutine(self, declaration, call_env)
+        return MryaGenerator(self, declaration, call_env)
+
+    def _run_function_body(self, declaration, call_env):
+        """Runs a function's body in its prepared frame and returns the function's result."""
+        if declaration.is_generator or declaration.is_async:
+            return self._suspended_call(declaration, call_env)
+        signal = self._execute_block(declaration.body, call_env)
+        while type(signal) is TailCall:
+            signal = self._execute_block(signal.declaration.body, signal.env)
+        if signal is not None and type(signal) is ReturnSignal:
+            return signal.value
+        # Falling off the end (or a stray break/continue) returns nil.
+        return None
+    
+    def _bind_arguments(self, declaration, call_env, arguments):
+        """Binds call arguments to a function's parameters in its new frame."""
+        param_slots = declaration.layout.param_slots if declaration.layout is not None else None
         if declaration.is_variadic:
             num_fixed_params = len(declaration.params) - 1
             if len(arguments) < num_fixed_params:
                 raise MryaRuntimeError(declaration.name, f"Function '{declaration.name.lexeme}' expects at least {num_fixed_params} arguments, but got {len(arguments)}.")
-
-            # Bind fixed parameters
-            for i in range(num_fixed_params):
-                call_env.define_variable(declaration.params[i], MryaBox(arguments[i]))
-
-            # Bind variadic parameter to a list of remaining arguments
-            variadic_args = arguments[num_fixed_params:]
-            variadic_param_name = declaration.params[-1]
-            call_env.define_variable(variadic_param_name, MryaBox(variadic_args))
+            # Bind the variadic parameter to a list of the remaining arguments
+            values = list(arguments[:num_fixed_params])
+            values.append(arguments[num_fixed_params:])
         else:
             if len(arguments) != len(declaration.params):
                 raise MryaRuntimeError(declaration.name, f"Function '{declaration.name.lexeme}' expects {len(declaration.params)} arguments, but got {len(arguments)}.")
+            values = arguments
 
-            for param_token, arg_value in zip(declaration.params, arguments):
+        if param_slots is not None:
+            slots = call_env.slots
+            boxed = declaration.layout.boxed
+            for slot, arg_value in zip(param_slots, values):
+                slots[slot] = MryaBox(arg_value) if boxed[slot] else arg_value
+        else:
+            for param_token, arg_value in zip(declaration.params, values):
                 call_env.define_variable(param_token.lexeme, MryaBox(arg_value))
-            
-        try:
-            self._execute_block(declaration.body, call_env)
-        except ReturnValue as return_value:
-            return return_value.value
-        return None
-    
+
     def _execute_block(self, statements, environment):
+        """Runs statements in `environment`. Returns the first completion signal, like _execute."""
         previous_env = self.env
         try:
             self.env = environment
-            for statement in statements:
-                self._execute(statement)
+            return self._execute_statements(statements)
         finally:
             self.env = previous_env
 
-    @staticmethod
-    def _check_type(expected_type, value, token):
-        type_map = {
-            "int": int,
-            "float": float,
-            "string": str,
-            "bool": bool,
-            "list": list,
-            "map": dict
-        }
-        mrya_type = next((t for t, py_t in type_map.items() if isinstance(value, py_t)), None)
-
-        if expected_type not in type_map or mrya_type != expected_type:
-            actual_type = mrya_type or type(value).__name__
-            raise MryaTypeError(token, f"Type mismatch for '{token.lexeme}'. Expected '{expected_type}', but got value of type '{actual_type}'.")
+    def _execute_statements(self, statements):
+        """Runs statements in the current environment, stopping at the first completion signal."""
+        for statement in statements:
+            signal = self._execute(statement)
+            if signal is not None:
+                return signal
+        return None
 
     def _builtin_length(self, collection):
-        if isinstance(collection, (str, list, dict)):
+        if isinstance(collection, (str, list, dict, range, StringBuilder, RequestBody)):
             return len(collection)
         elif isinstance(collection, MryaInstance):
-            len_method = collection._klass.find_method("_len_")
+            len_method = collection._klass.operators.get("_len_")
             if not len_method:
                 # This needs a token, but built-ins don't have one. This is a known limitation.
                 raise ClassFunctionError(None, f"Class '{collection._klass.name}' does not define a '_len_' method.")
-            bound_method = MryaBoundMethod(collection, len_method)
-            return bound_method(self, [])
+            return self.call_function_or_method(len_method, [], collection)
         else:
             # We need a token for error reporting. This is a limitation of built-ins.
             raise RuntimeError(f"Cannot get length of type '{type(collection).__name__}'.")
@@ -960,7 +1592,22 @@ class MryaInterpreter:
                 raise RuntimeError(f"Cannot convert '{value}' to bool.")
         return bool(value)
     
+    def _builtin_flush(self):
+        self.output.flush()
+
+    def _builtin_range(self, start, stop=None, step=1):
+        """range(stop), range(start, stop) or range(start, stop, step): the integers from start up to, but not including, stop."""
+        if stop is None:
+            start, stop = 0, start
+        for bound in (start, stop, step):
+            if type(bound) is not int:
+                raise RuntimeError(f"range() expects integers, but got '{mrya_type_name(bound)}'.")
+        if step == 0:
+            raise RuntimeError("range() step cannot be 0.")
+        return range(start, stop, step)
+
     def _builtin_request(self, prompt, validation_type=None, default=None):
+        self.output.flush() # So the prompt comes after everything output before it
         while True:
             user_input = input(str(prompt) + " ")
 
@@ -996,15 +1643,36 @@ class MryaInterpreter:
             return expr.value
         
         elif isinstance(expr, Variable):
-            name = expr.name.lexeme
-            if name in self.env.values:
-                box = self.env.values[name]
-                return box.value if unbox else box
-            if self.env.enclosing:
-                return self.env.get_variable(expr.name) # Fallback for built-ins
-            return self.env.get_variable(expr.name)
+            depth = expr.depth
+            if depth is None:
+                # Unresolved, so search the scope chain by name.
+                name = expr.name.lexeme
+                if name in self.env.values:
+                    box = self.env.values[name]
+                    return box.value if unbox else box
+                return self.env.get_variable(expr.name)
+            env = self.env
+            while depth:
+                env = env.enclosing
+                depth -= 1
+            if expr.slot is not None:
+                box = env.slots[expr.slot]
+                if box is UNBOUND:
+                    # Declared in this frame but not bound yet: search outwards by name.
+                    return env.get_variable(expr.name)
+                if not expr.boxed:
+                    return box
+            else:
+                box = env.values.get(expr.name.lexeme)
+                if box is None:
+                    # Not a global variable (e.g. a builtin): search by name.
+                    return env.get_variable(expr.name)
+            # Only a variable of the current frame is passed by reference to `let`.
+            return box.value if unbox or expr.depth else box
         
         elif isinstance(expr, ListLiteral):
+            if expr.constant is not None:
+                return expr.constant.copy()
             return [self._evaluate(element) for element in expr.elements]
 
         elif isinstance(expr, HString):
@@ -1014,133 +1682,29 @@ class MryaInterpreter:
             return "".join(result_parts)
         
         elif isinstance(expr, Get):
-            obj = self._evaluate(expr.object)
-            if isinstance(obj, MryaModule):
-                return obj.get(expr.name)
-            if isinstance(obj, MryaInstance):
-                return obj.get(expr.name)
-            # Allow property access on strings via the string module
-            if isinstance(obj, str):
-                string_mod = self.native_modules["string"]
-                method = string_mod.get(expr.name)
-                # Check if it's a raw Python function from the module
-                if callable(method) and not isinstance(method, (MryaClass, FunctionDeclaration)):
-                    # Return a new function that has the string instance pre-filled as the first argument.
-                    # Unlike other native functions, these simple lambdas don't need the interpreter instance. We pass the object and the rest of the arguments.
-                    return lambda *args: method(obj, *args) # The `obj` is the string itself.
-                return method
-            
-            # Allow property access on maps (dictionaries)
-            if isinstance(obj, dict):
-                return obj.get(expr.name.lexeme) # Use .get() to return nil for missing keys
-
-            raise MryaRuntimeError(expr.name, f"Only modules, instances, strings, and maps can have properties. Got {type(obj).__name__}.")
+            return self._get_property(expr, self._evaluate(expr.object))
 
         elif isinstance(expr, Inherit):
-            superclass = self.env.get_variable(expr.keyword)
-            instance = self.env.get_variable(Token(TokenType.THIS, "this", None, expr.keyword.line))
-
-            method = superclass.find_method(expr.method.lexeme)
-            if method is None:
-                raise MryaRuntimeError(expr.method, f"Undefined method '{expr.method.lexeme}' in superclass.")
-            
-            return MryaBoundMethod(instance, method)
+            return self._inherit_method(expr)
 
         elif isinstance(expr, This):
-            return self.env.get_variable(expr.keyword)
+            return self._this_value(expr)
 
         elif isinstance(expr, SubscriptGet):
             obj = self._evaluate(expr.object)
             index = self._evaluate(expr.index)
-
-            if isinstance(obj, (list, str)):
-                if not isinstance(index, int):
-                    raise MryaRuntimeError(expr.token, "List or string index must be an integer.")
-                try:
-                    return obj[index]
-                except IndexError:
-                    raise MryaRuntimeError(expr.token, f"Index {index} out of range.")
-            elif isinstance(obj, dict):
-                if not isinstance(index, (str, int, float)):
-                    raise MryaRuntimeError(expr.token, "Map key must be a string or number.")
-                return obj.get(index) # Use .get() to return None for missing keys
-            elif isinstance(obj, MryaInstance):
-                get_method = obj._klass.find_method("_get_")
-                if not get_method:
-                    raise ClassFunctionError(expr.token, f"Class '{obj._klass.name}' does not define a '_get_' method and is not subscriptable.")
-                bound_method = MryaBoundMethod(obj, get_method)
-                return bound_method(self, [index])
-
-            raise MryaRuntimeError(expr.token, "Can only use [] on lists, strings, and maps.")
+            return self._subscript_get(expr, obj, index)
         
         elif isinstance(expr, Unary):
-            right = self._evaluate(expr.right)
-            op = expr.operator.type
+            return self._unary_operation(expr.operator, self._evaluate(expr.right))
 
-            if op == TokenType.MINUS:
-                if not isinstance(right, (int, float)):
-                    raise MryaRuntimeError(expr.operator, "Operand must be a number for negation.")
-                return -right
-            if op == TokenType.BANG:
-                return not bool(right)
-            return None # Unreachable
+        elif isinstance(expr, Await):
+            return self._await_expression(expr)
 
         elif isinstance(expr, BinaryExpression):
             left = self._evaluate(expr.left)
             right = self._evaluate(expr.right)
-            op = expr.operator.type
-            
-            # Check for operator overloading on classes
-            if isinstance(left, MryaInstance):
-                method_map = {
-                    TokenType.PLUS: "_plus_",
-                    TokenType.MINUS: "_minus_",
-                    TokenType.STAR: "_times_",
-                    TokenType.SLASH: "_divide_",
-                    TokenType.EQUAL_EQUAL: "_equals_",
-                    TokenType.BANG_EQUAL: "_equals_", # Uses _equals_ and negates the result
-                }
-                if op in method_map:
-                    method_name = method_map[op]
-                    method = left._klass.find_method(method_name)
-                    if method:
-                        bound_method = MryaBoundMethod(left, method)
-                        result = bound_method(self, [right])
-                        if op == TokenType.BANG_EQUAL:
-                            return not result
-                        return result
-
-            # Default behavior for built-in types
-            try:
-                if op == TokenType.PLUS:
-                    # If one operand is a string, treat it as concatenation
-                    if isinstance(left, str) or isinstance(right, str):
-                        return str(left) + str(right)
-                    return left + right
-                elif op == TokenType.MINUS:
-                    return left - right
-                elif op == TokenType.STAR:
-                    return left * right
-                elif op == TokenType.SLASH:
-                    if right == 0:
-                        raise MryaRuntimeError(expr.operator, "Division by zero.")
-                    return left / right
-                elif op == TokenType.GREATER:
-                    return left > right
-                elif op == TokenType.LESS:
-                    return left < right
-                elif op == TokenType.GREATER_EQUAL:
-                    return left >= right
-                elif op == TokenType.LESS_EQUAL:
-                    return left <= right
-                elif op == TokenType.EQUAL_EQUAL:
-                    return left == right
-                elif op == TokenType.BANG_EQUAL:
-                    return left != right
-                else:
-                    raise MryaRuntimeError(expr.operator, f"Unsupported operator: {expr.operator.lexeme}")
-            except TypeError:
-                raise MryaRuntimeError(expr.operator, f"Invalid operands for {expr.operator.lexeme}: {left}, {right}")
+            return self._binary_operation(expr.operator, left, right)
         
         elif isinstance(expr, FunctionCall):
             return self._call_function(expr)
@@ -1164,6 +1728,8 @@ class MryaInterpreter:
             raise MryaRuntimeError(None, "The '...' operator can only be used inside a function call.")
         
         elif isinstance(expr, MapLiteral):
+            if expr.constant is not None:
+                return expr.constant.copy()
             map_obj = {}
             for key_expr, value_expr in expr.pairs:
                 key = self._evaluate(key_expr)
@@ -1174,17 +1740,165 @@ class MryaInterpreter:
         else:
             raise RuntimeError(f"Unsupported expression type; {type(expr).__name__}")
 
-class ReturnValue(Exception):
+    # --- Expression semantics shared by every execution engine ---
+    def _get_property(self, expr, obj):
+        if isinstance(obj, MryaModule):
+            return obj.get(expr.name)
+        if isinstance(obj, MryaInstance):
+            return obj.get(expr.name)
+        # Allow property access on strings via the string module
+        if isinstance(obj, str):
+            string_mod = self.native_modules["string"]
+            method = string_mod.get(expr.name)
+            if isinstance(method, NativeFunction):
+                # Return a function that has the string instance pre-filled as the first argument.
+                return method.bind(obj)
+            return method
+        
+        # Allow property access on maps (dictionaries)
+        if isinstance(obj, dict):
+            return obj.get(expr.name.lexeme) # Use .get() to return nil for missing keys
+
+        # Native objects (builders, pools) list their methods, which take the object as their first argument.
+        methods = getattr(type(obj), "native_methods", None)
+        if methods is not None:
+            method = methods.get(expr.name.lexeme)
+            if method is None:
+                raise MryaRuntimeError(expr.name, f"'{obj}' has no method '{expr.name.lexeme}'. It has: {', '.join(methods)}.")
+            return method.bind(obj)
+
+        raise MryaRuntimeError(expr.name, f"Only modules, instances, strings, maps, builders and pools can have properties. Got {type(obj).__name__}.")
+
+    def _inherit_method(self, expr):
+        if expr.depth is not None and expr.slot is not None:
+            env = self.env
+            for _ in range(expr.depth):
+                env = env.enclosing
+            superclass = env.slots[expr.slot]
+            instance = env.slots[expr.this_slot]
+        else:
+            superclass = self.env.get_variable(expr.keyword)
+            instance = self.env.get_variable(Token(TokenType.THIS, "this", None, expr.keyword.line))
+
+        method = superclass.find_method(expr.method.lexeme)
+        if method is None:
+            raise MryaRuntimeError(expr.method, f"Undefined method '{expr.method.lexeme}' in superclass.")
+        
+        return MryaBoundMethod(instance, method)
+
+    def _this_value(self, expr):
+        if expr.depth is not None and expr.slot is not None:
+            env = self.env
+            for _ in range(expr.depth):
+                env = env.enclosing
+            instance = env.slots[expr.slot]
+            if instance is not UNBOUND:
+                return instance
+        return self.env.get_variable(expr.keyword)
+
+    def _subscript_get(self, expr, obj, index):
+        if isinstance(obj, (list, str)):
+            if not isinstance(index, int):
+                raise MryaRuntimeError(expr.token, "List or string index must be an integer.")
+            try:
+                return obj[index]
+            except IndexError:
+                raise MryaRuntimeError(expr.token, f"Index {index} out of range.")
+        elif isinstance(obj, dict):
+            if not isinstance(index, (str, int, float)):
+                raise MryaRuntimeError(expr.token, "Map key must be a string or number.")
+            return obj.get(index) # Use .get() to return None for missing keys
+        elif isinstance(obj, MryaInstance):
+            get_method = obj._klass.operators.get("_get_")
+            if not get_method:
+                raise ClassFunctionError(expr.token, f"Class '{obj._klass.name}' does not define a '_get_' method and is not subscriptable.")
+            return self.call_function_or_method(get_method, [index], obj)
+
+        raise MryaRuntimeError(expr.token, "Can only use [] on lists, strings, and maps.")
+
+    @staticmethod
+    def _unary_operation(operator, right):
+        op = operator.type
+        if op == TokenType.MINUS:
+            if not isinstance(right, (int, float)):
+                raise MryaRuntimeError(operator, "Operand must be a number for negation.")
+            return -right
+        if op == TokenType.BANG:
+            return not bool(right)
+        return None # Unreachable
+
+    def _binary_operation(self, operator, left, right):
+        op = operator.type
+        
+        # Check for operator overloading on classes
+        if isinstance(left, MryaInstance):
+            method = left._klass.binary_operators.get(op)
+            if method:
+                result = self.call_function_or_method(method, [right], left)
+                if op == TokenType.BANG_EQUAL:
+                    return not result # Uses _equals_ and negates the result
+                return result
+
+        # Default behavior for built-in types
+        return MryaInterpreter._builtin_binary_operation(operator, left, right)
+
+    @staticmethod
+    def _builtin_binary_operation(operator, left, right):
+        """A binary operator on values that aren't instances, so no overloading applies (and no interpreter is needed)."""
+        op = operator.type
+        try:
+            if op == TokenType.PLUS:
+                # If one operand is a string, treat it as concatenation
+                if isinstance(left, str) or isinstance(right, str):
+                    return str(left) + str(right)
+                return left + right
+            elif op == TokenType.MINUS:
+                return left - right
+            elif op == TokenType.STAR:
+                return left * right
+            elif op == TokenType.SLASH:
+                if right == 0:
+                    raise MryaRuntimeError(operator, "Division by zero.")
+                return left / right
+            elif op == TokenType.GREATER:
+                return left > right
+            elif op == TokenType.LESS:
+                return left < right
+            elif op == TokenType.GREATER_EQUAL:
+                return left >= right
+            elif op == TokenType.LESS_EQUAL:
+                return left <= right
+            elif op == TokenType.EQUAL_EQUAL:
+                return left == right
+            elif op == TokenType.BANG_EQUAL:
+                return left != right
+            else:
+                raise MryaRuntimeError(operator, f"Unsupported operator: {operator.lexeme}")
+        except TypeError:
+            raise MryaRuntimeError(operator, f"Invalid operands for {operator.lexeme}: {left}, {right}")
+
+# Completion signals. Statements return these instead of raising, so returning from a
+# function or leaving a loop doesn't build and unwind a Python exception.
+BREAK = object()
+CONTINUE = object()
+
+class ReturnSignal:
+    """Returned (not raised) by a `return` statement, carrying its value."""
+    __slots__ = ("value",)
     def __init__(self, value):
         self.value = value
 
-class BreakInterrupt(Exception):
-    """Used to signal a 'break' statement."""
-    pass
+class TailCall:
+    """Returned by a `return f(...)` in tail position: the function to run next, and its prepared frame."""
+    __slots__ = ("declaration", "env")
+    def __init__(self, declaration, env):
+        self.declaration = declaration
+        self.env = env
 
-class ContinueInterrupt(Exception):
-    """Used to signal a 'continue' statement."""
-    pass
+class ReturnValue(Exception):
+    """Raised by `interpret` when a program's top level executes `return`."""
+    def __init__(self, value):
+        self.value = value
                     
             
         
@@ -5,6 +5,9 @@ KEYWORDS = {
     "let": TokenType.LET,
     "function": TokenType.FUNCTION,
     "return": TokenType.RETURN,
+    "yield": TokenType.YIELD,
+    "async": TokenType.ASYNC,
+    "await": TokenType.AWAIT,
     "if": TokenType.IF,
     "else": TokenType.ELSE,
     "true": TokenType.TRUE,
@@ -159,6 +162,8 @@ class MryaLexer:
                     value_builder.append('\n')
                 elif self._match('t'):
                     value_builder.append('\t')
+                elif self._match('r'):
+                    value_builder.append('\r')
                 elif self._match('"'):
                     value_builder.append('"')
                 elif self._match('\\'):
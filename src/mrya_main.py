@@ -3,7 +3,12 @@ sys.path.insert(0, os.path.dirname(__file__))
 
 from mrya_lexer import MryaLexer
 from mrya_parser import MryaParser, ParseError
+from mrya_resolver import MryaResolver
+from mrya_optimizer import MryaOptimizer, DEFAULT_LEVEL
 from mrya_interpreter import MryaInterpreter
+from mrya_closure_engine import MryaClosureInterpreter
+from mrya_vm import MryaVM
+from mrya_output import StdoutSink, FLUSH_POLICIES
 from mrya_errors import MryaRuntimeError, MryaTypeError, LexerError
 
 import argparse
@@ -15,6 +20,13 @@ except ImportError:
     # This is expected on Windows. For a better experience, users can `pip install pyreadline3`.
     pass
 
+# Execution engines selectable with --engine. They all run the same resolved AST.
+ENGINES = {
+    "tree": MryaInterpreter,            # Walks the AST node by node
+    "closure": MryaClosureInterpreter,  # Compiles each node to a Python closure once, then runs those
+    "vm": MryaVM,                       # Compiles to bytecode for a stack machine with its own call frames
+}
+
 def _print_error_context(source_code, error):
     """Prints a helpful, context-rich error message."""
     token = None
@@ -47,12 +59,15 @@ def _print_error_context(source_code, error):
     print(f"  {line_num} | {error_line}", file=sys.stderr)
     print(f"    | {' ' * start_col}{'^' * len(token.lexeme)}", file=sys.stderr)
 
-def run_file(filename, show_tokens=False, show_ast=False):
+def run_file(filename, show_tokens=False, show_ast=False, engine="tree", optimize=DEFAULT_LEVEL, flush=None):
     """
     Run a Mrya source file.
     - filename: path to the .mrya file.
     - show_tokens: if True, print out the tokens from the lexer.
     - show_ast: if True, print out a representation of the parsed statements (AST).
+    - engine: which entry of ENGINES runs the program.
+    - optimize: the mrya_optimizer level (0, 1 or 2) for the program and the modules it imports.
+    - flush: when output is written to stdout, one of mrya_output.FLUSH_POLICIES (None picks one for the terminal).
     """
     try:
         with open(filename, 'r') as file:
@@ -82,6 +97,10 @@ def run_file(filename, show_tokens=False, show_ast=False):
         _print_error_context(source, e)
         sys.exit(1)
 
+    # Fold constants and prune dead branches, then resolve variable scopes ahead of time
+    statements = MryaOptimizer(optimize).optimize(statements)
+    MryaResolver().resolve(statements)
+
     if show_ast:
         # Assuming your parser.parse() returns some AST representation with a __str__ or similar.
         # Adjust according to your AST node classes.
@@ -92,7 +111,9 @@ def run_file(filename, show_tokens=False, show_ast=False):
         print("================================")
 
     # Interpretation
-    interpreter = MryaInterpreter()
+    interpreter = ENGINES[engine]()
+    interpreter.optimize_level = optimize
+    interpreter.output = StdoutSink(policy=flush)
     try:
         interpreter.set_current_directory(os.path.dirname(os.path.abspath(filename)))
         interpreter.interpret(statements)
@@ -100,11 +121,12 @@ def run_file(filename, show_tokens=False, show_ast=False):
         _print_error_context(source, err)
         sys.exit(1)
 
-def run_repl(show_tokens=False, show_ast=False):
+def run_repl(show_tokens=False, show_ast=False, engine="tree", optimize=DEFAULT_LEVEL):
     """
     A simple REPL loop for Mrya. Reads from stdin until EOF or interruption.
     """
-    interpreter = MryaInterpreter()
+    interpreter = ENGINES[engine]()
+    interpreter.optimize_level = optimize
     print("Mrya REPL. Type your code; use Ctrl+D (Unix) / Ctrl+Z (Windows) to exit.")
     code_buffer = ""
     try:
@@ -137,7 +159,8 @@ def run_repl(show_tokens=False, show_ast=False):
                     print("==============")
 
                 parser = MryaParser(tokens)
-                statements = parser.parse()
+                statements = MryaOptimizer(optimize).optimize(parser.parse())
+                MryaResolver().resolve(statements)
                 if show_ast:
                     print("=== AST ===")
                     for stmt in statements:
@@ -179,13 +202,33 @@ def main():
         dest="show_ast",
         help="Print AST (parsed statements) before interpretation."
     )
+    parser.add_argument(
+        "--engine",
+        choices=sorted(ENGINES),
+        default="tree",
+        help="Execution engine to run the program with (default: tree)."
+    )
+    parser.add_argument(
+        "-O",
+        type=int,
+        choices=[0, 1, 2],
+        default=DEFAULT_LEVEL,
+        dest="optimize",
+        help=f"Optimization level: -O0 runs the code as written, -O1 folds constants and prunes dead branches, -O2 also pre-builds constant lists and maps (default: {DEFAULT_LEVEL})."
+    )
+    parser.add_argument(
+        "--flush",
+        choices=FLUSH_POLICIES,
+        default=None,
+        help="When output is written: after every line, in large blocks, or only when the program calls flush() (default: line for a terminal, block otherwise)."
+    )
     # You can add more options as needed, e.g., verbose, debug flags, etc.
     args = parser.parse_args()
 
     if args.source:
-        run_file(args.source, show_tokens=args.show_tokens, show_ast=args.show_ast)
+        run_file(args.source, show_tokens=args.show_tokens, show_ast=args.show_ast, engine=args.engine, optimize=args.optimize, flush=args.flush)
     else:
-        run_repl(show_tokens=args.show_tokens, show_ast=args.show_ast)
+        run_repl(show_tokens=args.show_tokens, show_ast=args.show_ast, engine=args.engine, optimize=args.optimize)
 
 if __name__ == "__main__":
     main()
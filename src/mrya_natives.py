@@ -0,0 +1,119 @@
+import functools
+import inspect
+
+class NativeFunction:
+    """
+    A Python function exposed to Mrya, with its calling convention worked out once when it's registered:
+    - needs_interpreter: pass the interpreter as the first argument (detected from a parameter named 'interpreter').
+    - min_args / max_args: how many Mrya arguments it accepts (max_args is None for variadic functions).
+    - coercions: per-position converters applied to the arguments before the call (None leaves one as is).
+    - async_function: what `await` calls instead, for a native that can wait without blocking the event
+      loop (see awaiting). It takes the same arguments and returns a Python awaitable.
+    """
+    __slots__ = ("name", "function", "needs_interpreter", "min_args", "max_args", "coercions", "async_function")
+
+    def __init__(self, function, name=None, needs_interpreter=None, arity=None, coercions=(), async_function=None):
+        self.function = function
+        self.async_function = async_function
+        self.name = name or getattr(function, "__name__", "native")
+        self.coercions = tuple(coercions)
+
+        parameters = _positional_parameters(function)
+        if needs_interpreter is None:
+            needs_interpreter = bool(parameters) and parameters[0].name == "interpreter"
+        self.needs_interpreter = needs_interpreter
+        if parameters is not None and needs_interpreter:
+            parameters = parameters[1:]
+
+        if arity is not None:
+            self.min_args, self.max_args = arity if isinstance(arity, tuple) else (arity, arity)
+        elif parameters is None:
+            self.min_args, self.max_args = 0, None # Not introspectable, so let the call itself complain
+        else:
+            self.min_args = sum(1 for p in parameters if p.default is p.empty and p.kind != p.VAR_POSITIONAL)
+            variadic = any(p.kind == p.VAR_POSITIONAL for p in parameters)
+            self.max_args = None if variadic else len(parameters)
+
+    def invoke(self, interpreter, arguments):
+        """Calls the function with Mrya arguments. Raises TypeError on an arity mismatch, like a Python call would."""
+        count = len(arguments)
+        if count < self.min_args or (self.max_args is not None and count > self.max_args):
+            raise TypeError(f"{self.name}() expects {self._arity_text()} arguments, but got {count}.")
+        if self.coercions:
+            arguments = [coerce(argument) if coerce is not None else argument
+                         for coerce, argument in zip(self.coercions, arguments)] + list(arguments[len(self.coercions):])
+        if self.needs_interpreter:
+            return self.function(interpreter, *arguments)
+        return self.function(*arguments)
+
+    def bind(self, value):
+        """Returns a native with `value` filled in as its first Mrya argument, e.g. for `"text".upper()`."""
+        bound = NativeFunction.__new__(NativeFunction)
+        bound.name = self.name
+        bound.needs_interpreter = self.needs_interpreter
+        if self.coercions and self.coercions[0] is not None:
+            value = self.coercions[0](value)
+        if self.needs_interpreter:
+            bound.function = lambda interpreter, *args: self.function(interpreter, value, *args)
+        else:
+            bound.function = functools.partial(self.function, value)
+        bound.async_function = None
+        if self.async_function is not None:
+            if self.needs_interpreter:
+                bound.async_function = lambda interpreter, *args: self.async_function(interpreter, value, *args)
+            else:
+                bound.async_function = functools.partial(self.async_function, value)
+        bound.coercions = self.coercions[1:]
+        bound.min_args = max(self.min_args - 1, 0)
+        bound.max_args = self.max_args - 1 if self.max_args is not None else None
+        return bound
+
+    def awaiting(self):
+        """The native `await f(...)` calls when f has an async_function: the same, but calling that instead."""
+        awaiting = NativeFunction.__new__(NativeFunction)
+        awaiting.name = self.name
+        awaiting.function = self.async_function
+        awaiting.async_function = None
+        awaiting.needs_interpreter = self.needs_interpreter
+        awaiting.coercions = self.coercions
+        awaiting.min_args = self.min_args
+        awaiting.max_args = self.max_args
+        return awaiting
+
+    def __call__(self, *args):
+        # Python code (e.g. the native modules) can call a registered function directly.
+        return self.function(*args)
+
+    def _arity_text(self):
+        if self.max_args is None:
+            return f"at least {self.min_args}"
+        if self.min_args == self.max_args:
+            return str(self.min_args)
+        return f"{self.min_args} to {self.max_args}"
+
+    def __str__(self):
+        return f"<native function {self.name}>"
+
+def _positional_parameters(function):
+    try:
+        signature = inspect.signature(function)
+    except (TypeError, ValueError):
+        return None
+    return [p for p in signature.parameters.values()
+            if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD, p.VAR_POSITIONAL)]
+
+def native(function, **options):
+    """Wraps a Python function as a NativeFunction, leaving one that's already wrapped alone."""
+    if isinstance(function, NativeFunction):
+        return function
+    return NativeFunction(function, **options)
+
+def natives(functions):
+    """Registers a name -> function mapping, returning a name -> NativeFunction mapping."""
+    return {name: native(function, name=name) for name, function in functions.items()}
+
+def awaitable(registered, async_functions):
+    """Gives natives from a natives() mapping their async_function, by name. Returns the mapping."""
+    for name, async_function in async_functions.items():
+        registered[name].async_function = async_function
+    return registered
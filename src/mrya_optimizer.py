@@ -0,0 +1,294 @@
+from mrya_ast import Literal, HString, Splat, Variable, Get, BinaryExpression, Logical, Unary, Await, LetStatement, OutputStatement, FunctionDeclaration, FunctionCall, ReturnStatement, YieldStatement, IfStatement, WhileStatement, ForStatement, TryStatement, ClassDeclaration, SetProperty, Assignment, SubscriptGet, SubscriptSet, InputCall, ImportStatement, ListLiteral, MapLiteral
+from mrya_errors import MryaRuntimeError
+from mrya_interpreter import MryaInterpreter, mrya_type_name, type_guard
+from mrya_tokens import TokenType
+
+# Optimization levels, chosen with -O0/-O1/-O2:
+# 0 runs the program exactly as parsed.
+# 1 folds constant expressions, prunes if/while branches whose condition is constant,
+#   and simplifies `and`/`or` with a constant left side.
+# 2 also pre-evaluates list and map literals made only of constants, so each evaluation
+#   copies a template instead of evaluating every element, and skips the type guard of
+#   assignments like `count += 1` whose value provably has the variable's annotated type.
+DEFAULT_LEVEL = 1
+
+# Folding `"-" * 1000000` would store the whole string in the tree, so results longer than this stay unfolded.
+MAX_FOLDED_LENGTH = 4096
+
+_COMPARISONS = (TokenType.GREATER, TokenType.GREATER_EQUAL, TokenType.LESS, TokenType.LESS_EQUAL)
+_SCALARS = (type(None), bool, int, float, str)
+_NUMBERS = ("int", "float")
+
+class MryaOptimizer:
+    """
+    Rewrites parsed statements before they are resolved. Folded expressions become Literals that
+    keep the token of the expression they replaced; anything that could fail at runtime (like
+    `1 / 0`) is left as it was, so the error is still raised, and reported, when it runs.
+    """
+    def __init__(self, level=None):
+        self.level = DEFAULT_LEVEL if level is None else level
+        # Annotations of the typed `let`s seen so far, one map per enclosing function (see _prove_guard).
+        self.annotations = [{}]
+
+    def optimize(self, statements):
+        if self.level <= 0:
+            return statements
+        return self._optimize_block(statements)
+
+    # --- Statements ---
+    def _optimize_block(self, statements):
+        # If and while statements don't open a scope, so a branch that is always taken can be
+        # spliced into the enclosing block as is.
+        optimized = []
+        for stmt in statements:
+            result = self._optimize_stmt(stmt)
+            if isinstance(result, list):
+                optimized.extend(result)
+            else:
+                optimized.append(result)
+        return optimized
+
+    def _optimize_stmt(self, stmt):
+        if isinstance(stmt, LetStatement):
+            stmt.initializer = self._optimize_expr(stmt.initializer)
+            if stmt.type_annotation:
+                name, annotation = stmt.name.lexeme, stmt.type_annotation.lexeme
+                scope = self.annotations[-1]
+                # A name declared with two different types in one function can't be relied on.
+                scope[name] = annotation if scope.get(name, annotation) == annotation else None
+
+        elif isinstance(stmt, OutputStatement):
+            stmt.expression = self._optimize_expr(stmt.expression)
+
+        elif isinstance(stmt, FunctionDeclaration):
+            stmt.decorators = [self._optimize_expr(decorator) for decorator in stmt.decorators]
+            self.annotations.append({})
+            stmt.body = self._optimize_block(stmt.body)
+            self.annotations.pop()
+
+        elif isinstance(stmt, ClassDeclaration):
+            if stmt.superclass:
+                stmt.superclass = self._optimize_expr(stmt.superclass)
+            stmt.decorators = [self._optimize_expr(decorator) for decorator in stmt.decorators]
+            for method in stmt.methods:
+                self._optimize_stmt(method)
+
+        elif isinstance(stmt, (ReturnStatement, YieldStatement)):
+            if stmt.value is not None:
+                stmt.value = self._optimize_expr(stmt.value)
+
+        elif isinstance(stmt, IfStatement):
+            stmt.condition = self._optimize_expr(stmt.condition)
+            if isinstance(stmt.condition, Literal):
+                if stmt.condition.value:
+                    return self._optimize_block(stmt.then_branch)
+                return self._optimize_block(stmt.else_branch) if stmt.else_branch else []
+            stmt.then_branch = self._optimize_block(stmt.then_branch)
+            if stmt.else_branch:
+                stmt.else_branch = self._optimize_block(stmt.else_branch)
+
+        elif isinstance(stmt, WhileStatement):
+            stmt.condition = self._optimize_expr(stmt.condition)
+            if isinstance(stmt.condition, Literal) and not stmt.condition.value:
+                return []
+            stmt.body = self._optimize_block(stmt.body)
+
+        elif isinstance(stmt, ForStatement):
+            stmt.iterable = self._optimize_expr(stmt.iterable)
+            stmt.body = self._optimize_block(stmt.body)
+
+        elif isinstance(stmt, TryStatement):
+            stmt.try_block = self._optimize_block(stmt.try_block)
+            for clause in stmt.catch_clauses:
+                clause.body = self._optimize_block(clause.body)
+            if stmt.finally_block:
+                stmt.finally_block = self._optimize_block(stmt.finally_block)
+
+        elif isinstance(stmt, Assignment):
+            stmt.value = self._optimize_expr(stmt.value)
+            if self.level >= 2:
+                self._prove_guard(stmt)
+
+        elif isinstance(stmt, SetProperty):
+            stmt.object = self._optimize_expr(stmt.object)
+            stmt.value = self._optimize_expr(stmt.value)
+
+        elif isinstance(stmt, SubscriptSet):
+            stmt.object = self._optimize_expr(stmt.object)
+            stmt.index = self._optimize_expr(stmt.index)
+            stmt.value = self._optimize_expr(stmt.value)
+
+        elif isinstance(stmt, ImportStatement):
+            stmt.path_expr = self._optimize_expr(stmt.path_expr)
+
+        else:
+            # Bare expressions used as statements
+            return self._optimize_expr(stmt)
+        return stmt
+
+    # --- Expressions ---
+    def _optimize_expr(self, expr):
+        if isinstance(expr, BinaryExpression):
+            expr.left = self._optimize_expr(expr.left)
+            expr.right = self._optimize_expr(expr.right)
+            if isinstance(expr.left, Literal) and isinstance(expr.right, Literal):
+                return self._fold_binary(expr)
+
+        elif isinstance(expr, Await):
+            expr.value = self._optimize_expr(expr.value)
+
+        elif isinstance(expr, Unary):
+            expr.right = self._optimize_expr(expr.right)
+            if isinstance(expr.right, Literal):
+                try:
+                    return Literal(MryaInterpreter._unary_operation(expr.operator, expr.right.value), expr.operator)
+                except MryaRuntimeError:
+                    return expr # e.g. `-"text"`: leave it to fail when it runs
+
+        elif isinstance(expr, Logical):
+            expr.left = self._optimize_expr(expr.left)
+            expr.right = self._optimize_expr(expr.right)
+            if isinstance(expr.left, Literal):
+                return self._simplify_logical(expr)
+
+        elif isinstance(expr, HString):
+            return self._fold_h_string(expr)
+
+        elif isinstance(expr, FunctionCall):
+            expr.callee = self._optimize_expr(expr.callee)
+            expr.arguments = [self._optimize_expr(argument) for argument in expr.arguments]
+
+        elif isinstance(expr, Get):
+            expr.object = self._optimize_expr(expr.object)
+
+        elif isinstance(expr, SubscriptGet):
+            expr.object = self._optimize_expr(expr.object)
+            expr.index = self._optimize_expr(expr.index)
+
+        elif isinstance(expr, Splat):
+            expr.expression = self._optimize_expr(expr.expression)
+
+        elif isinstance(expr, InputCall):
+            expr.prompt = self._optimize_expr(expr.prompt)
+
+        elif isinstance(expr, ListLiteral):
+            expr.elements = [self._optimize_expr(element) for element in expr.elements]
+            if self.level >= 2 and all(_is_scalar(element) for element in expr.elements):
+                expr.constant = [element.value for element in expr.elements]
+
+        elif isinstance(expr, MapLiteral):
+            expr.pairs = [(self._optimize_expr(key), self._optimize_expr(value)) for key, value in expr.pairs]
+            if self.level >= 2 and all(_is_scalar(key) and _is_scalar(value) for key, value in expr.pairs):
+                expr.constant = {key.value: value.value for key, value in expr.pairs}
+
+        elif isinstance(expr, (FunctionDeclaration, ClassDeclaration, Assignment, SetProperty, SubscriptSet)):
+            # Assignments can appear in expression position, e.g. `output(x = 1)`.
+            return self._optimize_stmt(expr)
+
+        return expr
+
+    def _fold_binary(self, expr):
+        left, right = expr.left.value, expr.right.value
+        if expr.operator.type == TokenType.STAR and _is_large_repeat(left, right):
+            return expr
+        try:
+            # Literals are never instances, so no operator overloading can run here.
+            value = MryaInterpreter._builtin_binary_operation(expr.operator, left, right)
+        except (MryaRuntimeError, ArithmeticError):
+            return expr
+        if isinstance(value, str) and len(value) > MAX_FOLDED_LENGTH:
+            return expr
+        return Literal(value, expr.operator)
+
+    def _simplify_logical(self, expr):
+        left = expr.left.value
+        if expr.operator.type == TokenType.OR and left:
+            return Literal(True, expr.operator)
+        if expr.operator.type == TokenType.AND and not left:
+            return Literal(False, expr.operator)
+        # The result is the right side converted to a boolean.
+        if isinstance(expr.right, Literal):
+            return Literal(bool(expr.right.value), expr.operator)
+        if _is_boolean(expr.right):
+            return expr.right
+        return expr
+
+    def _fold_h_string(self, expr):
+        parts = []
+        for part in expr.parts:
+            part = self._optimize_expr(part)
+            if isinstance(part, Literal) and parts and isinstance(parts[-1], Literal):
+                # Merge neighbouring constant text, as the h-string would join it at runtime.
+                parts[-1] = Literal(str(parts[-1].value) + str(part.value), parts[-1].token)
+            else:
+                parts.append(part)
+        if len(parts) == 1 and isinstance(parts[0], Literal):
+            return Literal(str(parts[0].value), parts[0].token)
+        expr.parts = parts
+        return expr
+
+    # --- Type guards ---
+    def _prove_guard(self, stmt):
+        """
+        Marks an assignment whose value always has the target's annotated type, e.g. `count = count + 1`
+        for an int. The value may only use literals and the target itself, which, being read from the
+        same box, has whatever type that box's guard enforces. So if the box turns out to have the
+        guard assumed here (checked by identity when it runs), the guard would pass and is skipped.
+        A box with any other guard (or none) is treated as usual, so the lookup below can be approximate.
+        """
+        name = stmt.name.lexeme
+        annotation = None
+        for scope in reversed(self.annotations):
+            if name in scope:
+                annotation = scope[name]
+                break
+        if annotation is not None and _static_type(stmt.value, name, annotation) == annotation:
+            stmt.proven_guard = type_guard(annotation)
+
+def _static_type(expr, name, annotation):
+    """The Mrya type `expr` always evaluates to, given that `name` holds an `annotation`, or None if unknown."""
+    if isinstance(expr, Literal):
+        return mrya_type_name(expr.value)
+    if isinstance(expr, Variable):
+        return annotation if expr.name.lexeme == name else None
+    if isinstance(expr, Unary):
+        right = _static_type(expr.right, name, annotation)
+        if expr.operator.type == TokenType.MINUS and right in _NUMBERS:
+            return right
+        return None
+    if isinstance(expr, BinaryExpression):
+        left = _static_type(expr.left, name, annotation)
+        right = _static_type(expr.right, name, annotation)
+        op = expr.operator.type
+        if op == TokenType.PLUS and "string" in (left, right) and None not in (left, right):
+            return "string" # `+` with a string on either side concatenates
+        if left in _NUMBERS and right in _NUMBERS:
+            if op == TokenType.SLASH:
+                return "float"
+            if op in (TokenType.PLUS, TokenType.MINUS, TokenType.STAR):
+                return "int" if left == right == "int" else "float"
+    return None
+
+def _is_large_repeat(left, right):
+    """True for `text * count` that would build a string longer than MAX_FOLDED_LENGTH."""
+    if isinstance(left, str) and isinstance(right, int):
+        return len(left) * right > MAX_FOLDED_LENGTH
+    if isinstance(right, str) and isinstance(left, int):
+        return len(right) * left > MAX_FOLDED_LENGTH
+    return False
+
+def _is_scalar(expr):
+    return isinstance(expr, Literal) and type(expr.value) in _SCALARS
+
+def _is_boolean(expr):
+    """True for expressions that always produce True or False."""
+    if isinstance(expr, Literal):
+        return type(expr.value) is bool
+    if isinstance(expr, Logical):
+        return True
+    if isinstance(expr, Unary):
+        return expr.operator.type == TokenType.BANG
+    if isinstance(expr, BinaryExpression):
+        # Not == or !=, which an `_equals_` method can make return anything.
+        return expr.operator.type in _COMPARISONS
+    return False
@@ -0,0 +1,80 @@
+import abc
+import sys
+import threading
+
+# When a StdoutSink hands its buffered lines to the stream:
+# "line" writes and flushes every line, so output shows up as soon as it's produced.
+# "block" collects lines until BLOCK_SIZE characters are waiting, then writes them in one go.
+# "explicit" only writes when the program calls flush() (or finishes, or asks for input).
+FLUSH_POLICIES = ("line", "block", "explicit")
+BLOCK_SIZE = 64 * 1024
+
+class OutputSink(abc.ABC):
+    """Where `output()` sends its text. The interpreter keeps one in `interpreter.output`."""
+    @abc.abstractmethod
+    def write(self, text):
+        """Takes one line of output, without its trailing newline."""
+
+    def flush(self):
+        """Makes everything written so far visible. Called at the end of a run and before reading input."""
+
+class StdoutSink(OutputSink):
+    """
+    Buffers output for a text stream, sys.stdout by default. The stream is looked up when the buffer
+    is written out, so redirecting sys.stdout (as mrya_bench does) also redirects Mrya's output.
+    Without a policy, a terminal gets "line" and anything else (a pipe or a file) gets "block".
+    """
+    def __init__(self, stream=None, policy=None):
+        if policy is None:
+            target = stream if stream is not None else sys.stdout
+            policy = "line" if _is_terminal(target) else "block"
+        if policy not in FLUSH_POLICIES:
+            raise ValueError(f"Unknown flush policy '{policy}', expected one of: {', '.join(FLUSH_POLICIES)}.")
+        self.stream = stream
+        self.policy = policy
+        self.pending = []
+        self.pending_size = 0
+        # Held from taking lines until they're written, since request handlers write and flush on
+        # threads of their own; otherwise two flushes could write their batches out of order.
+        self.lock = threading.Lock()
+
+    def write(self, text):
+        with self.lock:
+            if self.policy == "line":
+                stream = self.stream if self.stream is not None else sys.stdout
+                stream.write(text + "\n")
+                stream.flush()
+                return
+            self.pending.append(text)
+            self.pending_size += len(text) + 1
+            if self.policy == "block" and self.pending_size >= BLOCK_SIZE:
+                self._write_pending()
+
+    def flush(self):
+        with self.lock:
+            self._write_pending()
+
+    def _write_pending(self):
+        pending, self.pending = self.pending, []
+        self.pending_size = 0
+        stream = self.stream if self.stream is not None else sys.stdout
+        if pending:
+            stream.write("\n".join(pending) + "\n")
+        stream.flush()
+
+class CaptureSink(OutputSink):
+    """Keeps output in memory instead of printing it, e.g. for the test suite."""
+    def __init__(self):
+        self.lines = []
+
+    def write(self, text):
+        self.lines.append(text)
+
+    def getvalue(self):
+        return "".join(line + "\n" for line in self.lines)
+
+def _is_terminal(stream):
+    try:
+        return stream.isatty()
+    except (AttributeError, ValueError):
+        return False
@@ -1,5 +1,5 @@
 from mrya_tokens import TokenType, Token
-from mrya_ast import Literal, HString, Splat, Variable, Get, LetStatement, OutputStatement, BinaryExpression, Logical, Unary, FunctionDeclaration, FunctionCall, ReturnStatement, IfStatement, WhileStatement, ForStatement, BreakStatement, ContinueStatement, TryStatement, CatchClause, ClassDeclaration, SetProperty, This, Inherit, Assignment, SubscriptGet, SubscriptSet, InputCall, ImportStatement, ListLiteral, MapLiteral
+from mrya_ast import Literal, HString, Splat, Variable, Get, LetStatement, OutputStatement, BinaryExpression, Logical, Unary, Await, FunctionDeclaration, FunctionCall, ReturnStatement, YieldStatement, IfStatement, WhileStatement, ForStatement, BreakStatement, ContinueStatement, TryStatement, CatchClause, ClassDeclaration, SetProperty, This, Inherit, Assignment, SubscriptGet, SubscriptSet, InputCall, ImportStatement, ListLiteral, MapLiteral
 
 class ParseError(Exception):
     def __init__(self, token, message):
@@ -13,6 +13,8 @@ class MryaParser:
         self.current = 0
 
         self._loop_depth = 0 # To track if we are inside a loop
+        self._functions = [] # For each function being parsed: [its first yield, its first `return <value>`, whether it's async]
+        self._awaits = [] # The awaits of an async function's statements being parsed, checked once each statement is complete
     def parse(self):
         statements = []
         while not self._is_at_end():
@@ -34,6 +36,25 @@ class MryaParser:
         return expr
 
     def _statement(self):
+        start = len(self._awaits)
+        stmt = self._statement_kind()
+        # An async function pauses between statements, so an await there has to be the statement's
+        # whole value: the statement itself, or what a let, assignment, output or return gives.
+        awaits = self._awaits[start:]
+        del self._awaits[start:]
+        value = stmt
+        if type(stmt) is LetStatement:
+            value = stmt.initializer
+        elif type(stmt) is Assignment or type(stmt) is ReturnStatement:
+            value = stmt.value
+        elif type(stmt) is OutputStatement:
+            value = stmt.expression
+        for node in awaits:
+            if node is not value:
+                raise ParseError(node.keyword, "In an async function, 'await' has to be the whole value of a statement, e.g. `let result = await f()`.")
+        return stmt
+
+    def _statement_kind(self):
         decorators = []
         while self._match(TokenType.PERCENT):
             decorators.append(self._expression())
@@ -48,10 +69,17 @@ class MryaParser:
             return self._output_statement()
         if self._match(TokenType.FUNC):  
             return self._function_statement(decorators)
+        if self._match(TokenType.ASYNC):
+            self._consume(TokenType.FUNC, "Expected 'func' after 'async'.")
+            return self._function_statement(decorators, is_async=True)
         if self._match(TokenType.RETURN):
             if decorators:
                 raise ParseError(self._previous(), "Decorators can only be applied to functions and classes.")
             return self._return_statement()
+        if self._match(TokenType.YIELD):
+            if decorators:
+                raise ParseError(self._previous(), "Decorators can only be applied to functions and classes.")
+            return self._yield_statement()
         if self._match(TokenType.IF):
             if decorators:
                 raise ParseError(self._previous(), "Decorators can only be applied to functions and classes.")
@@ -192,8 +220,9 @@ class MryaParser:
 
         methods = []
         while not self._check(TokenType.RIGHT_BRACE) and not self._is_at_end():
+            is_async = self._match(TokenType.ASYNC)
             self._consume(TokenType.FUNC, "Expect 'func' to define a method.")
-            methods.append(self._function_statement(is_method=True))
+            methods.append(self._function_statement(is_method=True, is_async=is_async))
 
         self._consume(TokenType.RIGHT_BRACE, "Expect '}' after class body.")
         return ClassDeclaration(name, superclass, methods, decorators)
@@ -217,8 +246,25 @@ class MryaParser:
             value = self._expression()
         else:
             value = None
+        if value is not None and self._functions and self._functions[-1][1] is None:
+            self._functions[-1][1] = keyword
         return ReturnStatement(keyword, value)
 
+    def _yield_statement(self):
+        keyword = self._previous()
+        if not self._functions:
+            raise ParseError(keyword, "'yield' can only be used inside a function.")
+        if self._functions[-1][2]:
+            raise ParseError(keyword, "'yield' can't be used in an async function.")
+        if self._functions[-1][0] is None:
+            self._functions[-1][0] = keyword
+
+        if not self._check(TokenType.SEMICOLON) and not self._check(TokenType.RIGHT_BRACE):
+            value = self._expression()
+        else:
+            value = None
+        return YieldStatement(keyword, value)
+
     def _let_statement(self):
         is_const = self._match(TokenType.CONST)
         name_token = self._consume(TokenType.IDENTIFIER, "Expected variable name after 'let'.")
@@ -240,7 +286,7 @@ class MryaParser:
         return OutputStatement(expr)
 
     
-    def _function_statement(self, decorators=None, is_method=False):
+    def _function_statement(self, decorators=None, is_method=False, is_async=False):
         if self._peek().type in [TokenType.THIS, TokenType.INHERIT]:
             token = self._peek()
             raise ParseError(token, f"Cannot use reserved keyword '{token.lexeme}' as a function name.")
@@ -269,13 +315,19 @@ class MryaParser:
         self._consume(TokenType.LEFT_BRACE, "Expected '{' to start function body.")
 
         body = []
-        while not self._check(TokenType.RIGHT_BRACE) and not self._is_at_end():
-            stmt = self._statement()
-            if stmt:
-                body.append(stmt)
+        self._functions.append([None, None, is_async])
+        try:
+            while not self._check(TokenType.RIGHT_BRACE) and not self._is_at_end():
+                stmt = self._statement()
+                if stmt:
+                    body.append(stmt)
+        finally:
+            first_yield, value_return, _ = self._functions.pop()
 
+        if first_yield is not None and value_return is not None:
+            raise ParseError(value_return, "A generator function can't return a value.")
         self._consume(TokenType.RIGHT_BRACE, "Expected '}' after function body.")
-        return FunctionDeclaration(name_token, parameters, body, decorators, is_variadic)
+        return FunctionDeclaration(name_token, parameters, body, decorators, is_variadic, is_generator=first_yield is not None, is_async=is_async)
     
     # --- Expressions ---
     def _expression(self):
@@ -386,6 +438,14 @@ class MryaParser:
             operator = self._previous()
             right = self._unary()
             return Unary(operator, right)
+        if self._match(TokenType.AWAIT):
+            keyword = self._previous()
+            if self._functions and not self._functions[-1][2]:
+                raise ParseError(keyword, "'await' can only be used in an async function or at the top level.")
+            expr = Await(keyword, self._unary())
+            if self._functions:
+                self._awaits.append(expr)
+            return expr
         return self._call()
 
     def _call(self):
@@ -0,0 +1,332 @@
+from mrya_ast import Literal, HString, Splat, Variable, Get, BinaryExpression, Logical, Unary, Await, LetStatement, OutputStatement, FunctionDeclaration, FunctionCall, ReturnStatement, YieldStatement, IfStatement, WhileStatement, ForStatement, BreakStatement, ContinueStatement, TryStatement, ClassDeclaration, SetProperty, This, Inherit, Assignment, SubscriptGet, SubscriptSet, InputCall, ImportStatement, ListLiteral, MapLiteral
+import os
+
+class FrameLayout:
+    """The static shape of a slot-indexed frame (a function body, for-loop body or catch block)."""
+    def __init__(self):
+        self.names = {} # Maps a variable name to its slot index
+        # Whether each slot holds a MryaBox. Only slots that can be aliased by `let a = b`, or that hold
+        # a constant or typed variable, need one; the rest store their value directly.
+        self.boxed = []
+        self.param_slots = []
+        self.this_slot = None
+        self.inherit_slot = None
+        self.is_dynamic = False # True if names can appear at runtime that we can't see statically
+        self.is_captured = False # True if a function, class or module created inside can outlive a run of the frame
+        self.size = 0
+
+    def declare(self, name):
+        if name not in self.names:
+            self.names[name] = self.size
+            self.boxed.append(False)
+            self.size += 1
+        return self.names[name]
+
+    def box(self, slot):
+        self.boxed[slot] = True
+
+class _GlobalScope:
+    """Marks the top level of a file. Its variables live in a dict and are looked up by name."""
+    def __init__(self):
+        self.is_dynamic = False
+
+class MryaResolver:
+    """
+    A static pass that runs between parsing and interpretation.
+    It works out, for every identifier, how many frames up its binding lives and at which slot,
+    so the interpreter can read frames by index instead of walking dicts by name.
+    """
+    def __init__(self):
+        self.scopes = []
+        self.method_depth = 0 # > 0 while inside a class method, so 'this' and 'inherit' resolve
+        self.slot_uses = [] # (node, layout) for every node bound to a slot, see _mark_boxed
+
+    def resolve(self, statements):
+        self.scopes = [_GlobalScope()]
+        self.slot_uses = []
+        self._resolve_block(statements)
+        self._mark_boxed()
+        self.scopes = []
+        return statements
+
+    def _mark_boxed(self):
+        # Whether a slot needs a box is only known once its whole frame has been seen,
+        # since a later `let a = b` boxes b for every earlier use too.
+        for node, layout in self.slot_uses:
+            node.boxed = layout.boxed[node.slot]
+        self.slot_uses = []
+
+    # --- Scopes ---
+    def _begin_frame(self, statements, layout=None):
+        layout = layout or FrameLayout()
+        # Hoist every declaration in the frame, so a variable declared further down (or in a
+        # later loop iteration) still gets its slot. Reads of a slot that hasn't been
+        # assigned yet fall back to the enclosing scopes at runtime.
+        self._declare_block(statements, layout)
+        self.scopes.append(layout)
+        return layout
+
+    def _end_frame(self):
+        self.scopes.pop()
+
+    def _declare_block(self, statements, layout):
+        for stmt in statements:
+            if isinstance(stmt, LetStatement):
+                layout.declare(stmt.name.lexeme)
+            elif isinstance(stmt, (FunctionDeclaration, ClassDeclaration)):
+                layout.declare(stmt.name.lexeme)
+            elif isinstance(stmt, ImportStatement):
+                module_name = self._import_name(stmt)
+                if module_name is None:
+                    layout.is_dynamic = True
+                else:
+                    layout.declare(module_name)
+            elif isinstance(stmt, IfStatement):
+                self._declare_block(stmt.then_branch, layout)
+                if stmt.else_branch:
+                    self._declare_block(stmt.else_branch, layout)
+            elif isinstance(stmt, WhileStatement):
+                self._declare_block(stmt.body, layout)
+            elif isinstance(stmt, TryStatement):
+                self._declare_block(stmt.try_block, layout)
+                if stmt.finally_block:
+                    self._declare_block(stmt.finally_block, layout)
+
+    @staticmethod
+    def _import_name(stmt):
+        if isinstance(stmt.path_expr, Literal) and isinstance(stmt.path_expr.value, str):
+            return os.path.splitext(os.path.basename(stmt.path_expr.value))[0]
+        return None
+
+    def _declare(self, name, boxed=False):
+        """Returns the slot for a declaration in the innermost scope, or None at the top level."""
+        scope = self.scopes[-1]
+        if isinstance(scope, FrameLayout):
+            slot = scope.declare(name)
+            if boxed:
+                scope.box(slot)
+            return slot
+        return None
+
+    def _capture_frames(self):
+        """Marks every enclosing frame as reachable from a closure created here."""
+        for scope in self.scopes:
+            if isinstance(scope, FrameLayout):
+                scope.is_captured = True
+
+    def _use_slot(self, node, depth):
+        """Records that `node` reads or writes a slot of the frame `depth` levels up."""
+        if depth is not None and node.slot is not None:
+            self.slot_uses.append((node, self.scopes[-1 - depth]))
+
+    def _lookup(self, name):
+        """Returns (depth, slot) for a name. A slot of None means a global lookup by name."""
+        depth = 0
+        for scope in reversed(self.scopes):
+            if scope.is_dynamic:
+                return None, None
+            if isinstance(scope, _GlobalScope):
+                return depth, None
+            if name in scope.names:
+                return depth, scope.names[name]
+            depth += 1
+        return None, None
+
+    # --- Statements ---
+    def _resolve_block(self, statements):
+        for stmt in statements:
+            self._resolve_stmt(stmt)
+
+    def _resolve_stmt(self, stmt):
+        if isinstance(stmt, LetStatement):
+            self._resolve_expr(stmt.initializer)
+            # Constants and typed variables keep their checks in a box.
+            boxed = stmt.is_const or stmt.type_annotation is not None
+            source = stmt.initializer
+            if isinstance(source, Variable) and not stmt.is_const and source.depth in (0, None):
+                # `let a = b` shares b's box when b is in the current frame, so both need one.
+                boxed = True
+                if source.slot is not None:
+                    self.scopes[-1].box(source.slot)
+            stmt.slot = self._declare(stmt.name.lexeme, boxed)
+            self._use_slot(stmt, 0)
+
+        elif isinstance(stmt, OutputStatement):
+            self._resolve_expr(stmt.expression)
+
+        elif isinstance(stmt, FunctionDeclaration):
+            for decorator in stmt.decorators:
+                self._resolve_expr(decorator)
+            stmt.slot = self._declare(stmt.name.lexeme, boxed=True) # Declarations are constants
+            self._capture_frames()
+            self._resolve_function(stmt, is_method=False)
+
+        elif isinstance(stmt, ClassDeclaration):
+            if stmt.superclass:
+                self._resolve_expr(stmt.superclass)
+            for decorator in stmt.decorators:
+                self._resolve_expr(decorator)
+            stmt.slot = self._declare(stmt.name.lexeme, boxed=True)
+            self._capture_frames()
+            for method in stmt.methods:
+                self._resolve_function(method, is_method=True)
+
+        elif isinstance(stmt, (ReturnStatement, YieldStatement)):
+            if stmt.value is not None:
+                self._resolve_expr(stmt.value)
+
+        elif isinstance(stmt, IfStatement):
+            self._resolve_expr(stmt.condition)
+            self._resolve_block(stmt.then_branch)
+            if stmt.else_branch:
+                self._resolve_block(stmt.else_branch)
+
+        elif isinstance(stmt, WhileStatement):
+            self._resolve_expr(stmt.condition)
+            self._resolve_block(stmt.body)
+
+        elif isinstance(stmt, ForStatement):
+            self._resolve_expr(stmt.iterable)
+            layout = FrameLayout()
+            layout.declare(stmt.variable.lexeme) # The loop variable is always slot 0
+            stmt.layout = self._begin_frame(stmt.body, layout)
+            self._resolve_block(stmt.body)
+            self._end_frame()
+
+        elif isinstance(stmt, (BreakStatement, ContinueStatement)):
+            pass
+
+        elif isinstance(stmt, TryStatement):
+            self._resolve_block(stmt.try_block)
+            for clause in stmt.catch_clauses:
+                clause.layout = self._begin_frame(clause.body)
+                self._resolve_block(clause.body)
+                self._end_frame()
+            if stmt.finally_block:
+                self._resolve_block(stmt.finally_block)
+
+        elif isinstance(stmt, Assignment):
+            self._resolve_expr(stmt.value)
+            stmt.depth, stmt.slot = self._lookup(stmt.name.lexeme)
+            self._use_slot(stmt, stmt.depth)
+
+        elif isinstance(stmt, SetProperty):
+            self._resolve_expr(stmt.object)
+            self._resolve_expr(stmt.value)
+
+        elif isinstance(stmt, SubscriptSet):
+            self._resolve_expr(stmt.object)
+            self._resolve_expr(stmt.index)
+            self._resolve_expr(stmt.value)
+
+        elif isinstance(stmt, ImportStatement):
+            self._capture_frames() # The module's environment encloses the importing frame
+            self._resolve_expr(stmt.path_expr)
+            module_name = self._import_name(stmt)
+            if module_name is not None:
+                stmt.slot = self._declare(module_name, boxed=True)
+
+        else:
+            # Bare expressions used as statements
+            self._resolve_expr(stmt)
+
+    def _resolve_function(self, declaration, is_method):
+        layout = FrameLayout()
+        if is_method:
+            layout.inherit_slot = layout.declare("inherit")
+            layout.this_slot = layout.declare("this")
+        layout.param_slots = [layout.declare(param.lexeme) for param in declaration.params]
+        declaration.layout = self._begin_frame(declaration.body, layout)
+        # A plain function nested in a method still sees the method's 'this' through its closure,
+        # so only methods change the depth.
+        if is_method:
+            self.method_depth += 1
+        self._resolve_block(declaration.body)
+        if is_method:
+            self.method_depth -= 1
+        self._end_frame()
+        if not (declaration.is_generator or declaration.is_async): # Their frames stay suspended, so they have none to hand over
+            self._mark_tail_calls(declaration.body)
+
+    def _mark_tail_calls(self, statements):
+        """
+        Flags every `return f(...)` in a function body: nothing is left to do in the function once
+        the call is made, so the callee can run in place of the caller instead of on top of it.
+        """
+        for stmt in statements:
+            if isinstance(stmt, ReturnStatement):
+                stmt.tail_call = isinstance(stmt.value, FunctionCall)
+            elif isinstance(stmt, IfStatement):
+                self._mark_tail_calls(stmt.then_branch)
+                if stmt.else_branch:
+                    self._mark_tail_calls(stmt.else_branch)
+            elif isinstance(stmt, (WhileStatement, ForStatement)):
+                self._mark_tail_calls(stmt.body)
+            # Not inside a try: its catch clauses must see the call's errors, and its finally block
+            # has to run after the call.
+
+    # --- Expressions ---
+    def _resolve_expr(self, expr):
+        if isinstance(expr, Literal):
+            return
+
+        elif isinstance(expr, Variable):
+            expr.depth, expr.slot = self._lookup(expr.name.lexeme)
+            self._use_slot(expr, expr.depth)
+
+        elif isinstance(expr, This):
+            if self.method_depth:
+                expr.depth, expr.slot = self._lookup("this")
+            # Outside a method 'this' can only come from a runtime binding, so it stays unresolved.
+
+        elif isinstance(expr, Inherit):
+            if self.method_depth:
+                expr.depth, expr.slot = self._lookup("inherit")
+                _, expr.this_slot = self._lookup("this")
+
+        elif isinstance(expr, (BinaryExpression, Logical)):
+            self._resolve_expr(expr.left)
+            self._resolve_expr(expr.right)
+
+        elif isinstance(expr, Unary):
+            self._resolve_expr(expr.right)
+
+        elif isinstance(expr, Await):
+            self._resolve_expr(expr.value)
+
+        elif isinstance(expr, Get):
+            self._resolve_expr(expr.object)
+
+        elif isinstance(expr, FunctionCall):
+            if isinstance(expr.callee, Variable) and expr.callee.name.lexeme == "import":
+                self._capture_frames()
+            self._resolve_expr(expr.callee)
+            for argument in expr.arguments:
+                self._resolve_expr(argument)
+
+        elif isinstance(expr, Splat):
+            self._resolve_expr(expr.expression)
+
+        elif isinstance(expr, SubscriptGet):
+            self._resolve_expr(expr.object)
+            self._resolve_expr(expr.index)
+
+        elif isinstance(expr, ListLiteral):
+            for element in expr.elements:
+                self._resolve_expr(element)
+
+        elif isinstance(expr, MapLiteral):
+            for key_expr, value_expr in expr.pairs:
+                self._resolve_expr(key_expr)
+                self._resolve_expr(value_expr)
+
+        elif isinstance(expr, HString):
+            for part in expr.parts:
+                self._resolve_expr(part)
+
+        elif isinstance(expr, InputCall):
+            self._resolve_expr(expr.prompt)
+
+        elif isinstance(expr, (FunctionDeclaration, ClassDeclaration, Assignment, SetProperty, SubscriptSet)):
+            # Assignments can appear in expression position, e.g. `output(x = 1)`.
+            self._resolve_stmt(expr)
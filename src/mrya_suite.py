@@ -6,7 +6,11 @@ import os
 
 from mrya_lexer import MryaLexer
 from mrya_parser import MryaParser, ParseError
-from mrya_interpreter import MryaInterpreter, ReturnValue
+from mrya_resolver import MryaResolver
+from mrya_optimizer import MryaOptimizer, DEFAULT_LEVEL
+from mrya_interpreter import ReturnValue
+from mrya_output import CaptureSink
+from mrya_main import ENGINES
 from mrya_errors import MryaRuntimeError, MryaTypeError, LexerError
 
 # -------------------------
@@ -15,6 +19,8 @@ from mrya_errors import MryaRuntimeError, MryaTypeError, LexerError
 parser = argparse.ArgumentParser(description="Run MRYA test suite.")
 parser.add_argument("--no-tests", action="store_true", help="Skip running tests in the 'tests' folder.")
 parser.add_argument("--no-packages", action="store_true", help="Skip running package tests in the 'packages' folder.")
+parser.add_argument("--engine", choices=sorted(ENGINES), default="tree", help="Execution engine to run the tests with.")
+parser.add_argument("-O", type=int, choices=[0, 1, 2], default=DEFAULT_LEVEL, dest="optimize", help="Optimization level to run the tests at.")
 args = parser.parse_args()
 
 print("Starting MRYA test suite...")
@@ -45,9 +51,13 @@ def run_file(filename, show_tokens=False, show_ast=False) -> bool:
         statements = parser.parse()
     except ParseError:
         return False
+    statements = MryaOptimizer(args.optimize).optimize(statements)
+    MryaResolver().resolve(statements)
 
     # Interpretation
-    interpreter = MryaInterpreter()
+    interpreter = ENGINES[args.engine]()
+    interpreter.optimize_level = args.optimize
+    interpreter.output = CaptureSink() # Keep the tests' own output out of the report
     try:
         interpreter.set_current_directory(os.path.dirname(os.path.abspath(filename)))
         interpreter.interpret(statements)
@@ -44,6 +44,9 @@ class TokenType(Enum):
 	LET = auto()
 	FUNCTION = auto()
 	RETURN = auto()
+	YIELD = auto()
+	ASYNC = auto()
+	AWAIT = auto()
 	IF = auto()
 	WHILE = auto()
 	ELSE = auto()
@@ -0,0 +1,541 @@
+from mrya_ast import FunctionDeclaration
+from mrya_errors import MryaRuntimeError, MryaTypeError, MryaRaisedError
+from mrya_interpreter import MryaInterpreter, MryaBox, UNBOUND, MryaClass, MryaInstance, MryaBoundMethod, MryaModule, MryaModuleMethod, Environment, ReturnSignal, ReturnValue
+from mrya_compiler import *
+
+# Returned by `run` when a block finished without executing a `return`.
+NO_RETURN = object()
+_EXHAUSTED = object()
+
+class Frame:
+    """A suspended caller: where to resume once the callee returns."""
+    __slots__ = ("instructions", "pc", "env", "handlers", "base", "instance")
+    def __init__(self, instructions, pc, env, handlers, base, instance):
+        self.instructions = instructions
+        self.pc = pc
+        self.env = env
+        self.handlers = handlers
+        self.base = base
+        self.instance = instance
+
+class MryaVM(MryaInterpreter):
+    """
+    Runs compiled bytecode on an explicit value stack and call-frame array.
+    Calls between Mrya functions push a Frame instead of recursing in Python, so recursion depth
+    is only limited by memory. Native code that calls back into Mrya starts a nested run.
+    """
+    def __init__(self):
+        super().__init__()
+        self.compiler = MryaCompiler()
+
+    def execution_context(self):
+        context = super().execution_context()
+        context.compiler = MryaCompiler() # Compiling keeps state on the compiler, so each thread needs its own
+        return context
+
+    # --- Entry points used by the shared interpreter helpers ---
+    def interpret(self, statements):
+        try:
+            result = self.run(self.compiler.compile_block(statements, "<main>"), self.env)
+            if result is NO_RETURN:
+                self._finish_tasks()
+        finally:
+            self.output.flush()
+        if result is not NO_RETURN:
+            raise ReturnValue(result)
+
+    def _execute(self, stmt):
+        # Generators run their bodies one statement at a time, so the compiled statement is kept.
+        code = stmt.__dict__.get("_statement_code")
+        if code is None:
+            code = stmt._statement_code = self.compiler.compile_block([stmt])
+        result = self.run(code, self.env)
+        if result is not NO_RETURN:
+            return ReturnSignal(result)
+        return None
+
+    def _execute_block(self, statements, environment):
+        result = self.run(self.compiler.compile_block(statements), environment)
+        if result is not NO_RETURN:
+            return ReturnSignal(result)
+        return None
+
+    def _evaluate(self, expr, unbox=True):
+        if not unbox:
+            return super()._evaluate(expr, unbox)
+        code = expr.__dict__.get("_code")
+        if code is None:
+            code = expr._code = self.compiler.compile_expression(expr)
+        return self.run(code, self.env)
+
+    def _run_function_body(self, declaration, call_env):
+        code = declaration.__dict__.get("_code") or self.compiler.compile_function(declaration)
+        return self.run(code, call_env)
+
+    def _prepare_function(self, declaration):
+        # Compiled once on the declaration, so the functions copied from it share the code.
+        if "_code" not in declaration.__dict__:
+            self.compiler.compile_function(declaration)
+
+    # --- The interpreter loop ---
+    def run(self, code, env):
+        """Runs a code object in `env`. Returns what it returned, or NO_RETURN for a block that didn't."""
+        stack = []
+        frames = []
+        instructions = code.instructions
+        pc = 0
+        handlers = None # (handler pc, stack height, env) for each active try in the current frame
+        base = 0 # Where the current frame's part of the stack starts
+        instance = None # The new instance, when the current frame is an initializer
+        previous_env = self.env
+        self.env = env
+        try:
+            while True:
+                try:
+                    while True:
+                        op, arg = instructions[pc]
+                        pc += 1
+
+                        if op == LOAD_FAST:
+                            value = env.slots[arg[0]]
+                            stack.append(value if value is not UNBOUND else env.get_variable(arg[1]))
+
+                        elif op == LOAD_LOCAL:
+                            box = env.slots[arg[0]]
+                            stack.append(box.value if box is not UNBOUND else env.get_variable(arg[1]))
+
+                        elif op == CONST:
+                            stack.append(arg)
+
+                        elif op == LOAD_GLOBAL:
+                            depth, name, token = arg
+                            frame_env = env
+                            while depth:
+                                frame_env = frame_env.enclosing
+                                depth -= 1
+                            box = frame_env.values.get(name)
+                            stack.append(box.value if box is not None else frame_env.get_variable(token))
+
+                        elif op == LOAD_OUTER:
+                            depth, slot, token, boxed = arg
+                            frame_env = env
+                            while depth:
+                                frame_env = frame_env.enclosing
+                                depth -= 1
+                            value = frame_env.slots[slot]
+                            if value is UNBOUND:
+                                stack.append(frame_env.get_variable(token))
+                            else:
+                                stack.append(value.value if boxed else value)
+
+                        elif op == POP_JUMP_IF_FALSE:
+                            if not stack.pop():
+                                pc = arg
+
+                        elif op == JUMP:
+                            pc = arg
+
+                        elif op == BINARY_ADD:
+                            right = stack.pop()
+                            left = stack[-1]
+                            left_type = type(left)
+                            if (left_type is int or left_type is float or left_type is str) and left_type is type(right):
+                                stack[-1] = left + right
+                            else:
+                                stack[-1] = self._binary_operation(arg, left, right)
+
+                        elif op == COMPARE_LT:
+                            right = stack.pop()
+                            left = stack[-1]
+                            try:
+                                stack[-1] = left < right
+                            except TypeError:
+                                stack[-1] = self._binary_operation(arg, left, right)
+
+                        elif op == STORE_FAST:
+                            slot, token = arg
+                            if env.slots[slot] is UNBOUND:
+                                env.assign(token, stack.pop())
+                            else:
+                                env.slots[slot] = stack.pop()
+
+                        elif op == ASSIGN_LOCAL:
+                            slot, token, proven = arg
+                            box = env.slots[slot]
+                            if box is UNBOUND:
+                                env.assign(token, stack.pop())
+                            else:
+                                env.assign_box(box, token, stack.pop(), proven)
+
+                        elif op == BINARY_SUB or op == BINARY_MUL:
+                            right = stack.pop()
+                            left = stack[-1]
+                            if (type(left) is int or type(left) is float) and (type(right) is int or type(right) is float):
+                                stack[-1] = left - right if op == BINARY_SUB else left * right
+                            else:
+                                stack[-1] = self._binary_operation(arg, left, right)
+
+                        elif op == CALL or op == CALL_LIST:
+                            if op == CALL:
+                                count, call = arg
+                                if count:
+                                    arguments = stack[-count:]
+                                    del stack[-count:]
+                                else:
+                                    arguments = []
+                            else:
+                                call = arg
+                                arguments = stack.pop()
+                            callee = stack.pop()
+                            callee_type = type(callee)
+                            new_instance = None
+                            if callee_type is FunctionDeclaration:
+                                declaration = callee
+                                call_env = self._call_environment(callee, arguments)
+                            elif callee_type is MryaBoundMethod:
+                                declaration = callee.method
+                                call_env = self._call_environment(declaration, arguments, callee.instance)
+                            elif callee_type is MryaClass:
+                                new_instance = MryaInstance(callee)
+                                declaration = callee.find_method("_start_")
+                                if declaration is None:
+                                    stack.append(new_instance)
+                                    continue
+                                call_env = self._call_environment(declaration, arguments, new_instance)
+                            elif callee_type is MryaModuleMethod:
+                                declaration = callee.func_decl
+                                call_env = callee.call_environment(self, arguments)
+                            else:
+                                if callee_type is MryaModule:
+                                    self._raise_module_call(call)
+                                stack.append(self._call_value(call, callee, arguments))
+                                continue
+                            frames.append(Frame(instructions, pc, env, handlers, base, instance))
+                            callee_code = declaration.__dict__.get("_code") or self.compiler.compile_function(declaration)
+                            instructions = callee_code.instructions
+                            pc = 0
+                            env = self.env = call_env
+                            handlers = None
+                            base = len(stack)
+                            instance = new_instance
+
+                        elif op == RETURN:
+                            value = stack.pop()
+                            if not frames:
+                                return value
+                            if instance is not None:
+                                value = instance
+                            del stack[base:]
+                            frame = frames.pop()
+                            instructions = frame.instructions
+                            pc = frame.pc
+                            env = self.env = frame.env
+                            handlers = frame.handlers
+                            base = frame.base
+                            instance = frame.instance
+                            stack.append(value)
+
+                        elif op == TAIL_CALL:
+                            # `return f(...)`: a Mrya function runs in place of the current frame, so its
+                            # RETURN goes straight to our caller. Anything else is an ordinary call, and
+                            # the RETURN compiled after this instruction returns its result.
+                            count, call = arg
+                            if count is None:
+                                arguments = stack.pop()
+                            elif count:
+                                arguments = stack[-count:]
+                                del stack[-count:]
+                            else:
+                                arguments = []
+                            callee = stack.pop()
+                            callee_type = type(callee)
+                            if instance is not None:
+                                # An initializer returns its instance, so its frame is still needed afterwards.
+                                stack.append(self._call_value(call, callee, arguments))
+                                continue
+                            if callee_type is FunctionDeclaration:
+                                declaration = callee
+                                call_env = self._call_environment(callee, arguments)
+                            elif callee_type is MryaBoundMethod:
+                                declaration = callee.method
+                                call_env = self._call_environment(declaration, arguments, callee.instance)
+                            elif callee_type is MryaModuleMethod:
+                                declaration = callee.func_decl
+                                call_env = callee.call_environment(self, arguments)
+                            else:
+                                if callee_type is MryaModule:
+                                    self._raise_module_call(call)
+                                stack.append(self._call_value(call, callee, arguments))
+                                continue
+                            del stack[base:]
+                            callee_code = declaration.__dict__.get("_code") or self.compiler.compile_function(declaration)
+                            instructions = callee_code.instructions
+                            pc = 0
+                            env = self.env = call_env
+                            handlers = None
+
+                        elif op == POP:
+                            stack.pop()
+
+                        elif op == LET_FAST:
+                            env.slots[arg] = stack.pop()
+
+                        elif op == LET_SLOT:
+                            value = stack.pop()
+                            env.slots[arg] = value if type(value) is MryaBox else MryaBox(value)
+
+                        elif op == FOR_NEXT:
+                            item = next(stack[-1], _EXHAUSTED)
+                            boxed, unbound, exit_pc = arg
+                            if item is _EXHAUSTED:
+                                stack.pop()
+                                env = self.env = env.enclosing
+                                pc = exit_pc
+                            else:
+                                slots = env.slots
+                                slots[0] = MryaBox(item) if boxed else item
+                                if unbound is not None:
+                                    slots[1:] = unbound
+
+                        elif op == FOR_ITER:
+                            item = next(stack[-1], _EXHAUSTED)
+                            layout, variable, exit_pc = arg
+                            if item is _EXHAUSTED:
+                                stack.pop()
+                                pc = exit_pc
+                            else:
+                                # A fresh environment per iteration, so closures capture the item they saw.
+                                env = self.env = Environment(env, layout)
+                                if layout is not None:
+                                    env.slots[0] = MryaBox(item) if layout.boxed[0] else item
+                                else:
+                                    env.define_variable(variable, MryaBox(item))
+
+                        elif op == PUSH_ENV:
+                            env = self.env = Environment(env, arg)
+
+                        elif op == POP_ENV:
+                            env = self.env = env.enclosing
+
+                        elif op == GET_ATTR:
+                            obj = stack[-1]
+                            if type(obj) is MryaInstance and arg.name.lexeme in obj.fields:
+                                stack[-1] = obj.fields[arg.name.lexeme]
+                            else:
+                                stack[-1] = self._get_property(arg, obj)
+
+                        elif op == SUBSCR:
+                            index = stack.pop()
+                            obj = stack[-1]
+                            if type(index) is int and type(obj) is list and -len(obj) <= index < len(obj):
+                                stack[-1] = obj[index]
+                            else:
+                                stack[-1] = self._subscript_get(arg, obj, index)
+
+                        elif op == LOAD_THIS:
+                            if arg.depth is not None and arg.slot is not None:
+                                frame_env = env
+                                depth = arg.depth
+                                while depth:
+                                    frame_env = frame_env.enclosing
+                                    depth -= 1
+                                value = frame_env.slots[arg.slot]
+                                stack.append(value if value is not UNBOUND else env.get_variable(arg.keyword))
+                            else:
+                                stack.append(self._this_value(arg))
+
+                        elif op == COMPARE_EQ or op == COMPARE_NE:
+                            right = stack.pop()
+                            left = stack[-1]
+                            if type(left) is MryaInstance:
+                                stack[-1] = self._binary_operation(arg, left, right)
+                            else:
+                                stack[-1] = (left == right) if op == COMPARE_EQ else (left != right)
+
+                        elif op == COMPARE:
+                            compare, token = arg
+                            right = stack.pop()
+                            left = stack[-1]
+                            try:
+                                stack[-1] = compare(left, right)
+                            except TypeError:
+                                stack[-1] = self._binary_operation(token, left, right)
+
+                        elif op == BINARY_OP:
+                            right = stack.pop()
+                            stack[-1] = self._binary_operation(arg, stack[-1], right)
+
+                        elif op == ASSIGN_OUTER or op == ASSIGN_GLOBAL:
+                            depth, key, token, boxed, proven = arg
+                            frame_env = env
+                            while depth:
+                                frame_env = frame_env.enclosing
+                                depth -= 1
+                            if op == ASSIGN_GLOBAL:
+                                box = frame_env.values.get(key)
+                            else:
+                                box = frame_env.slots[key]
+                                if box is UNBOUND:
+                                    box = None
+                                elif not boxed:
+                                    frame_env.slots[key] = stack.pop()
+                                    continue
+                            if box is None:
+                                frame_env.assign(token, stack.pop())
+                            else:
+                                frame_env.assign_box(box, token, stack.pop(), proven)
+
+                        elif op == LOAD_NAME:
+                            stack.append(env.get_variable(arg))
+
+                        elif op == ASSIGN_NAME:
+                            env.assign(arg, stack.pop())
+
+                        elif op == LOAD_REF:
+                            # What the tree-walker's `_evaluate(expr, unbox=False)` gives: a box or a value.
+                            stack.append(MryaInterpreter._evaluate(self, arg, False))
+
+                        elif op == LET_NAME:
+                            value = stack.pop()
+                            env.values[arg.lexeme] = value if type(value) is MryaBox else MryaBox(value)
+
+                        elif op == LET_TYPED:
+                            value = stack.pop()
+                            self._define_let(arg, value if type(value) is MryaBox else MryaBox(value))
+
+                        elif op == MAKE_CONST:
+                            stack[-1] = MryaBox(stack[-1], is_const=True)
+
+                        elif op == POP_JUMP_IF_TRUE:
+                            if stack.pop():
+                                pc = arg
+
+                        elif op == NOT:
+                            stack[-1] = not stack[-1]
+
+                        elif op == TO_BOOL:
+                            stack[-1] = bool(stack[-1])
+
+                        elif op == NEGATE:
+                            right = stack[-1]
+                            stack[-1] = -right if type(right) is int or type(right) is float else self._unary_operation(arg, right)
+
+                        elif op == SET_ATTR:
+                            value = stack.pop()
+                            self._set_property(arg, stack.pop(), value)
+
+                        elif op == STORE_SUBSCR:
+                            value = stack.pop()
+                            index = stack.pop()
+                            self._subscript_set(arg, stack.pop(), index, value)
+
+                        elif op == BUILD_LIST:
+                            if arg:
+                                values = stack[-arg:]
+                                del stack[-arg:]
+                            else:
+                                values = []
+                            stack.append(values)
+
+                        elif op == BUILD_MAP:
+                            map_obj = {}
+                            if arg:
+                                items = stack[-2 * arg:]
+                                del stack[-2 * arg:]
+                                for i in range(0, 2 * arg, 2):
+                                    map_obj[items[i]] = items[i + 1]
+                            stack.append(map_obj)
+
+                        elif op == BUILD_STRING:
+                            parts = stack[-arg:] if arg else []
+                            if arg:
+                                del stack[-arg:]
+                            stack.append("".join([str(part) for part in parts]))
+
+                        elif op == LIST_APPEND:
+                            value = stack.pop()
+                            stack[-1].append(value)
+
+                        elif op == COPY_CONST:
+                            stack.append(arg.copy()) # A constant list or map; each evaluation gets its own
+
+                        elif op == LIST_EXTEND:
+                            value = stack.pop()
+                            stack[-1].extend(self._splat_values(value))
+
+                        elif op == LOAD_INHERIT:
+                            stack.append(self._inherit_method(arg))
+
+                        elif op == OUTPUT:
+                            self._output_value(stack.pop())
+
+                        elif op == DECLARE_FUNCTION:
+                            self._declare_function(arg)
+
+                        elif op == MAKE_GENERATOR:
+                            stack.append(self._suspended_call(arg, env))
+
+                        elif op == AWAIT:
+                            stack.append(self._await_expression(arg))
+
+                        elif op == DECLARE_CLASS:
+                            self._declare_class(arg)
+
+                        elif op == IMPORT:
+                            self._import_statement(arg, stack.pop())
+
+                        elif op == GET_ITER:
+                            stack[-1] = iter(self._for_iterable(arg, stack[-1]))
+
+                        elif op == SETUP_TRY:
+                            if handlers is None:
+                                handlers = []
+                            handlers.append((arg, len(stack), env))
+
+                        elif op == POP_TRY:
+                            handlers.pop()
+
+                        elif op == SELECT_CATCH:
+                            stmt, targets, unhandled_pc = arg
+                            error = stack[-1]
+                            clause = None
+                            if isinstance(error, (MryaRuntimeError, MryaTypeError, MryaRaisedError)):
+                                clause = self._find_catch_clause(stmt, error)
+                            if clause is None:
+                                pc = unhandled_pc
+                            else:
+                                stack.pop()
+                                env = self.env = Environment(env, clause.layout)
+                                pc = targets[id(clause)]
+
+                        elif op == RERAISE:
+                            raise stack.pop()
+
+                        elif op == END:
+                            return NO_RETURN
+
+                        elif op == RAISE_ERROR:
+                            if arg is None:
+                                raise MryaRuntimeError(None, "The '...' operator can only be used inside a function call.")
+                            raise RuntimeError(arg)
+
+                        else:
+                            raise RuntimeError(f"Unknown opcode {op}")
+
+                except Exception as error:
+                    # Find the innermost active try, unwinding frames that have none.
+                    while not handlers:
+                        if not frames:
+                            raise
+                        frame = frames.pop()
+                        instructions = frame.instructions
+                        env = frame.env
+                        handlers = frame.handlers
+                        base = frame.base
+                        instance = frame.instance
+                    pc, height, env = handlers.pop()
+                    self.env = env
+                    del stack[height:]
+                    stack.append(error)
+        finally:
+            self.env = previous_env
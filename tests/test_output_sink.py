@@ -0,0 +1,73 @@
+"""
+StdoutSink with several threads writing and flushing at once, as HTTP request handlers do. The Mrya
+tests can't see this, since the suite captures their output. Run with:
+    python -m unittest discover -s tests -p "test_*.py"
+"""
+import os
+import random
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from mrya_output import StdoutSink
+
+class SlowStream:
+    """A stream that takes a random while to write, so racing flushes could finish out of order."""
+    def __init__(self):
+        self.parts = []
+
+    def write(self, text):
+        time.sleep(random.random() / 1000)
+        self.parts.append(text)
+
+    def flush(self):
+        pass
+
+    def lines(self):
+        return "".join(self.parts).splitlines()
+
+class ConcurrentFlushTest(unittest.TestCase):
+    THREADS = 8
+    LINES = 50
+
+    def run_threads(self, policy):
+        stream = SlowStream()
+        sink = StdoutSink(stream, policy)
+        start = threading.Barrier(self.THREADS)
+
+        def work(name):
+            start.wait()
+            for i in range(self.LINES):
+                sink.write(f"{name} {i}")
+                time.sleep(0) # Like a handler doing more work, letting another thread flush this line
+                sink.flush()
+
+        threads = [threading.Thread(target=work, args=(name,)) for name in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        sink.flush()
+        return stream.lines()
+
+    def check_order(self, policy):
+        lines = self.run_threads(policy)
+        self.assertEqual(len(lines), self.THREADS * self.LINES)
+        for name in range(self.THREADS):
+            own = [line for line in lines if line.split()[0] == str(name)]
+            self.assertEqual(own, [f"{name} {i}" for i in range(self.LINES)])
+
+    def test_block_keeps_each_threads_order(self):
+        self.check_order("block")
+
+    def test_explicit_keeps_each_threads_order(self):
+        self.check_order("explicit")
+
+    def test_line_keeps_each_threads_order(self):
+        self.check_order("line")
+
+if __name__ == "__main__":
+    unittest.main()